@@ -1,9 +1,12 @@
+import os
 from app_init import create_app
 
 app = create_app()
 
 if __name__ == "__main__":
     """
-    Starts the Flask application in debug mode.
+    Starts the Flask development server, in debug mode if FLASK_DEBUG=1.
+
+    Production deployments serve `app` with gunicorn instead (see gunicorn.conf.py).
     """
-    app.run(debug=True)
+    app.run(debug=os.environ.get("FLASK_DEBUG") == "1")
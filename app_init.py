@@ -1,44 +1,88 @@
+import importlib
+import os
 from flask import Flask, jsonify
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from common.db import init_db_connection, close_db
-from customers import init_customers_service
-from inventory import init_inventory_service
-from sales import init_sales_service
-from reviews import init_reviews_service
+from common.db import init_db_connection, close_db, get_db
+from common.metrics import init_metrics
+from common.migrations import check_schema_version
+from common.ratelimit import RATELIMIT_STORAGE_URI, RATELIMIT_STRATEGY, init_rate_limits
 
+# Service name -> (package, initializer). Packages are imported only when their
+# service is enabled.
+SERVICES = {
+    "customers": ("customers", "init_customers_service"),
+    "inventory": ("inventory", "init_inventory_service"),
+    "sales": ("sales", "init_sales_service"),
+    "reviews": ("reviews", "init_reviews_service"),
+}
 
-def create_app():
+APP_SERVICES = os.environ.get("APP_SERVICES", ",".join(SERVICES))
+
+
+def create_app(services=None):
     """
     Creates and configures the Flask application.
 
-    Sets up the rate limiter for API requests, ensuring that users
-    are restricted to 200 requests per day and 50 requests per hour.
+    Only the requested services are imported and registered, so a container
+    that serves a single service does not load the others' code.
+
+    Loads configuration from FLASK_* environment variables (for example
+    FLASK_RATELIMIT_ENABLED=false) and sets up the rate limiter for API
+    requests, ensuring that users are restricted to 200 requests per day
+    and 50 requests per hour unless a per-blueprint limit is configured.
+    Counters are kept in storage shared by every worker process on the host
+    (see `common.ratelimit`), so the limits do not grow with the worker count.
+
+    Initializes the database connection pool, verifies that the schema has been
+    migrated to the version the code expects (no DDL is issued at startup), and
+    sets up the services for handling customers, inventory, sales, and reviews
+    that were requested.
 
-    Initializes database connections and sets up services for handling
-    customers, inventory, sales, and reviews.
+    Registers an error handler to manage rate-limiting exceptions (HTTP 429),
+    and request/query instrumentation exposed at `GET /metrics`.
 
-    Registers an error handler to manage rate-limiting exceptions (HTTP 429).
+    Args:
+        services (list, optional): Names of the services to serve, from `SERVICES`.
+            Defaults to the comma-separated APP_SERVICES environment variable, which
+            defaults to all of them.
 
     Returns:
         Flask: The configured Flask application instance.
+
+    Raises:
+        SchemaVersionError: If the database has not been migrated yet.
+        ValueError: If an unknown service is requested.
     """
+    if services is None:
+        services = [name.strip() for name in APP_SERVICES.split(",") if name.strip()]
+    unknown = sorted(set(services) - set(SERVICES))
+    if unknown:
+        raise ValueError(f"Unknown services {unknown}; expected some of {sorted(SERVICES)}")
+
     app = Flask(__name__)
+    app.config.from_prefixed_env()
+    app.config.setdefault("RATELIMIT_STORAGE_URI", RATELIMIT_STORAGE_URI)
+    app.config.setdefault("RATELIMIT_STRATEGY", RATELIMIT_STRATEGY)
 
     limiter = Limiter(
         get_remote_address,
         app=app,
         default_limits=["200 per day", "50 per hour"],
-        storage_uri="memory://",
     )
 
     init_db_connection()
     app.teardown_appcontext(close_db)
 
-    init_customers_service(app)
-    init_inventory_service(app)
-    init_sales_service(app)
-    init_reviews_service(app)
+    with app.app_context():
+        check_schema_version(get_db())
+
+    for name in services:
+        package, initializer = SERVICES[name]
+        getattr(importlib.import_module(package), initializer)(app)
+    init_rate_limits(app, limiter)
+
+    init_metrics(app, limiter)
 
     @app.errorhandler(429)
     def ratelimit_error(error):
@@ -0,0 +1,72 @@
+"""
+Application start-up benchmark.
+
+Starts a fresh interpreter for each service selection, imports `app_init`,
+builds the app with `create_app(services=...)` and reports the start-up time
+and the process's peak RSS. Used to compare a container that loads every
+service with one that only loads its own; see benchmarks/README.md.
+
+Usage:
+    python benchmarks/app_startup.py --runs 5
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SCRIPT = """
+import json, resource, sys, time
+started_at = time.perf_counter()
+from app_init import create_app
+create_app(services=sys.argv[1].split(","))
+print(json.dumps({
+    "seconds": time.perf_counter() - started_at,
+    "rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+}))
+"""
+
+SELECTIONS = [
+    "customers,inventory,sales,reviews",
+    "customers",
+    "inventory",
+    "sales",
+    "reviews",
+]
+
+
+def measure(services, runs):
+    results = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", SCRIPT, services],
+            cwd=ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+    return (
+        statistics.median(r["seconds"] for r in results),
+        statistics.median(r["rss_kib"] for r in results),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'services':<36} {'start-up':>10} {'peak RSS':>10}")
+    for services in SELECTIONS:
+        seconds, rss_kib = measure(services, args.runs)
+        print(f"{services:<36} {seconds * 1000:>7.0f} ms {rss_kib / 1024:>7.1f} MiB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Benchmark for ``POST /sales/purchase`` on one item bought by many customers at
+once, with the item's stock in 0 (a regular item) or more counter slots.
+
+Starts ``--buyers`` processes, each buying one unit at a time as a different
+customer for ``--seconds`` seconds, once per slot count in ``--slots``, and
+reports the throughput and the purchase latency. Run it with at least as many
+CPU cores as buyers: on fewer cores the buyers compete for CPU rather than for
+the item's row.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/hot_item.py --buyers 16 --seconds 5 --slots 0 1 4 16
+
+Only rows created by the benchmark (an item named ``bench hot item`` and
+customers named ``benchhot...``) are touched, and they are removed afterwards.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app_init import create_app
+from common.db import connect
+from common.stock_slots import set_stock_slots
+
+
+def setup(conn, buyers):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO inventory (name, category, price_per_item_cents, count_in_stock)
+        VALUES ('bench hot item', 'electronics', 100, 100000000)
+        RETURNING id
+        """
+    )
+    item_id = cur.fetchone()[0]
+    cur.execute(
+        """
+        INSERT INTO customers (fullname, username, password_hash, wallet_balance_cents)
+        SELECT 'Bench Buyer', 'benchhot' || n, 'x', 10000000000
+        FROM generate_series(1, %s) AS n
+        """,
+        (buyers,),
+    )
+    conn.commit()
+    cur.close()
+    return item_id
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        DELETE FROM wallet_ledger
+        WHERE customer_id IN (SELECT id FROM customers WHERE username LIKE 'benchhot%%')
+        """
+    )
+    cur.execute(
+        """
+        DELETE FROM sales
+        WHERE customer_id IN (SELECT id FROM customers WHERE username LIKE 'benchhot%%')
+        """
+    )
+    cur.execute("DELETE FROM customers WHERE username LIKE 'benchhot%%'")
+    cur.execute("DELETE FROM inventory WHERE name = 'bench hot item'")
+    conn.commit()
+    cur.close()
+
+
+def buy(buyer, item_id, start_at, seconds, results):
+    app = create_app(services=["sales"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    client = app.test_client()
+    purchase = {"username": f"benchhot{buyer}", "item_id": item_id, "quantity": 1}
+
+    time.sleep(max(start_at - time.time(), 0))
+    latencies = []
+    deadline = start_at + seconds
+    while time.time() < deadline:
+        started = time.perf_counter()
+        response = client.post("/sales/purchase", json=purchase)
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.get_json()
+    results.put(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--buyers", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--slots", type=int, nargs="+", default=[0, 1, 4, 16])
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    cleanup(conn)
+    item_id = setup(conn, args.buyers)
+
+    print(
+        f"{'slots':>5} {'buyers':>7} {'purchases':>10} {'purchases/s':>12} "
+        f"{'p50 ms':>7} {'p99 ms':>7}"
+    )
+    context = multiprocessing.get_context("spawn")
+    for slots in args.slots:
+        set_stock_slots(conn, item_id, slots)
+        results = context.Queue()
+        start_at = time.time() + 3
+        workers = [
+            context.Process(target=buy, args=(buyer, item_id, start_at, args.seconds, results))
+            for buyer in range(1, args.buyers + 1)
+        ]
+        for worker in workers:
+            worker.start()
+        latencies = sorted(latency for _ in workers for latency in results.get())
+        for worker in workers:
+            worker.join()
+        bought = len(latencies)
+        print(
+            f"{slots:>5} {args.buyers:>7} {bought:>10} {bought / args.seconds:>12.0f} "
+            f"{latencies[bought // 2] * 1000:>7.1f} {latencies[bought * 99 // 100] * 1000:>7.1f}"
+        )
+
+    cleanup(conn)
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+HTTP throughput benchmark for a running service.
+
+Opens `--concurrency` keep-alive connections and issues GET requests against
+`--path` for `--duration` seconds, then reports requests per second and
+latency percentiles. Used to compare the Flask development server with the
+gunicorn entry point; see benchmarks/README.md.
+
+Usage:
+    python benchmarks/http_throughput.py --url http://127.0.0.1:5000 --path /sales/goods/1
+"""
+
+import argparse
+import http.client
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(host, port, path, deadline, latencies, statuses, lock):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    local_latencies = []
+    local_statuses = {}
+    while time.perf_counter() < deadline:
+        started_at = time.perf_counter()
+        try:
+            conn.request("GET", path)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            status = "error"
+        local_latencies.append(time.perf_counter() - started_at)
+        local_statuses[status] = local_statuses.get(status, 0) + 1
+    conn.close()
+
+    with lock:
+        latencies.extend(local_latencies)
+        for status, count in local_statuses.items():
+            statuses[status] = statuses.get(status, 0) + count
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--path", default="/sales/goods/1")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args(argv)
+
+    url = urlsplit(args.url)
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+
+    threads = [
+        threading.Thread(
+            target=worker,
+            args=(url.hostname, url.port or 80, args.path, deadline, latencies, statuses, lock),
+        )
+        for _ in range(args.concurrency)
+    ]
+    started_at = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    print(f"url          {args.url}{args.path}")
+    print(f"concurrency  {args.concurrency}")
+    print(f"requests     {len(latencies)} in {elapsed:.1f}s")
+    print(f"throughput   {len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        print(
+            f"latency      p50 {percentile(latencies, 0.5) * 1000:.2f} ms, "
+            f"p99 {percentile(latencies, 0.99) * 1000:.2f} ms"
+        )
+    print(f"statuses     {statuses}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+Benchmark for loading a catalogue through ``POST /inventory/bulk``.
+
+Generates an NDJSON catalogue of ``--items`` SKUs and uploads it in one
+request, then uploads it again so every row is an update. For comparison, a
+sample of ``--single`` items is added one call at a time through
+``POST /inventory`` and the per-item time is extrapolated to the catalogue.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/inventory_import.py --items 100000 --single 1000
+
+Only items created by the benchmark (names starting with ``bench import``) are
+touched, and they are removed afterwards.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app_init import create_app
+from common.db import connect
+
+
+def catalogue(items):
+    for n in range(items):
+        yield json.dumps(
+            {
+                "sku": f"bench-{n}",
+                "name": f"bench import {n}",
+                "category": "accessories",
+                "price_per_item": f"{n % 1000}.99",
+                "description": "Generated by benchmarks/inventory_import.py",
+                "count_in_stock": n % 50,
+            }
+        ) + "\n"
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE name LIKE 'bench import %%'")
+    conn.commit()
+    cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=100000)
+    parser.add_argument("--single", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    app = create_app(services=["inventory"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    client = app.test_client()
+    conn = connect()
+    cleanup(conn)
+
+    body = "".join(catalogue(args.items)).encode()
+    print(f"{'run':<24} {'items':>8} {'seconds':>9} {'items/s':>9}")
+    for run in ("bulk insert", "bulk update"):
+        started = time.perf_counter()
+        response = client.post("/inventory/bulk", data=body, content_type="application/x-ndjson")
+        elapsed = time.perf_counter() - started
+        result = response.get_json()
+        assert response.status_code == 200 and not result["rejected"], result
+        print(f"{run:<24} {args.items:>8} {elapsed:>9.2f} {args.items / elapsed:>9.0f}")
+
+    started = time.perf_counter()
+    for n in range(args.single):
+        client.post(
+            "/inventory",
+            json={
+                "name": f"bench import single {n}",
+                "category": "accessories",
+                "price_per_item": 1,
+                "count_in_stock": 1,
+            },
+        )
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'single POST (estimate)':<24} {args.items:>8} "
+        f"{elapsed / args.single * args.items:>9.2f} {args.single / elapsed:>9.0f}"
+    )
+
+    cleanup(conn)
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""
+Benchmark for ``GET /inventory/search`` on a large catalogue.
+
+Generates ``--items`` items whose names combine a colour, a material and a
+product word, e.g. "Navy Leather Backpack", and whose descriptions add a few
+more words. Then it runs ``--queries`` searches of each kind: one whole word,
+two words with the last one unfinished, and a misspelt word, with and without
+filters, and reports the latency percentiles.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/inventory_search.py --items 1000000 --queries 200
+
+Only items created by the benchmark (SKUs starting with ``bench-search-``) are
+touched, and they are removed afterwards.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app_init import create_app
+from common.db import connect
+
+COLOURS = [
+    "red", "blue", "green", "black", "white", "navy", "olive", "amber", "ivory", "coral",
+    "teal", "maroon", "silver", "golden", "violet", "indigo", "khaki", "beige", "plum", "rust",
+]
+MATERIALS = [
+    "leather", "cotton", "wool", "steel", "bamboo", "oak", "linen", "denim", "silk", "canvas",
+    "ceramic", "glass", "copper", "walnut", "velvet", "nylon", "suede", "marble", "cork", "felt",
+]
+PRODUCTS = [
+    "backpack", "jacket", "lamp", "kettle", "wallet", "sneakers", "blender", "headphones",
+    "scarf", "toaster", "umbrella", "keyboard", "mug", "speaker", "watch", "sandals", "blanket",
+    "router", "notebook", "bottle", "charger", "hoodie", "monitor", "pillow", "camera",
+    "skillet", "sunglasses", "belt", "mouse", "tablet", "beanie", "grinder", "vase", "tripod",
+    "apron", "cooler", "drone", "easel", "gloves", "hammock", "juicer", "ladle", "mittens",
+    "organizer", "planter", "quilt", "rucksack", "satchel", "thermos", "ukulele",
+]
+CATEGORIES = ["food", "clothes", "accessories", "electronics"]
+
+
+def seed(conn, items):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO inventory (sku, name, category, price_per_item_cents, description, count_in_stock)
+        SELECT 'bench-search-' || n,
+               initcap((%(colours)s)[1 + n %% 20] || ' ' || (%(materials)s)[1 + (n / 20) %% 20]
+                       || ' ' || (%(products)s)[1 + (n / 400) %% 50]),
+               (%(categories)s)[1 + n %% 4],
+               100 + (n::bigint * 7919) %% 100000,
+               'A ' || (%(colours)s)[1 + (n / 7) %% 20] || ' ' || (%(products)s)[1 + (n / 13) %% 50]
+                   || ' for everyday use, item ' || n,
+               n %% 5
+        FROM generate_series(1, %(items)s) AS n
+        """,
+        {
+            "colours": COLOURS,
+            "materials": MATERIALS,
+            "products": PRODUCTS,
+            "categories": CATEGORIES,
+            "items": items,
+        },
+    )
+    conn.commit()
+    # Also clears out the index entries of a previous run's deleted rows.
+    conn.autocommit = True
+    try:
+        cur.execute("VACUUM ANALYZE inventory")
+    finally:
+        conn.autocommit = False
+    cur.close()
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE sku LIKE 'bench-search-%%'")
+    conn.commit()
+    cur.close()
+
+
+def misspell(word, rng):
+    i = rng.randrange(len(word) - 1)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def queries(kind, count, rng):
+    for _ in range(count):
+        colour, material, product = rng.choice(COLOURS), rng.choice(MATERIALS), rng.choice(PRODUCTS)
+        if kind == "one word":
+            yield {"q": product}
+        elif kind == "two words, prefix":
+            yield {"q": f"{material} {product[: max(3, len(product) - 2)]}"}
+        elif kind == "misspelt word":
+            yield {"q": misspell(product, rng)}
+        else:
+            yield {
+                "q": f"{colour} {product}",
+                "category": rng.choice(CATEGORIES),
+                "max_price": "500.00",
+                "in_stock": "true",
+            }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    app = create_app(services=["inventory"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    client = app.test_client()
+    conn = connect()
+    cleanup(conn)
+    started = time.perf_counter()
+    seed(conn, args.items)
+    print(f"Seeded {args.items} items in {time.perf_counter() - started:.1f} s")
+
+    rng = random.Random(435)
+    print(f"{'queries':<22} {'runs':>5} {'p50 ms':>8} {'p99 ms':>8} {'results':>8}")
+    for kind in ("one word", "two words, prefix", "misspelt word", "with filters"):
+        latencies = []
+        results = 0
+        for query in queries(kind, args.queries, rng):
+            started = time.perf_counter()
+            response = client.get("/inventory/search", query_string=query)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.get_json()
+            results += len(response.get_json())
+        latencies.sort()
+        print(
+            f"{kind:<22} {len(latencies):>5} {latencies[len(latencies) // 2] * 1000:>8.1f} "
+            f"{latencies[len(latencies) * 99 // 100] * 1000:>8.1f} {results / len(latencies):>8.1f}"
+        )
+
+    cleanup(conn)
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
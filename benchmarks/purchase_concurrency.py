@@ -0,0 +1,170 @@
+"""
+Concurrency benchmark for ``POST /sales/purchase``.
+
+Every buyer thread hammers the same inventory item through the Flask test
+client. Stock is deliberately smaller than total demand, so the run also
+checks correctness: stock and wallets never go negative, and every unit that
+left the inventory is accounted for by exactly one sale and one wallet debit.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/purchase_concurrency.py --levels 1,2,4,8,16,32,64
+
+Only rows created by the benchmark (customers named ``bench_buyer_*`` and a
+``bench item``) are touched, and they are removed afterwards.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault("DB_POOL_MAX_SIZE", "80")
+
+from app_init import create_app
+from common.db import connect
+
+PRICE_CENTS = 300
+WALLET_CENTS = 10000
+
+
+def setup(conn, buyers, stock):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO inventory (name, category, price_per_item_cents, count_in_stock)
+        VALUES ('bench item', 'accessories', %s, %s)
+        RETURNING id
+        """,
+        (PRICE_CENTS, stock),
+    )
+    item_id = cur.fetchone()[0]
+    for buyer in range(buyers):
+        cur.execute(
+            """
+            INSERT INTO customers (fullname, username, password, wallet_balance_cents)
+            VALUES ('Bench Buyer', %s, 'bench', %s)
+            """,
+            (f"bench_buyer_{buyer}", WALLET_CENTS),
+        )
+    conn.commit()
+    cur.close()
+    return item_id
+
+
+def verify(conn, item_id, stock):
+    cur = conn.cursor()
+    cur.execute("SELECT count_in_stock FROM inventory WHERE id = %s", (item_id,))
+    remaining = cur.fetchone()[0]
+    cur.execute(
+        "SELECT COALESCE(SUM(quantity), 0) FROM sales WHERE item_id = %s", (item_id,)
+    )
+    sold = cur.fetchone()[0]
+    cur.execute(
+        """
+        SELECT COUNT(*) FILTER (WHERE wallet_balance_cents < 0),
+               COALESCE(SUM(%s - wallet_balance_cents), 0)
+        FROM customers
+        WHERE username LIKE 'bench\\_buyer\\_%%'
+        """,
+        (WALLET_CENTS,),
+    )
+    negative_wallets, spent = cur.fetchone()
+    cur.close()
+    conn.rollback()
+
+    errors = []
+    if remaining < 0:
+        errors.append(f"negative stock {remaining}")
+    if negative_wallets:
+        errors.append(f"{negative_wallets} negative wallets")
+    if sold != stock - remaining:
+        errors.append(f"sold {sold} units but stock dropped by {stock - remaining}")
+    if spent != sold * PRICE_CENTS:
+        errors.append(f"wallets debited {spent} cents for {sold * PRICE_CENTS} cents of sales")
+    return sold, errors
+
+
+def cleanup(conn, item_id):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM sales WHERE item_id = %s", (item_id,))
+    cur.execute("DELETE FROM customers WHERE username LIKE 'bench\\_buyer\\_%%'")
+    cur.execute("DELETE FROM inventory WHERE id = %s", (item_id,))
+    conn.commit()
+    cur.close()
+
+
+def run_level(app, conn, buyers, purchases_per_buyer):
+    stock = buyers * purchases_per_buyer // 2
+    item_id = setup(conn, buyers, stock)
+    barrier = threading.Barrier(buyers)
+    statuses = {}
+    lock = threading.Lock()
+
+    def buyer(index):
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(purchases_per_buyer):
+            response = client.post(
+                "/sales/purchase",
+                json={
+                    "username": f"bench_buyer_{index}",
+                    "item_id": item_id,
+                    "quantity": 1,
+                },
+            )
+            with lock:
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=buyer, args=(i,)) for i in range(buyers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    sold, errors = verify(conn, item_id, stock)
+    cleanup(conn, item_id)
+    return {
+        "buyers": buyers,
+        "requests": buyers * purchases_per_buyer,
+        "elapsed": elapsed,
+        "sold": sold,
+        "stock": stock,
+        "statuses": statuses,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64")
+    parser.add_argument("--purchases-per-buyer", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    conn = connect()
+    failed = False
+
+    print(f"{'buyers':>6} {'requests':>8} {'req/s':>9} {'sold':>6} {'stock':>6}  result")
+    for buyers in (int(level) for level in args.levels.split(",")):
+        result = run_level(app, conn, buyers, args.purchases_per_buyer)
+        failed = failed or bool(result["errors"])
+        print(
+            f"{result['buyers']:>6} {result['requests']:>8} "
+            f"{result['requests'] / result['elapsed']:>9.1f} "
+            f"{result['sold']:>6} {result['stock']:>6}  "
+            f"{'; '.join(result['errors']) or 'ok'} {result['statuses']}"
+        )
+
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Rate limiter storage benchmark.
+
+Times `SlidingWindowCounterRateLimiter.hit` against the in-process
+``memory://`` storage and the shared ``shm://`` storage from
+`common.ratelimit`, with `--keys` distinct client keys, and reports the mean
+and p99 cost of one check in microseconds. With `--processes` > 1 the shared
+storage is hit from several processes at once, as it is under gunicorn.
+
+Usage:
+    python benchmarks/ratelimit_storage.py --keys 100000 --checks 200000
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from limits import parse  # noqa: E402
+from limits.storage import storage_from_string  # noqa: E402
+from limits.strategies import SlidingWindowCounterRateLimiter  # noqa: E402
+
+import common.ratelimit  # noqa: E402,F401  registers the shm:// scheme
+
+
+def run(uri, keys, checks, seed):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = parse("50 per hour")
+    rng = random.Random(seed)
+    names = [f"10.0.{i // 256}.{i % 256}-{i}" for i in range(keys)]
+    timings = []
+    for _ in range(checks):
+        key = names[rng.randrange(keys)]
+        started_at = time.perf_counter()
+        limiter.hit(item, key)
+        timings.append(time.perf_counter() - started_at)
+    return timings
+
+
+def _worker(uri, keys, checks, seed, results):
+    results.put(run(uri, keys, checks, seed))
+
+
+def report(label, timings):
+    timings.sort()
+    mean = sum(timings) / len(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"{label:<28} mean {mean:6.1f} us  p99 {p99:6.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--keys", type=int, default=100000)
+    parser.add_argument("--checks", type=int, default=200000)
+    parser.add_argument("--slots", type=int, default=65536)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    report("memory://", run("memory://", args.keys, args.checks, 0))
+
+    with tempfile.TemporaryDirectory() as directory:
+        uri = f"shm://{directory}/ratelimit?slots={args.slots}"
+        report("shm:// (1 process)", run(uri, args.keys, args.checks, 0))
+
+        results = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(
+                target=_worker, args=(uri, args.keys, args.checks // args.processes, i, results)
+            )
+            for i in range(args.processes)
+        ]
+        for worker in workers:
+            worker.start()
+        timings = [t for _ in workers for t in results.get()]
+        for worker in workers:
+            worker.join()
+        report(f"shm:// ({args.processes} processes)", timings)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Benchmark for ``PATCH /inventory/stock`` against one ``PATCH
+/inventory/<id>/deduct`` call per item.
+
+Creates ``--items`` items, applies a batch that deducts one unit from each of
+them, and times ``--single`` deduct calls for comparison.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/stock_adjustment.py --items 10000 --single 1000
+
+Only items created by the benchmark (names starting with ``bench stock``) are
+touched, and they are removed afterwards.
+"""
+
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app_init import create_app
+from common.db import connect
+
+
+def setup(conn, items):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO inventory (name, category, price_per_item_cents, count_in_stock)
+        SELECT 'bench stock ' || n, 'accessories', 100, 1000
+        FROM generate_series(1, %s) AS n
+        RETURNING id
+        """,
+        (items,),
+    )
+    item_ids = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return item_ids
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE name LIKE 'bench stock %%'")
+    conn.commit()
+    cur.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--single", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    app = create_app(services=["inventory"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    client = app.test_client()
+    conn = connect()
+    cleanup(conn)
+    item_ids = setup(conn, args.items)
+
+    batch = {
+        "batch_id": f"bench-{uuid.uuid4().hex}",
+        "adjustments": [{"item_id": item_id, "delta": -1} for item_id in item_ids],
+    }
+    started = time.perf_counter()
+    response = client.patch("/inventory/stock", json=batch)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200 and not response.get_json()["rejected"]
+    print(f"{'run':<28} {'items':>7} {'seconds':>9} {'items/s':>9}")
+    print(
+        f"{'PATCH /inventory/stock':<28} {args.items:>7} "
+        f"{elapsed:>9.2f} {args.items / elapsed:>9.0f}"
+    )
+
+    started = time.perf_counter()
+    for item_id in item_ids[: args.single]:
+        client.patch(f"/inventory/{item_id}/deduct", json={"quantity": 1})
+    elapsed = time.perf_counter() - started
+    print(
+        f"{'PATCH /deduct (estimate)':<28} {args.items:>7} "
+        f"{elapsed / args.single * args.items:>9.2f} {args.single / elapsed:>9.0f}"
+    )
+
+    cleanup(conn)
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
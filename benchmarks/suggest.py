@@ -0,0 +1,98 @@
+"""
+Benchmark for ``GET /sales/goods/suggest`` on a large catalogue.
+
+Generates ``--items`` items like ``inventory_search.py`` does, builds the
+suggestion index, and reports how long the build took and how much memory the
+index uses. Then it times ``--queries`` suggestions for prefixes of 1 to 8
+characters, and a batch of renames, which the index applies in place.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/suggest.py --items 1000000 --queries 2000
+
+Only items created by the benchmark (SKUs starting with ``bench-search-``) are
+touched, and they are removed afterwards.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+
+from app_init import create_app
+from benchmarks.inventory_search import COLOURS, MATERIALS, PRODUCTS, cleanup, seed
+from common.db import connect
+from common.notify import notify_inventory_change
+from sales.suggest import get_suggest_index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--renames", type=int, default=100)
+    args = parser.parse_args(argv)
+
+    app = create_app(services=["sales"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    client = app.test_client()
+    index = get_suggest_index(app)
+    conn = connect()
+    cleanup(conn)
+    seed(conn, args.items)
+
+    started = time.perf_counter()
+    client.get("/sales/goods/suggest", query_string={"prefix": "a"})
+    stats = index.stats()
+    print(
+        f"Indexed {stats['items']} items, {stats['keys']} keys, "
+        f"{stats['bytes'] / 1024 / 1024:.1f} MB in {time.perf_counter() - started:.1f} s"
+    )
+
+    rng = random.Random(435)
+    words = COLOURS + MATERIALS + PRODUCTS
+    misses = index.stats()["misses"]
+    print(f"{'prefix':<7} {'runs':>5} {'p50 ms':>8} {'p99 ms':>8} {'results':>8}")
+    for length in (1, 2, 4, 8):
+        latencies = []
+        results = 0
+        for _ in range(args.queries):
+            prefix = rng.choice(words)[:length]
+            started = time.perf_counter()
+            response = client.get("/sales/goods/suggest", query_string={"prefix": prefix})
+            latencies.append(time.perf_counter() - started)
+            results += len(response.get_json())
+        latencies.sort()
+        print(
+            f"{length:<7} {len(latencies):>5} {latencies[len(latencies) // 2] * 1000:>8.2f} "
+            f"{latencies[len(latencies) * 99 // 100] * 1000:>8.2f} {results / len(latencies):>8.1f}"
+        )
+    print(f"Database queries during lookups: {index.stats()['misses'] - misses}")
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        UPDATE inventory SET name = name || ' Deluxe'
+        WHERE id IN (SELECT id FROM inventory WHERE sku LIKE 'bench-search-%%' LIMIT %s)
+        RETURNING id
+        """,
+        (args.renames,),
+    )
+    notify_inventory_change(cur, [row[0] for row in cur.fetchall()])
+    conn.commit()
+    cur.close()
+    started = time.perf_counter()
+    client.get("/sales/goods/suggest", query_string={"prefix": "deluxe"})
+    print(f"Applied {args.renames} renames in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    cleanup(conn)
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
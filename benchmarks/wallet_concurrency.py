@@ -0,0 +1,155 @@
+"""
+Concurrency benchmark for ``POST /customers/<username>/charge`` and ``/deduct``.
+
+Every thread alternates charges and deductions against the same wallet through
+the Flask test client. The wallet starts nearly empty, so some deductions are
+refused. The run checks that no update was lost: the final balance equals the
+opening balance plus every successful charge minus every successful deduction,
+it never went negative, and it matches the sum of the wallet's ledger entries.
+
+Usage:
+    python -m common.migrations upgrade
+    python benchmarks/wallet_concurrency.py --levels 1,2,4,8,16,32,64
+
+Only the customer created by the benchmark (``bench_wallet``) is touched, and it
+is removed afterwards.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault("DB_POOL_MAX_SIZE", "80")
+
+from app_init import create_app
+from common.db import connect
+from common.money import format_cents
+
+USERNAME = "bench_wallet"
+OPENING_CENTS = 250
+AMOUNT_CENTS = 125
+
+
+def setup(client):
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Bench Wallet",
+            "username": USERNAME,
+            "password": "bench",
+            "wallet_balance": format_cents(OPENING_CENTS),
+        },
+    )
+
+
+def verify(conn, charges, deductions):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT customers.wallet_balance_cents, COALESCE(SUM(wallet_ledger.amount_cents), 0)
+        FROM customers
+        LEFT JOIN wallet_ledger ON wallet_ledger.customer_id = customers.id
+        WHERE customers.username = %s
+        GROUP BY customers.wallet_balance_cents
+        """,
+        (USERNAME,),
+    )
+    balance, ledger_balance = cur.fetchone()
+    cur.close()
+    conn.rollback()
+
+    expected = OPENING_CENTS + (charges - deductions) * AMOUNT_CENTS
+    errors = []
+    if balance < 0:
+        errors.append(f"negative balance {balance} cents")
+    if balance != expected:
+        errors.append(f"balance {balance} cents, expected {expected}: updates were lost")
+    if ledger_balance != balance:
+        errors.append(f"ledger sums to {ledger_balance} cents, balance is {balance}")
+    return format_cents(balance), errors
+
+
+def cleanup(conn):
+    cur = conn.cursor()
+    cur.execute("DELETE FROM customers WHERE username = %s", (USERNAME,))
+    conn.commit()
+    cur.close()
+
+
+def run_level(app, conn, threads_count, changes_per_thread):
+    setup(app.test_client())
+    barrier = threading.Barrier(threads_count)
+    counts = {"charge": 0, "deduct": 0, "refused": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def worker(number):
+        client = app.test_client()
+        barrier.wait()
+        for index in range(changes_per_thread):
+            # Half of the threads start with deductions, so the wallet runs dry.
+            operation = "charge" if (index + number) % 2 == 0 else "deduct"
+            response = client.post(
+                f"/customers/{USERNAME}/{operation}", json={"amount": AMOUNT_CENTS / 100}
+            )
+            with lock:
+                if response.status_code == 200:
+                    counts[operation] += 1
+                elif response.status_code == 400:
+                    counts["refused"] += 1
+                else:
+                    counts["errors"] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(threads_count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    balance, errors = verify(conn, counts["charge"], counts["deduct"])
+    if counts["errors"]:
+        errors.append(f"{counts['errors']} requests failed")
+    cleanup(conn)
+    return {
+        "threads": threads_count,
+        "requests": threads_count * changes_per_thread,
+        "elapsed": elapsed,
+        "balance": balance,
+        "counts": counts,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", default="1,2,4,8,16,32,64")
+    parser.add_argument("--changes-per-thread", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = create_app(services=["customers"])
+    for limiter in app.extensions.get("limiter", ()):
+        limiter.enabled = False
+    conn = connect()
+    failed = False
+
+    print(f"{'threads':>7} {'requests':>8} {'req/s':>9} {'balance':>9}  result")
+    for threads_count in (int(level) for level in args.levels.split(",")):
+        result = run_level(app, conn, threads_count, args.changes_per_thread)
+        failed = failed or bool(result["errors"])
+        print(
+            f"{result['threads']:>7} {result['requests']:>8} "
+            f"{result['requests'] / result['elapsed']:>9.1f} "
+            f"{result['balance']:>9}  "
+            f"{'; '.join(result['errors']) or 'ok'} {result['counts']}"
+        )
+
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from common.db import get_db, get_secret
+from common.notify import last_heartbeat, publish, subscribe
+
+AUTH_TOKEN_SECRET = os.environ.get("AUTH_TOKEN_SECRET")
+AUTH_TOKEN_TTL = int(os.environ.get("AUTH_TOKEN_TTL", "900"))
+AUTH_REVOCATION_MAX_STALENESS = float(os.environ.get("AUTH_REVOCATION_MAX_STALENESS", "5"))
+PASSWORD_HASH_ITERATIONS = int(os.environ.get("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_CACHE_SIZE = int(os.environ.get("PASSWORD_CACHE_SIZE", "1024"))
+
+REVOCATION_CHANNEL = "tokens_revoked"
+
+_HASH_SCHEME = "pbkdf2_sha256"
+
+_verified_passwords = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+
+
+class TokenError(ValueError):
+    """
+    Raised when a session token is malformed, has a bad signature or has expired.
+    """
+
+
+def hash_password(password, iterations=PASSWORD_HASH_ITERATIONS):
+    """
+    Hashes a password with PBKDF2-HMAC-SHA256 and a random 16-byte salt.
+
+    Args:
+        password (str): The plaintext password.
+        iterations (int): The PBKDF2 iteration count.
+
+    Returns:
+        str: ``pbkdf2_sha256$<iterations>$<salt>$<hash>``, with the salt and hash
+        in hex. The iteration count is stored so it can be raised later without
+        invalidating existing hashes.
+    """
+    salt = secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{_HASH_SCHEME}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, password_hash):
+    """
+    Checks a password against a hash produced by `hash_password`, in constant time.
+
+    Args:
+        password (str): The plaintext password.
+        password_hash (str): The stored hash.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    try:
+        scheme, iterations, salt, digest = password_hash.split("$")
+        if scheme != _HASH_SCHEME:
+            return False
+        expected = bytes.fromhex(digest)
+        actual = hashlib.pbkdf2_hmac(
+            "sha256", password.encode(), bytes.fromhex(salt), int(iterations)
+        )
+    except (AttributeError, ValueError):
+        return False
+    return hmac.compare_digest(actual, expected)
+
+
+def verify_password_cached(password, password_hash):
+    """
+    Like `verify_password`, but remembers the last `PASSWORD_CACHE_SIZE` successful
+    checks in this process, so a client that sends the same credentials with every
+    request pays for the password hash once.
+
+    Entries are keyed by an HMAC of the password under the stored hash, so the
+    cache holds no plaintext, and a changed password, which gets a new hash and
+    salt, never matches an old entry. Failed checks are not cached and stay slow.
+
+    Args:
+        password (str): The plaintext password.
+        password_hash (str): The stored hash.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    key = hmac.new(password_hash.encode(), password.encode(), hashlib.sha256).digest()
+    with _verified_passwords_lock:
+        if key in _verified_passwords:
+            _verified_passwords.move_to_end(key)
+            return True
+    if not verify_password(password, password_hash):
+        return False
+    with _verified_passwords_lock:
+        _verified_passwords[key] = True
+        while len(_verified_passwords) > PASSWORD_CACHE_SIZE:
+            _verified_passwords.popitem(last=False)
+    return True
+
+
+def _signing_key():
+    key = AUTH_TOKEN_SECRET or get_secret().get("AUTH_TOKEN_SECRET")
+    if not key:
+        raise RuntimeError(
+            "AUTH_TOKEN_SECRET is not set in the environment or the credentials secret"
+        )
+    return key.encode()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def issue_token(customer_id, username, ttl=AUTH_TOKEN_TTL):
+    """
+    Issues a signed session token for a customer.
+
+    The token is ``<payload>.<signature>``: the base64url-encoded JSON claims and
+    their HMAC-SHA256 under AUTH_TOKEN_SECRET (or the ``AUTH_TOKEN_SECRET`` key of
+    the credentials secret). Any worker holding the key can verify it without a
+    database query.
+
+    Args:
+        customer_id (int): The customer's ID (the ``sub`` claim).
+        username (str): The customer's username (the ``usr`` claim).
+        ttl (int): Seconds until the token expires.
+
+    Returns:
+        tuple: (token, claims). The claims are sub, usr, iat, exp and a random jti
+        that identifies the token when it is revoked.
+    """
+    now = int(time.time())
+    claims = {
+        "sub": customer_id,
+        "usr": username,
+        "iat": now,
+        "exp": now + ttl,
+        "jti": secrets.token_hex(16),
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    signature = hmac.new(_signing_key(), payload.encode(), hashlib.sha256).digest()
+    return f"{payload}.{_b64encode(signature)}", claims
+
+
+def verify_token(token):
+    """
+    Checks a token's signature and expiry. Revocation is checked separately, by
+    `RevocationList`.
+
+    Args:
+        token (str): A token from `issue_token`.
+
+    Returns:
+        dict: The token's claims.
+
+    Raises:
+        TokenError: If the token is malformed, its signature does not match or it has expired.
+    """
+    try:
+        payload, signature = token.split(".")
+        signature = _b64decode(signature)
+    except ValueError:
+        raise TokenError("Malformed token")
+    expected = hmac.new(_signing_key(), payload.encode(), hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise TokenError("Invalid token signature")
+    try:
+        claims = json.loads(_b64decode(payload))
+        expires_at = float(claims["exp"])
+    except (ValueError, KeyError, TypeError):
+        raise TokenError("Malformed token")
+    if expires_at <= time.time():
+        raise TokenError("Token has expired")
+    return claims
+
+
+def bearer_token(request):
+    """
+    Returns the token from an ``Authorization: Bearer <token>`` header, or None.
+    """
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token.strip():
+        return None
+    return token.strip()
+
+
+def revoke_token(cur, claims):
+    """
+    Revokes a token before it expires. The caller commits.
+
+    The row is announced on `REVOCATION_CHANNEL` (see `common.notify`), so every
+    worker's `RevocationList` loads it; workers in this process see it at once.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        claims (dict): The claims of the token, as returned by `verify_token`.
+
+    Returns:
+        bool: False if the token had already been revoked.
+    """
+    cur.execute(
+        """
+        INSERT INTO revoked_tokens (jti, customer_id, expires_at)
+        VALUES (%s, %s, to_timestamp(%s) AT TIME ZONE 'UTC')
+        ON CONFLICT (jti) DO NOTHING
+        RETURNING id
+        """,
+        (claims["jti"], claims["sub"], claims["exp"]),
+    )
+    row = cur.fetchone()
+    if row is None:
+        return False
+    cur.execute("DELETE FROM revoked_tokens WHERE expires_at < now() AT TIME ZONE 'UTC'")
+    publish(cur, REVOCATION_CHANNEL, [row[0]])
+    return True
+
+
+class RevocationList:
+    """
+    A per-worker copy of the IDs (jti) of revoked, unexpired session tokens.
+
+    It is loaded in full on first use. After that `revoke_token` announces each
+    new row on `REVOCATION_CHANNEL`, and only those rows are fetched, in one
+    query, on the next check; while nothing is pending a check never touches
+    the database. Entries are dropped once their token has expired, so the list
+    only ever holds tokens that could still be presented.
+
+    If the notification listener is down for longer than `max_staleness` seconds,
+    revocations may have been missed, so the whole list is reloaded at most once
+    per `max_staleness` seconds until the listener recovers.
+
+    Args:
+        max_staleness (float): Upper bound, in seconds, on how late a revocation
+            may take effect when notifications cannot be received.
+    """
+
+    def __init__(self, max_staleness=AUTH_REVOCATION_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self._revoked = {}
+        self._pending = set()
+        self._reload_all = True
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._subscribed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.full_reloads = 0
+
+    def is_revoked(self, jti):
+        """
+        Args:
+            jti (str): The token ID.
+
+        Returns:
+            bool: True if the token has been revoked.
+        """
+        self._sync()
+        return jti in self._revoked
+
+    def invalidate(self, ids=None):
+        """
+        Marks revocation rows to be loaded on the next check.
+
+        Args:
+            ids (list, optional): The IDs of new revoked_tokens rows. None reloads everything.
+        """
+        with self._lock:
+            if ids is None:
+                self._reload_all = True
+            else:
+                self._pending.update(ids)
+
+    def stats(self):
+        """
+        Returns the list's counters.
+
+        Returns:
+            dict: The number of revoked tokens held, check hits and misses, and full reloads.
+        """
+        return {
+            "tokens": len(self._revoked),
+            "hits": self.hits,
+            "misses": self.misses,
+            "full_reloads": self.full_reloads,
+        }
+
+    def _sync(self):
+        if not self._subscribed:
+            self._subscribed = True
+            subscribe(REVOCATION_CHANNEL, self.invalidate)
+
+        now = time.monotonic()
+        heartbeat = last_heartbeat()
+        if (heartbeat is None or now - heartbeat > self.max_staleness) and (
+            self._synced_at is None or now - self._synced_at > self.max_staleness
+        ):
+            self.invalidate()
+
+        if not self._reload_all and not self._pending:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        with self._load_lock:
+            with self._lock:
+                reload_all, self._reload_all = self._reload_all, False
+                pending, self._pending = self._pending, set()
+
+            try:
+                if reload_all:
+                    self._load_all()
+                elif pending:
+                    self._load(pending)
+            except Exception:
+                self.invalidate(None if reload_all else pending)
+                raise
+
+    def _load_all(self):
+        cur = get_db().cursor()
+        cur.execute(
+            """
+            SELECT jti, extract(epoch FROM expires_at)::float8
+            FROM revoked_tokens
+            WHERE expires_at > now() AT TIME ZONE 'UTC'
+            """
+        )
+        revoked = dict(cur.fetchall())
+        cur.close()
+        with self._lock:
+            self._revoked = revoked
+        self._synced_at = time.monotonic()
+        self.full_reloads += 1
+
+    def _load(self, ids):
+        cur = get_db().cursor()
+        cur.execute(
+            """
+            SELECT jti, extract(epoch FROM expires_at)::float8
+            FROM revoked_tokens
+            WHERE id = ANY(%s)
+            """,
+            (list(ids),),
+        )
+        rows = cur.fetchall()
+        cur.close()
+
+        now = time.time()
+        with self._lock:
+            revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+            revoked.update((jti, exp) for jti, exp in rows if exp > now)
+            self._revoked = revoked
+
+
+def get_revocations(app):
+    """
+    Returns the revocation list of the given app, creating it on first use.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        RevocationList: The app's revocation list.
+    """
+    revocations = app.extensions.get("token_revocations")
+    if revocations is None:
+        revocations = app.extensions.setdefault("token_revocations", RevocationList())
+    return revocations
@@ -0,0 +1,254 @@
+import json
+import logging
+import os
+import threading
+import time
+
+DB_CREDENTIALS_PROVIDER = os.environ.get("DB_CREDENTIALS_PROVIDER", "secretsmanager")
+DB_CREDENTIALS_FILE = os.environ.get("DB_CREDENTIALS_FILE", "/run/secrets/db_credentials.json")
+DB_CREDENTIALS_TTL = float(os.environ.get("DB_CREDENTIALS_TTL", "300"))
+DB_SECRET_ID = os.environ.get("DB_SECRET_ID", "ecommerce_db/db_credentials")
+DB_SECRET_REGION = os.environ.get("AWS_REGION") or "eu-north-1"
+
+# Credentials are refreshed this fraction of the TTL before they expire.
+REFRESH_MARGIN = 0.2
+RETRY_INTERVAL = 5.0
+
+logger = logging.getLogger(__name__)
+
+
+class CredentialsError(RuntimeError):
+    """
+    Raised when a credentials provider cannot produce the database credentials.
+    """
+
+
+class EnvCredentialsProvider:
+    """
+    Reads the database credentials from the DB_USER and DB_PASSWORD environment variables.
+    """
+
+    name = "env"
+
+    def fetch(self):
+        """
+        Returns:
+            dict: The secret values, with DB_USER and DB_PASSWORD keys.
+
+        Raises:
+            CredentialsError: If DB_USER is not set.
+        """
+        if not os.environ.get("DB_USER"):
+            raise CredentialsError("DB_USER is not set")
+        return {
+            "DB_USER": os.environ["DB_USER"],
+            "DB_PASSWORD": os.environ.get("DB_PASSWORD", ""),
+        }
+
+
+class FileCredentialsProvider:
+    """
+    Reads the database credentials from a local JSON file, in the same format as
+    the Secrets Manager secret (``{"DB_USER": ..., "DB_PASSWORD": ...}``).
+
+    This needs no network access, so the stack can boot offline, and works with
+    Docker or Kubernetes secrets mounted as files. Rotating the file is picked
+    up on the next refresh.
+
+    Args:
+        path (str): The path of the JSON file.
+    """
+
+    name = "file"
+
+    def __init__(self, path=DB_CREDENTIALS_FILE):
+        self.path = path
+
+    def fetch(self):
+        """
+        Returns:
+            dict: The secret values, with DB_USER and DB_PASSWORD keys.
+
+        Raises:
+            CredentialsError: If the file cannot be read or parsed.
+        """
+        try:
+            with open(self.path) as f:
+                secret = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CredentialsError(f"Cannot read credentials from {self.path}: {e}")
+        if not isinstance(secret, dict) or "DB_USER" not in secret:
+            raise CredentialsError(f"{self.path} does not contain DB_USER")
+        return secret
+
+
+class SecretsManagerProvider:
+    """
+    Fetches the database credentials from AWS Secrets Manager.
+
+    boto3 is imported, and the client created, on the first fetch, so processes
+    that use another provider never pay for importing it.
+
+    Args:
+        secret_id (str): The name or ARN of the secret.
+        region_name (str): The AWS region of the secret.
+    """
+
+    name = "secretsmanager"
+
+    def __init__(self, secret_id=DB_SECRET_ID, region_name=DB_SECRET_REGION):
+        self.secret_id = secret_id
+        self.region_name = region_name
+        self._client = None
+
+    def fetch(self):
+        """
+        Returns:
+            dict: The secret values, with DB_USER and DB_PASSWORD keys.
+
+        Raises:
+            CredentialsError: If the secret cannot be retrieved.
+        """
+        import boto3
+        from botocore.exceptions import BotoCoreError, ClientError
+
+        try:
+            if self._client is None:
+                session = boto3.session.Session()
+                self._client = session.client(
+                    service_name="secretsmanager", region_name=self.region_name
+                )
+            response = self._client.get_secret_value(SecretId=self.secret_id)
+        except (BotoCoreError, ClientError) as e:
+            raise CredentialsError(f"Cannot fetch secret {self.secret_id}: {e}")
+        return json.loads(response["SecretString"])
+
+
+PROVIDERS = {
+    EnvCredentialsProvider.name: EnvCredentialsProvider,
+    FileCredentialsProvider.name: FileCredentialsProvider,
+    SecretsManagerProvider.name: SecretsManagerProvider,
+}
+
+
+def get_provider(name=DB_CREDENTIALS_PROVIDER):
+    """
+    Creates the credentials provider selected by DB_CREDENTIALS_PROVIDER.
+
+    Args:
+        name (str): One of ``env``, ``file`` or ``secretsmanager``.
+
+    Returns:
+        object: A provider with a ``fetch()`` method returning the secret dict.
+
+    Raises:
+        CredentialsError: If `name` is not a known provider.
+    """
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise CredentialsError(
+            f"Unknown credentials provider {name!r}; expected one of {sorted(PROVIDERS)}"
+        )
+
+
+class CredentialsCache:
+    """
+    Caches the secret returned by a provider and refreshes it in the background.
+
+    The first `get` fetches the secret synchronously. After that a daemon thread
+    fetches it again shortly before `ttl` seconds have passed, so requests never
+    wait for the provider. When the fetched values differ from the cached ones,
+    every callback registered with `on_change` is called with the new secret.
+
+    If a refresh fails, the cached secret keeps being served and the fetch is
+    retried every `RETRY_INTERVAL` seconds. The thread belongs to the process
+    that started it; a forked child starts its own on its first `get`.
+
+    Args:
+        provider (object): The credentials provider.
+        ttl (float): Seconds a fetched secret is considered fresh. 0 disables refreshing.
+    """
+
+    def __init__(self, provider, ttl=DB_CREDENTIALS_TTL):
+        self.provider = provider
+        self.ttl = ttl
+        self._secret = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def get(self):
+        """
+        Returns the cached secret, fetching it first if nothing is cached yet.
+
+        Returns:
+            dict: The secret values.
+        """
+        secret = self._secret
+        if secret is None:
+            with self._lock:
+                if self._secret is None:
+                    self._secret = self.provider.fetch()
+                    self._fetched_at = time.monotonic()
+                secret = self._secret
+        self._ensure_refresher()
+        return secret
+
+    def on_change(self, callback):
+        """
+        Registers `callback(secret)` to be called when refreshed credentials differ
+        from the cached ones.
+        """
+        self._callbacks.append(callback)
+
+    def refresh(self):
+        """
+        Fetches the secret now and notifies the callbacks if it changed.
+
+        Returns:
+            bool: True if the credentials changed.
+        """
+        secret = self.provider.fetch()
+        with self._lock:
+            changed = self._secret is not None and secret != self._secret
+            self._secret = secret
+            self._fetched_at = time.monotonic()
+        if changed:
+            for callback in list(self._callbacks):
+                callback(secret)
+        return changed
+
+    def stop(self):
+        """
+        Stops the background refresh thread.
+        """
+        self._stop.set()
+
+    def _ensure_refresher(self):
+        if not self.ttl or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name="credentials-refresh", daemon=True
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        stop = self._stop
+        delay = self._fetched_at + self.ttl * (1 - REFRESH_MARGIN) - time.monotonic()
+        while not stop.wait(max(delay, 0)):
+            try:
+                if self.refresh():
+                    logger.info("Database credentials rotated by %s provider", self.provider.name)
+                delay = self.ttl * (1 - REFRESH_MARGIN)
+            except Exception:
+                logger.exception("Refreshing database credentials failed")
+                delay = RETRY_INTERVAL
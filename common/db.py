@@ -1,47 +1,74 @@
-import boto3
-import json
+import os
+import threading
+import time
 import psycopg2
+from psycopg2 import extensions
 from flask import g
-from botocore.exceptions import ClientError
+from common.credentials import CredentialsCache, get_provider
+from common.metrics import observe_query
+from common.pool import ConnectionPool
 
-_cached_secret = None
+DB_NAME = os.environ.get("DB_NAME", "ecommerce_db")
+DB_HOST = os.environ.get("DB_HOST", "postgres")
+DB_PORT = os.environ.get("DB_PORT", "5432")
 
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "5"))
+DB_POOL_MAX_LIFETIME = float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+DB_POOL_PING_INTERVAL = float(os.environ.get("DB_POOL_PING_INTERVAL", "30"))
 
-def get_secret():
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_credentials = None
+_credentials_lock = threading.Lock()
+
+
+def get_credentials_cache():
     """
-    Fetches the database credentials from AWS Secrets Manager. Caches the result
-    to prevent multiple requests for the same secret.
+    Returns the process-wide credentials cache, creating it on first use.
+
+    The provider is chosen with DB_CREDENTIALS_PROVIDER (see `common.credentials`).
+    When the credentials are rotated, the connection pool is retired so that new
+    connections log in with the new credentials.
 
     Returns:
-        dict: A dictionary containing the secret values, including DB_USER and DB_PASSWORD.
+        CredentialsCache: The shared credentials cache.
     """
-    global _cached_secret
-
-    if _cached_secret:
-        return _cached_secret
+    global _credentials
 
-    secret_name = "ecommerce_db/db_credentials"
-    region_name = "eu-north-1"
+    if _credentials is None:
+        with _credentials_lock:
+            if _credentials is None:
+                cache = CredentialsCache(get_provider())
+                cache.on_change(_retire_pool)
+                _credentials = cache
+    return _credentials
 
-    session = boto3.session.Session()
-    client = session.client(service_name="secretsmanager", region_name=region_name)
 
-    try:
-        get_secret_value_response = client.get_secret_value(SecretId=secret_name)
-    except ClientError as e:
-        raise e
+def _retire_pool(secret):
+    pool = _pool
+    if pool is not None and _pool_pid == os.getpid():
+        pool.retire()
 
-    secret = get_secret_value_response["SecretString"]
-    secret_dict = json.loads(secret)
 
-    _cached_secret = secret_dict
+def get_secret():
+    """
+    Returns the database secret from the configured credentials provider. The
+    secret is cached and refreshed in the background before it expires.
 
-    return secret_dict
+    Returns:
+        dict: A dictionary containing the secret values, including DB_USER and DB_PASSWORD.
+    """
+    return get_credentials_cache().get()
 
 
 def get_db_credentials():
     """
-    Retrieves the database credentials (username and password) from the aws secret manager.
+    Retrieves the database credentials (username and password) from the configured
+    credentials provider.
 
     Returns:
         tuple: A tuple containing the database username and password.
@@ -53,14 +80,113 @@ def get_db_credentials():
     return db_user, db_password
 
 
-DB_NAME = "ecommerce_db"
-DB_HOST = "postgres"
-DB_PORT = "5432"
+class InstrumentedCursor(extensions.cursor):
+    """
+    A psycopg2 cursor that records the latency, row count and errors of every
+    statement it executes, labelled by the Flask endpoint that ran it.
+
+    See `common.metrics` for how the measurements are exposed.
+    """
+
+    def execute(self, query, vars=None):
+        started_at = time.perf_counter()
+        try:
+            result = super().execute(query, vars)
+        except Exception:
+            observe_query(query, time.perf_counter() - started_at, 0, True)
+            raise
+        observe_query(query, time.perf_counter() - started_at, self.rowcount, False)
+        return result
+
+    def executemany(self, query, vars_list):
+        started_at = time.perf_counter()
+        try:
+            result = super().executemany(query, vars_list)
+        except Exception:
+            observe_query(query, time.perf_counter() - started_at, 0, True)
+            raise
+        observe_query(query, time.perf_counter() - started_at, self.rowcount, False)
+        return result
+
+
+def connect():
+    """
+    Opens a new, unpooled database connection using the configured credentials.
+
+    Cursors of the connection are `InstrumentedCursor` instances.
+
+    Returns:
+        connection: A psycopg2 database connection object.
+    """
+    db_user, db_password = get_db_credentials()
+
+    return psycopg2.connect(
+        database=DB_NAME,
+        user=db_user,
+        password=db_password,
+        host=DB_HOST,
+        port=DB_PORT,
+        cursor_factory=InstrumentedCursor,
+    )
+
+
+def get_pool():
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    The pool is sized and tuned through the DB_POOL_* environment variables. Each
+    process gets its own pool: a forked worker never reuses its parent's connections.
+
+    Returns:
+        ConnectionPool: The shared connection pool.
+    """
+    global _pool, _pool_pid
+
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                # A pool inherited across fork() shares its sockets with the parent,
+                # so it is abandoned rather than closed.
+                _pool_pid = os.getpid()
+                _pool = ConnectionPool(
+                    connect,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                    pre_ping=DB_POOL_PRE_PING,
+                    ping_interval=DB_POOL_PING_INTERVAL,
+                )
+    return _pool
+
+
+def close_pool():
+    """
+    Closes the current process's connection pool, e.g. in a server's master process
+    before it forks workers. A new pool is created on the next `get_pool` call.
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def get_pool_stats():
+    """
+    Returns the current connection pool statistics.
+
+    Returns:
+        dict: Connections in use and idle, pool size and cumulative checkout, wait,
+        timeout and recycle counters.
+    """
+    return get_pool().stats()
 
 
 def get_db():
     """
-    Returns a database connection object, creating a new connection if none exists.
+    Returns a database connection object, checking one out of the pool if none exists.
 
     Uses Flask's `g` object to store the connection, which is accessible throughout the request lifecycle.
 
@@ -68,43 +194,41 @@ def get_db():
         connection: A psycopg2 database connection object.
     """
     if "db" not in g:
-        db_user, db_password = get_db_credentials()
-
-        g.db = psycopg2.connect(
-            database=DB_NAME,
-            user=db_user,
-            password=db_password,
-            host=DB_HOST,
-            port=DB_PORT,
-        )
+        g.db = get_pool().getconn()
     return g.db
 
 
 def close_db(e=None):
     """
-    Closes the current database connection stored in Flask's `g` object.
+    Returns the current database connection stored in Flask's `g` object to the pool.
+
+    Any transaction left open by the request is rolled back before the connection is reused.
 
     Args:
         e (optional): An exception that may have been raised during request handling.
     """
     db = g.pop("db", None)
     if db is not None:
-        db.close()
+        get_pool().putconn(db)
+
+
+def detach_db():
+    """
+    Removes the current database connection from Flask's `g` object so that it outlives
+    the request, e.g. while a streamed response is still reading from it.
+
+    The caller becomes responsible for handing it back with `get_pool().putconn()`.
+
+    Returns:
+        connection: The detached psycopg2 connection, or None if the request had none.
+    """
+    return g.pop("db", None)
 
 
 def init_db_connection():
     """
-    Initializes a new database connection (used during the setup process) and immediately closes it.
+    Initializes the connection pool and opens its minimum number of connections.
 
     This function is typically called at the application startup.
     """
-    db_user, db_password = get_db_credentials()
-
-    conn = psycopg2.connect(
-        database=DB_NAME,
-        user=db_user,
-        password=db_password,
-        host=DB_HOST,
-        port=DB_PORT,
-    )
-    conn.close()
+    get_pool().warm_up()
@@ -0,0 +1,623 @@
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from psycopg2 import sql
+
+logger = logging.getLogger(__name__)
+
+METRICS_DIR = os.environ.get("METRICS_DIR")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "1"))
+
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_MAX_STATEMENT_LENGTH = 200
+_COMPOSED_LIST = re.compile(r"\{\}(?:, \{\})+")
+
+
+class Histogram:
+    """
+    A cumulative histogram in the Prometheus style: observations are counted in
+    every bucket whose upper bound they do not exceed, plus a running sum and count.
+
+    Args:
+        buckets (tuple): The sorted upper bounds of the buckets.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Records one observation. Callers must hold the registry lock.
+        """
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """
+    Holds the process's histograms and counters, keyed by metric name and labels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+
+    def observe(self, name, labels, value, help_text=""):
+        """
+        Records `value` in the histogram `name` with the given labels.
+
+        Args:
+            name (str): The metric name.
+            labels (tuple): A tuple of (label, value) pairs.
+            value (float): The observed value.
+            help_text (str): The metric description.
+        """
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+                self._help.setdefault(name, help_text)
+            histogram.observe(value)
+
+    def inc(self, name, labels, amount=1, help_text=""):
+        """
+        Adds `amount` to the counter `name` with the given labels.
+
+        Args:
+            name (str): The metric name.
+            labels (tuple): A tuple of (label, value) pairs.
+            amount (float): The increment.
+            help_text (str): The metric description.
+        """
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+            self._help.setdefault(name, help_text)
+
+    def snapshot(self):
+        """
+        Copies every recorded metric.
+
+        Returns:
+            dict: A snapshot, as taken by `worker_snapshot`, without gauges.
+        """
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "histograms": [
+                    [name, labels, list(h.counts), h.sum, h.count, h.buckets]
+                    for (name, labels), h in self._histograms.items()
+                ],
+                "counters": [
+                    [name, labels, value] for (name, labels), value in self._counters.items()
+                ],
+                "gauges": [],
+                "help": dict(self._help),
+            }
+
+    def clear(self):
+        """
+        Drops every recorded metric.
+        """
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+registry = MetricsRegistry()
+
+
+class SharedMetrics:
+    """
+    Shares the metrics of the worker processes of a server through a directory,
+    so that whichever worker answers `GET /metrics` reports all of them.
+
+    Every `interval` seconds each worker writes a snapshot of its metrics to
+    ``worker-<pid>.json`` from a daemon thread, and a scrape adds the other
+    workers' latest snapshots to its own live metrics, so they are at most
+    `interval` seconds old. When a worker exits, the server's master folds its
+    histograms and counters into ``retired.json`` with `retire`, so that counters
+    never go backwards, and drops its gauges.
+
+    Args:
+        directory (str): The directory shared by the workers; it is created if needed.
+        interval (float): Seconds between a worker's snapshots.
+    """
+
+    def __init__(self, directory, interval=METRICS_FLUSH_INTERVAL):
+        self.directory = directory
+        self.interval = interval
+        os.makedirs(directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(directory, ".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._app = None
+
+    def ensure_running(self, app):
+        """
+        Starts writing this worker's snapshots if it is not doing so yet.
+
+        Args:
+            app (Flask): The application whose metrics are written.
+        """
+        if self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._app = app
+            self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def flush(self):
+        """
+        Writes this worker's snapshot now, e.g. as it exits.
+        """
+        if self._app is None or self._thread_pid != os.getpid():
+            return
+        path = self._path(os.getpid())
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(worker_snapshot(self._app), file)
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self):
+        """
+        Reads the latest snapshots of the other workers and of the retired ones.
+
+        Returns:
+            list: The snapshots.
+        """
+        own = self._path(os.getpid())
+        snapshots = []
+        with self._locked(fcntl.LOCK_SH):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".json") and entry.path != own:
+                    with open(entry.path) as file:
+                        snapshots.append(json.load(file))
+        return snapshots
+
+    def retire(self, pid):
+        """
+        Folds the histograms and counters of a worker that has exited into the
+        retired metrics and removes its snapshot.
+
+        Args:
+            pid (int): The worker's process ID.
+        """
+        path = self._path(pid)
+        retired_path = os.path.join(self.directory, "retired.json")
+        with self._locked(fcntl.LOCK_EX):
+            try:
+                with open(path) as file:
+                    snapshots = [json.load(file)]
+            except FileNotFoundError:
+                return
+            if os.path.exists(retired_path):
+                with open(retired_path) as file:
+                    snapshots.append(json.load(file))
+            retired = merge_snapshots(snapshots)
+            retired["gauges"] = []
+            with open(f"{retired_path}.tmp", "w") as file:
+                json.dump(retired, file)
+            os.replace(f"{retired_path}.tmp", retired_path)
+            os.remove(path)
+
+    def reset(self):
+        """
+        Removes every snapshot, e.g. when the server starts.
+        """
+        with self._locked(fcntl.LOCK_EX):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith((".json", ".json.tmp")):
+                    os.remove(entry.path)
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f"worker-{pid}.json")
+
+    @contextmanager
+    def _locked(self, mode):
+        fcntl.lockf(self._lock_fd, mode)
+        try:
+            yield
+        finally:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Writing the worker's metrics failed")
+
+
+shared_metrics = SharedMetrics(METRICS_DIR) if METRICS_DIR else None
+
+
+def merge_snapshots(snapshots, label_gauges=False):
+    """
+    Adds up the histograms and counters of several snapshots.
+
+    Args:
+        snapshots (list): Snapshots, as taken by `worker_snapshot`.
+        label_gauges (bool): Give every gauge a ``pid`` label with the process it
+            describes. Otherwise a later snapshot's gauge replaces an earlier one's.
+
+    Returns:
+        dict: The merged snapshot.
+    """
+    histograms = {}
+    counters = {}
+    gauges = {}
+    help_texts = {}
+    for snapshot in snapshots:
+        for name, help_text in snapshot["help"].items():
+            help_texts.setdefault(name, help_text)
+        for name, labels, counts, total, count, buckets in snapshot["histograms"]:
+            key = (name, _labels(labels))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = [list(counts), total, count, tuple(buckets)]
+            else:
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+        for name, labels, value in snapshot["counters"]:
+            key = (name, _labels(labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, value in snapshot["gauges"]:
+            labels = _labels(labels)
+            if label_gauges:
+                labels += (("pid", str(snapshot["pid"])),)
+            gauges[(name, labels)] = value
+
+    return {
+        "pid": os.getpid(),
+        "histograms": [[name, labels] + merged for (name, labels), merged in histograms.items()],
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "gauges": [[name, labels, value] for (name, labels), value in gauges.items()],
+        "help": help_texts,
+    }
+
+
+def render_snapshot(snapshot):
+    """
+    Renders a merged snapshot in the Prometheus text exposition format.
+
+    Args:
+        snapshot (dict): A snapshot returned by `merge_snapshots`.
+
+    Returns:
+        list: The lines of the exposition.
+    """
+    help_texts = snapshot["help"]
+    lines = []
+    histograms = sorted(snapshot["histograms"])
+    for name in sorted({entry[0] for entry in histograms}):
+        lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+        lines.append(f"# TYPE {name} histogram")
+        for metric, labels, counts, total, count, buckets in histograms:
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, bucket_count in zip(buckets, counts):
+                cumulative += bucket_count
+                lines.append(
+                    f"{name}_bucket{format_labels(labels + (('le', repr(bound)),))} {cumulative}"
+                )
+            lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+    for kind in ("counters", "gauges"):
+        entries = sorted(snapshot[kind])
+        for name in sorted({entry[0] for entry in entries}):
+            lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+            lines.append(f"# TYPE {name} {kind[:-1]}")
+            for metric, labels, value in entries:
+                if metric == name:
+                    lines.append(f"{name}{format_labels(labels)} {value}")
+
+    return lines
+
+
+def format_labels(labels):
+    """
+    Formats label pairs as ``{name="value",...}``, escaping values as required by
+    the exposition format.
+
+    Args:
+        labels (tuple): A tuple of (label, value) pairs.
+
+    Returns:
+        str: The formatted label set, or an empty string if there are no labels.
+    """
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"),
+        )
+        for name, value in labels
+    )
+    return "{" + pairs + "}"
+
+
+def current_endpoint():
+    """
+    Returns the blueprint endpoint handling the current request (e.g.
+    ``sales.make_purchase``), or ``"none"`` outside of a request.
+    """
+    if has_request_context() and request.endpoint:
+        return request.endpoint
+    return "none"
+
+
+def _statement_skeleton(query):
+    """
+    Renders a composed statement with every identifier, literal and placeholder
+    replaced by `{}`, collapsing joined lists such as a field projection into one.
+
+    Args:
+        query (Composable): The composed statement.
+
+    Returns:
+        str: The SQL skeleton of the statement.
+    """
+    if isinstance(query, sql.SQL):
+        return query.string
+    if isinstance(query, sql.Composed):
+        return _COMPOSED_LIST.sub("{}", "".join(_statement_skeleton(part) for part in query.seq))
+    return "{}"
+
+
+def normalize_statement(query):
+    """
+    Collapses whitespace in an SQL template so it can be used as a metric label.
+    Parameters are never part of the template, so the label set stays bounded.
+    Composed statements are labelled by their skeleton for the same reason.
+
+    Args:
+        query (str | bytes | Composable): The statement passed to `cursor.execute`.
+
+    Returns:
+        str: The normalised statement, truncated to a reasonable length.
+    """
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    elif isinstance(query, sql.Composable):
+        query = _statement_skeleton(query)
+    elif not isinstance(query, str):
+        query = repr(query)
+    return _WHITESPACE.sub(" ", query).strip()[:_MAX_STATEMENT_LENGTH]
+
+
+def observe_query(query, duration, rows, error):
+    """
+    Records the latency, row count and outcome of one SQL statement.
+
+    Args:
+        query (str): The SQL template that was executed.
+        duration (float): The execution time in seconds.
+        rows (int): The number of rows returned or affected (-1 if unknown).
+        error (bool): Whether the statement raised an error.
+    """
+    labels = (("endpoint", current_endpoint()), ("statement", normalize_statement(query)))
+    registry.observe(
+        "ecommerce_db_query_duration_seconds",
+        labels,
+        duration,
+        "Time spent executing SQL statements.",
+    )
+    if rows and rows > 0:
+        registry.inc(
+            "ecommerce_db_query_rows_total",
+            labels,
+            rows,
+            "Rows returned or affected by SQL statements.",
+        )
+    if error:
+        registry.inc(
+            "ecommerce_db_query_errors_total",
+            labels,
+            1,
+            "SQL statements that raised an error.",
+        )
+
+
+def init_metrics(app, limiter=None):
+    """
+    Records a latency histogram for every request and exposes all metrics at
+    ``GET /metrics`` in the Prometheus text format.
+
+    Args:
+        app (Flask): The Flask application instance.
+        limiter (Limiter, optional): The rate limiter; `/metrics` is exempted from it.
+    """
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+        if shared_metrics is not None:
+            shared_metrics.ensure_running(app)
+
+    @app.after_request
+    def observe_request(response):
+        started_at = g.pop("request_started_at", None)
+        if started_at is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            registry.observe(
+                "ecommerce_http_request_duration_seconds",
+                (
+                    ("route", route),
+                    ("method", request.method),
+                    ("status", str(response.status_code)),
+                ),
+                time.perf_counter() - started_at,
+                "Time spent handling HTTP requests.",
+            )
+        return response
+
+    def metrics():
+        """
+        Returns the request, query, connection pool and cache metrics in the
+        Prometheus text exposition format. With `METRICS_DIR` set, histograms and
+        counters are added up across the server's workers, and gauges are
+        reported per worker with a ``pid`` label.
+        """
+        snapshots = [worker_snapshot(app)]
+        if shared_metrics is not None:
+            snapshots += shared_metrics.collect()
+        snapshot = merge_snapshots(snapshots, label_gauges=shared_metrics is not None)
+        return Response(
+            "\n".join(render_snapshot(snapshot)) + "\n",
+            mimetype="text/plain; version=0.0.4",
+        )
+
+    app.add_url_rule("/metrics", "metrics", metrics, methods=["GET"])
+    if limiter is not None:
+        limiter.exempt(metrics)
+
+
+def worker_snapshot(app):
+    """
+    Takes a snapshot of this process's metrics: the registry, and the statistics
+    of the connection pool and of the app's caches.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        dict: The process ID, the histograms, counters and gauges as lists of
+        ``[name, labels, ...]`` entries that can be serialised as JSON, and the
+        help texts.
+    """
+    from common.db import get_pool_stats
+
+    snapshot = registry.snapshot()
+
+    def add(kind, name, value, help_text, labels=()):
+        snapshot[kind].append([name, labels, value])
+        snapshot["help"].setdefault(name, help_text)
+
+    pool = get_pool_stats()
+    for state in ("in_use", "idle"):
+        add(
+            "gauges",
+            "ecommerce_db_pool_connections",
+            pool[state],
+            "Connections in the pool by state.",
+            (("state", state),),
+        )
+    for counter in ("checkouts", "waits", "timeouts", "recycled"):
+        add(
+            "counters",
+            f"ecommerce_db_pool_{counter}_total",
+            pool[counter],
+            f"Connection pool {counter}.",
+        )
+
+    caches = (
+        ("sales_catalog", "ecommerce_sales_catalog", "Sales catalog replica"),
+        ("sales_suggest", "ecommerce_sales_suggest", "Sales suggestion index"),
+        ("token_revocations", "ecommerce_auth_revocation", "Token revocation list"),
+    )
+    for extension, prefix, description in caches:
+        cache = app.extensions.get(extension)
+        if cache is None:
+            continue
+        stats = cache.stats()
+        for counter in ("hits", "misses", "full_reloads"):
+            add("counters", f"{prefix}_{counter}_total", stats[counter], f"{description} {counter}.")
+
+    catalog = app.extensions.get("sales_catalog")
+    if catalog is not None:
+        add(
+            "gauges",
+            "ecommerce_sales_catalog_items",
+            catalog.stats()["items"],
+            "Items in the sales catalog replica.",
+        )
+
+    suggest = app.extensions.get("sales_suggest")
+    if suggest is not None:
+        stats = suggest.stats()
+        for gauge in ("items", "keys", "bytes"):
+            add(
+                "gauges",
+                f"ecommerce_sales_suggest_{gauge}",
+                stats[gauge],
+                f"Sales suggestion index {gauge}.",
+            )
+        add(
+            "gauges",
+            "ecommerce_sales_suggest_truncated",
+            int(stats["truncated"]),
+            "Whether the sales suggestion index left items out to fit its memory limit.",
+        )
+
+    hot_items = app.extensions.get("sales_hot_items")
+    if hot_items is not None:
+        stats = hot_items.stats()
+        add("gauges", "ecommerce_sales_hot_items", stats["items"], "Items promoted to hot items.")
+        for counter in ("promotions", "demotions"):
+            add(
+                "counters",
+                f"ecommerce_sales_hot_item_{counter}_total",
+                stats[counter],
+                f"Hot item {counter}.",
+            )
+
+    revocations = app.extensions.get("token_revocations")
+    if revocations is not None:
+        add(
+            "gauges",
+            "ecommerce_auth_revoked_tokens",
+            revocations.stats()["tokens"],
+            "Revoked, unexpired session tokens.",
+        )
+
+    return snapshot
+
+
+def _labels(labels):
+    return tuple((name, value) for name, value in labels)
@@ -0,0 +1,219 @@
+import argparse
+import os
+import re
+import sys
+
+import psycopg2
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations"
+)
+SCHEMA_VERSION_TABLE = "schema_version"
+MIGRATION_LOCK_ID = 4350001
+
+_MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+class SchemaVersionError(RuntimeError):
+    """
+    Raised at startup when the database schema is older than the code expects.
+    """
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    """
+    Lists the migration files in `directory`, ordered by version.
+
+    Migration files are named ``NNNN_description.sql`` where ``NNNN`` is a
+    unique, increasing version number.
+
+    Args:
+        directory (str): The directory containing the migration files.
+
+    Returns:
+        list: A list of (version, name, path) tuples sorted by version.
+    """
+    migrations = []
+    for filename in os.listdir(directory):
+        match = _MIGRATION_FILE.match(filename)
+        if match:
+            migrations.append(
+                (int(match.group(1)), match.group(2), os.path.join(directory, filename))
+            )
+    migrations.sort()
+
+    versions = [migration[0] for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise SchemaVersionError(f"Duplicate migration versions in {directory}")
+
+    return migrations
+
+
+def latest_version(directory=MIGRATIONS_DIR):
+    """
+    Returns the version of the newest migration shipped with the code.
+
+    Returns:
+        int: The highest migration version, or 0 if there are no migrations.
+    """
+    migrations = load_migrations(directory)
+    return migrations[-1][0] if migrations else 0
+
+
+def get_current_version(conn):
+    """
+    Reads the schema version recorded in the database.
+
+    Args:
+        conn (connection): A psycopg2 database connection.
+
+    Returns:
+        int: The highest applied migration version, or 0 for an empty database.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT COALESCE(MAX(version), 0) FROM {SCHEMA_VERSION_TABLE}")
+        version = cur.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        conn.rollback()
+        return 0
+    finally:
+        cur.close()
+    conn.rollback()
+    return version
+
+
+def apply_migrations(conn, target=None, directory=MIGRATIONS_DIR):
+    """
+    Applies every pending migration up to `target`, each in its own transaction.
+
+    A PostgreSQL advisory lock serialises concurrent runners, so several
+    containers may call this at the same time without racing on DDL.
+
+    Args:
+        conn (connection): A psycopg2 database connection.
+        target (int, optional): The version to migrate to. Defaults to the latest.
+        directory (str): The directory containing the migration files.
+
+    Returns:
+        list: The versions that were applied, in order.
+    """
+    applied = []
+    cur = conn.cursor()
+    cur.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+    try:
+        cur.execute(
+            f"""CREATE TABLE IF NOT EXISTS {SCHEMA_VERSION_TABLE} (
+                version INT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );"""
+        )
+        conn.commit()
+
+        current = get_current_version(conn)
+        for version, name, path in load_migrations(directory):
+            if version <= current or (target is not None and version > target):
+                continue
+
+            with open(path) as migration_file:
+                statements = migration_file.read()
+
+            try:
+                cur.execute(statements)
+                cur.execute(
+                    f"INSERT INTO {SCHEMA_VERSION_TABLE} (version, name) VALUES (%s, %s)",
+                    (version, name),
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            applied.append(version)
+    finally:
+        cur.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        cur.close()
+
+    return applied
+
+
+def check_schema_version(conn, required=None):
+    """
+    Verifies that the database has been migrated to at least `required`.
+
+    This is the only schema work done while an application boots; it runs a
+    single query and never issues DDL.
+
+    Args:
+        conn (connection): A psycopg2 database connection.
+        required (int, optional): The minimum version. Defaults to the latest migration.
+
+    Returns:
+        int: The schema version found in the database.
+
+    Raises:
+        SchemaVersionError: If the database schema is older than `required`.
+    """
+    if required is None:
+        required = latest_version()
+
+    current = get_current_version(conn)
+    if current < required:
+        raise SchemaVersionError(
+            f"Database schema is at version {current} but version {required} is required. "
+            "Run 'python -m common.migrations upgrade' first."
+        )
+    return current
+
+
+def main(argv=None):
+    """
+    Command line entry point for managing the database schema.
+
+    Commands:
+        upgrade [--target N]: Applies pending migrations.
+        current: Prints the schema version recorded in the database.
+        pending: Lists migrations that have not been applied yet.
+
+    Args:
+        argv (list, optional): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code.
+    """
+    from common.db import connect
+
+    parser = argparse.ArgumentParser(
+        prog="python -m common.migrations",
+        description="Manage the ecommerce database schema.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    upgrade_parser = subparsers.add_parser("upgrade", help="apply pending migrations")
+    upgrade_parser.add_argument("--target", type=int, help="version to migrate to")
+    subparsers.add_parser("current", help="print the current schema version")
+    subparsers.add_parser("pending", help="list migrations not applied yet")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == "upgrade":
+            applied = apply_migrations(conn, target=args.target)
+            for version in applied:
+                print(f"Applied migration {version:04d}")
+            print(f"Schema is at version {get_current_version(conn)}")
+        elif args.command == "current":
+            print(get_current_version(conn))
+        elif args.command == "pending":
+            current = get_current_version(conn)
+            for version, name, _ in load_migrations():
+                if version > current:
+                    print(f"{version:04d}_{name}")
+    finally:
+        conn.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
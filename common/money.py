@@ -0,0 +1,49 @@
+from decimal import Decimal, InvalidOperation
+
+
+def to_cents(value):
+    """
+    Converts an amount from a request body to a whole number of cents.
+
+    Numbers are read through their decimal representation, so 0.1 becomes
+    exactly 10 cents rather than the nearest binary float. Decimal strings such
+    as ``"12.50"`` are accepted too.
+
+    Args:
+        value (int | float | str): The amount in currency units.
+
+    Returns:
+        int: The amount in cents.
+
+    Raises:
+        ValueError: If `value` is not a number or has more than two decimal places.
+    """
+    if isinstance(value, bool):
+        raise ValueError("Amount must be a number")
+    if isinstance(value, int):
+        return value * 100
+    if not isinstance(value, (float, str)):
+        raise ValueError("Amount must be a number")
+    try:
+        cents = Decimal(str(value)) * 100
+    except InvalidOperation:
+        raise ValueError("Amount must be a number")
+    if not cents.is_finite() or cents != cents.to_integral_value():
+        raise ValueError("Amount must have at most two decimal places")
+    return int(cents)
+
+
+def format_cents(cents):
+    """
+    Renders a number of cents as a decimal string with two decimal places, e.g.
+    ``1250`` as ``"12.50"``, using integer arithmetic only.
+
+    Args:
+        cents (int): The amount in cents.
+
+    Returns:
+        str: The amount in currency units.
+    """
+    if cents >= 0:
+        return f"{cents // 100}.{cents % 100:02d}"
+    return f"-{-cents // 100}.{-cents % 100:02d}"
@@ -0,0 +1,186 @@
+import os
+import select
+import threading
+import time
+import weakref
+
+from psycopg2 import extensions
+
+INVENTORY_CHANNEL = "inventory_changed"
+
+# NOTIFY payloads are limited to 8000 bytes; larger change sets are sent as a
+# full invalidation instead.
+MAX_PAYLOAD = 7900
+ALL = "*"
+
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_listener = None
+
+
+def notify_inventory_change(cur, item_ids=None):
+    """
+    Announces that inventory rows changed.
+
+    A NOTIFY is queued on `INVENTORY_CHANNEL` and is delivered to other processes
+    when the surrounding transaction commits. Subscribers in this process are
+    told immediately, so a request that follows the write in the same worker
+    never reads a stale catalog.
+
+    Args:
+        cur (cursor): A cursor of the transaction that changed the rows.
+        item_ids (iterable, optional): The IDs of the changed items. None means
+            that any item may have changed.
+    """
+    publish(cur, INVENTORY_CHANNEL, item_ids)
+
+
+def publish(cur, channel, ids=None):
+    """
+    Queues a NOTIFY carrying `ids` on `channel` and dispatches it to local subscribers.
+
+    Args:
+        cur (cursor): A cursor of the transaction that made the change.
+        channel (str): The notification channel.
+        ids (iterable, optional): The changed IDs, or None for "everything".
+    """
+    if ids is not None:
+        ids = [int(i) for i in ids]
+    payload = ALL if ids is None else ",".join(str(i) for i in ids)
+    if len(payload) > MAX_PAYLOAD:
+        ids, payload = None, ALL
+
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+    _dispatch(channel, ids)
+
+
+def subscribe(channel, callback):
+    """
+    Registers `callback` for notifications on `channel` and starts the
+    process-wide listener thread if it is not running yet.
+
+    Bound methods are held weakly, so subscribing an object does not keep it alive.
+    The callback receives a list of IDs, or None when every row must be treated
+    as changed (including after the listener reconnects and may have missed
+    notifications).
+
+    Args:
+        channel (str): The notification channel.
+        callback (callable): Called with the changed IDs.
+    """
+    if hasattr(callback, "__self__"):
+        ref = weakref.WeakMethod(callback)
+    else:
+        ref = lambda: callback  # noqa: E731
+
+    with _subscribers_lock:
+        _subscribers.setdefault(channel, []).append(ref)
+
+    _ensure_listener().listen(channel)
+
+
+def last_heartbeat():
+    """
+    Returns when the listener last confirmed it was connected and draining
+    notifications, as a `time.monotonic()` value, or None if it never did.
+    """
+    listener = _listener
+    if listener is None or listener.pid != os.getpid():
+        return None
+    return listener.heartbeat
+
+
+def _dispatch(channel, ids):
+    with _subscribers_lock:
+        refs = _subscribers.get(channel, [])
+        callbacks = [ref() for ref in refs]
+        _subscribers[channel] = [ref for ref, cb in zip(refs, callbacks) if cb is not None]
+
+    for callback in callbacks:
+        if callback is not None:
+            callback(ids)
+
+
+def _ensure_listener():
+    global _listener
+
+    with _subscribers_lock:
+        if _listener is None or _listener.pid != os.getpid() or not _listener.is_alive():
+            _listener = _Listener()
+            _listener.start()
+        return _listener
+
+
+class _Listener(threading.Thread):
+    """
+    A daemon thread holding one dedicated connection that LISTENs on every
+    subscribed channel and dispatches incoming notifications.
+    """
+
+    poll_interval = 1.0
+
+    def __init__(self):
+        super().__init__(name="pg-listener", daemon=True)
+        self.pid = os.getpid()
+        self.heartbeat = None
+        self._channels = set()
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def listen(self, channel):
+        with self._lock:
+            if channel not in self._channels:
+                self._channels.add(channel)
+                self._pending.add(channel)
+
+    def run(self):
+        from common.db import connect
+
+        backoff = self.poll_interval
+        while True:
+            conn = None
+            try:
+                conn = connect()
+                conn.set_isolation_level(extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with self._lock:
+                    self._pending = set(self._channels)
+                reconnected = True
+                backoff = self.poll_interval
+
+                while True:
+                    self._listen_pending(conn)
+                    if reconnected:
+                        # Anything may have changed while we were not listening.
+                        for channel in list(self._channels):
+                            _dispatch(channel, None)
+                        reconnected = False
+                    self.heartbeat = time.monotonic()
+
+                    if select.select([conn], [], [], self.poll_interval) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notification = conn.notifies.pop(0)
+                        _dispatch(notification.channel, _parse(notification.payload))
+            except Exception:
+                self.heartbeat = None
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _listen_pending(self, conn):
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if pending:
+            cur = conn.cursor()
+            for channel in pending:
+                cur.execute(f'LISTEN "{channel}"')
+            cur.close()
+
+
+def _parse(payload):
+    if not payload or payload == ALL:
+        return None
+    return [int(i) for i in payload.split(",")]
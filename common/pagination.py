@@ -0,0 +1,66 @@
+import base64
+import binascii
+import json
+
+
+def encode_cursor(values):
+    """
+    Encodes the keyset position of the last row of a page as an opaque token.
+
+    Args:
+        values (list): The sort key values of the last row returned.
+
+    Returns:
+        str: A URL-safe token to pass back to get the next page.
+    """
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Decodes a token produced by `encode_cursor`.
+
+    Args:
+        token (str): The opaque cursor token.
+
+    Returns:
+        list: The sort key values stored in the token.
+
+    Raises:
+        ValueError: If the token is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_limit(value, default, maximum):
+    """
+    Parses a page size query parameter, capping it at `maximum`.
+
+    Args:
+        value (str): The raw query parameter, or None if it was not given.
+        default (int): The page size used when `value` is None.
+        maximum (int): The largest page size a client may request.
+
+    Returns:
+        int: The page size to use.
+
+    Raises:
+        ValueError: If `value` is not a positive integer.
+    """
+    if value is None:
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit must be a positive integer")
+    if limit <= 0:
+        raise ValueError("limit must be a positive integer")
+    return min(limit, maximum)
@@ -0,0 +1,285 @@
+import threading
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out of the pool before the
+    configured timeout expired.
+    """
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of psycopg2 connections shared by the whole process.
+
+    Connections are opened lazily up to ``max_size`` and handed back to the pool
+    instead of being closed, so requests no longer pay for a TCP and
+    authentication handshake with PostgreSQL. Connections older than
+    ``max_lifetime`` seconds are recycled, and connections that sat idle for
+    longer than ``ping_interval`` seconds are checked with ``SELECT 1`` before
+    being handed out when ``pre_ping`` is enabled.
+
+    Args:
+        connect (callable): A function returning a new psycopg2 connection.
+        min_size (int): Number of connections opened by `warm_up`.
+        max_size (int): Maximum number of connections open at the same time.
+        timeout (float): Seconds to wait for a free connection before raising `PoolTimeout`.
+        max_lifetime (float): Seconds after which a connection is closed and replaced.
+        pre_ping (bool): Whether idle connections are validated before checkout.
+        ping_interval (float): Idle seconds after which a connection is pinged on checkout.
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size=1,
+        max_size=10,
+        timeout=5.0,
+        max_lifetime=1800.0,
+        pre_ping=True,
+        ping_interval=30.0,
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping = pre_ping
+        self.ping_interval = ping_interval
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._created_at = {}
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._retired_at = 0.0
+
+        self._checkouts = 0
+        self._waits = 0
+        self._timeouts = 0
+        self._recycled = 0
+
+    def warm_up(self):
+        """
+        Opens connections until at least ``min_size`` of them are available.
+        """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size or self._closed:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+
+    def getconn(self):
+        """
+        Checks a connection out of the pool, opening a new one if the pool has
+        not reached ``max_size`` yet, or waiting for one to be returned otherwise.
+
+        Returns:
+            connection: A psycopg2 connection with no transaction in progress.
+
+        Raises:
+            PoolTimeout: If no connection became available within ``timeout`` seconds.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited = False
+
+        while True:
+            conn = None
+            returned_at = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(
+                            f"Timed out after {self.timeout}s waiting for a database connection"
+                        )
+                    if not waited:
+                        waited = True
+                        self._waits += 1
+                    self._cond.wait(remaining)
+                self._in_use += 1
+
+            if conn is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._release_slot()
+                    raise
+            elif not self._is_usable(conn, returned_at):
+                self._discard(conn)
+                self._release_slot()
+                with self._cond:
+                    self._recycled += 1
+                continue
+
+            with self._cond:
+                self._checkouts += 1
+            return conn
+
+    def putconn(self, conn, discard=False):
+        """
+        Returns a connection to the pool. Any open transaction is rolled back so
+        the next user starts from a clean state; broken connections are closed.
+
+        Args:
+            conn (connection): A connection previously obtained from `getconn`.
+            discard (bool): Close the connection instead of keeping it idle.
+        """
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+
+        if discard or conn.closed:
+            self._discard(conn)
+            self._release_slot()
+            return
+
+        if self._created_at.get(id(conn), 0.0) < self._retired_at:
+            self._discard(conn)
+            self._release_slot()
+            with self._cond:
+                self._recycled += 1
+            return
+
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+                self._created_at.pop(id(conn), None)
+                conn.close()
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def retire(self):
+        """
+        Replaces every connection opened so far, e.g. after the database
+        credentials were rotated. Idle connections are closed immediately;
+        connections in use finish their current request undisturbed and are closed
+        when they are returned. New connections are opened on demand.
+        """
+        with self._cond:
+            self._retired_at = time.monotonic()
+            retired = list(self._idle)
+            self._idle.clear()
+            self._size -= len(retired)
+            self._recycled += len(retired)
+            for conn, _ in retired:
+                self._created_at.pop(id(conn), None)
+            self._cond.notify_all()
+        for conn, _ in retired:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def closeall(self):
+        """
+        Closes every idle connection and refuses further checkouts. Connections
+        still in use are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._size -= 1
+                self._created_at.pop(id(conn), None)
+                conn.close()
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Returns a snapshot of the pool counters.
+
+        Returns:
+            dict: Sizes (``size``, ``in_use``, ``idle``, ``min_size``, ``max_size``) and
+            cumulative counters (``checkouts``, ``waits``, ``timeouts``, ``recycled``).
+        """
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "checkouts": self._checkouts,
+                "waits": self._waits,
+                "timeouts": self._timeouts,
+                "recycled": self._recycled,
+            }
+
+    def _open(self):
+        # Taken before connecting, so a connection that was being opened when the
+        # pool was retired counts as retired too.
+        started_at = time.monotonic()
+        conn = self._connect()
+        with self._cond:
+            self._created_at[id(conn)] = started_at
+        return conn
+
+    def _is_usable(self, conn, returned_at):
+        if conn.closed:
+            return False
+
+        now = time.monotonic()
+        created_at = self._created_at.get(id(conn), now)
+        if created_at < self._retired_at:
+            return False
+        if self.max_lifetime and now - created_at > self.max_lifetime:
+            return False
+
+        if self.pre_ping and now - returned_at >= self.ping_interval:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.close()
+                conn.rollback()
+            except psycopg2.Error:
+                return False
+
+        return True
+
+    def _discard(self, conn):
+        with self._cond:
+            self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def _release_slot(self):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
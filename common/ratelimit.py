@@ -0,0 +1,282 @@
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+import urllib.parse
+from math import floor
+
+from limits.storage.base import SlidingWindowCounterSupport, Storage
+
+RATELIMIT_STORAGE_URI = os.environ.get(
+    "RATELIMIT_STORAGE_URI", "shm:///tmp/ecommerce-ratelimit"
+)
+RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "sliding-window-counter")
+
+_MAGIC = b"ECRL0001"
+_HEADER = struct.Struct("<8sQQ")
+# key hash, window (fixed window: expiry timestamp; sliding window: window number),
+# current count, previous count, last access time.
+_SLOT = struct.Struct("<QdIId")
+_WAYS = 8
+_LOCK_STRIPES = 64
+
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport):
+    """
+    A rate limit storage shared by every worker process on a host.
+
+    Counters live in a memory-mapped file laid out as a fixed-size,
+    `_WAYS`-way set-associative hash table. A key is hashed to one set, so
+    every operation touches at most `_WAYS` slots and takes O(1) time. Each
+    set is guarded by an in-process lock and an ``fcntl`` byte-range lock on
+    the file, so updates are atomic across threads and processes. When a set
+    is full, the least recently used entry in it is evicted, which keeps the
+    memory used by idle client keys bounded.
+
+    Both the fixed-window and the sliding-window-counter strategies are
+    supported. Configure it with a URI such as
+    ``shm:///tmp/ecommerce-ratelimit?slots=65536``.
+    """
+
+    STORAGE_SCHEME = ["shm"]
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        parsed = urllib.parse.urlparse(uri or RATELIMIT_STORAGE_URI)
+        query = urllib.parse.parse_qs(parsed.query)
+        slots = int(options.get("slots", query.get("slots", ["65536"])[0]))
+
+        self.path = parsed.path
+        self.sets = max(1, slots // _WAYS)
+        self._fd, self._map = _open_table(self.path, self.sets)
+        self._locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+
+    @property
+    def base_exceptions(self):
+        return OSError
+
+    def incr(self, key, expiry, amount=1):
+        """
+        Increments the fixed-window counter of `key`, starting a new window of
+        `expiry` seconds if the previous one has ended.
+
+        Returns:
+            int: The counter value after the increment.
+        """
+        now = time.time()
+        with self._set(key) as table:
+            index, key_hash, expires_at, count, _ = table.find(key, now)
+            if expires_at <= now:
+                expires_at, count = now + expiry, 0
+            count += amount
+            table.write(index, key_hash, expires_at, count, 0, now)
+            return count
+
+    def get(self, key):
+        """
+        Returns the fixed-window counter of `key`, or 0 if its window has ended.
+        """
+        now = time.time()
+        with self._set(key) as table:
+            _, _, expires_at, count, _ = table.find(key, now, create=False)
+            return count if expires_at > now else 0
+
+    def get_expiry(self, key):
+        """
+        Returns the time at which the fixed window of `key` ends.
+        """
+        now = time.time()
+        with self._set(key) as table:
+            _, _, expires_at, _, _ = table.find(key, now, create=False)
+            return expires_at if expires_at > now else now
+
+    def clear(self, key):
+        """
+        Resets the counters of `key`.
+        """
+        with self._set(key) as table:
+            index, _, _, _, _ = table.find(key, time.time(), create=False)
+            if index is not None:
+                table.write(index, 0, 0.0, 0, 0, 0.0)
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        """
+        Records `amount` hits for `key` if the weighted count of the previous and
+        current windows stays within `limit`. The check and the increment happen
+        under the same lock, so concurrent workers can never overshoot the limit.
+
+        Returns:
+            bool: True if the hits were recorded.
+        """
+        if amount > limit:
+            return False
+        now = time.time()
+        with self._set(key) as table:
+            index, key_hash, window, current, previous = table.find(key, now)
+            window, current, previous = _roll(window, current, previous, now, expiry)
+            elapsed = (now / expiry) % 1
+            if floor(previous * (1 - elapsed) + current) + amount > limit:
+                table.write(index, key_hash, window, current, previous, now)
+                return False
+            table.write(index, key_hash, window, current + amount, previous, now)
+            return True
+
+    def get_sliding_window(self, key, expiry):
+        """
+        Returns the previous window's count and TTL and the current window's
+        count and TTL for `key`.
+        """
+        now = time.time()
+        with self._set(key) as table:
+            _, _, window, current, previous = table.find(key, now, create=False)
+        _, current, previous = _roll(window, current, previous, now, expiry)
+        elapsed = (now / expiry) % 1
+        previous_ttl = (1 - elapsed) * expiry if previous else 0.0
+        return previous, previous_ttl, current, (1 - elapsed) * expiry + expiry
+
+    def clear_sliding_window(self, key, expiry):
+        """
+        Resets the sliding window counters of `key`.
+        """
+        self.clear(key)
+
+    def check(self):
+        """
+        Returns True while the shared table is mapped; the storage is local, so
+        there is no server to be unreachable.
+        """
+        return not self._map.closed
+
+    def reset(self):
+        """
+        Drops every counter in the table.
+
+        Returns:
+            int: The number of entries that were in use.
+        """
+        fcntl.lockf(self._fd, fcntl.LOCK_EX)
+        try:
+            used = 0
+            for offset in range(_HEADER.size, len(self._map), _SLOT.size):
+                if _SLOT.unpack_from(self._map, offset)[0]:
+                    used += 1
+            self._map[_HEADER.size :] = bytes(len(self._map) - _HEADER.size)
+            return used
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+    def _set(self, key):
+        key_hash = int.from_bytes(
+            hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+        ) or 1
+        return _LockedSet(self, key_hash, key_hash % self.sets)
+
+
+class _LockedSet:
+    """
+    Holds the locks of one set of the table while it is read and updated.
+    """
+
+    __slots__ = ("storage", "key_hash", "start", "lock")
+
+    def __init__(self, storage, key_hash, set_index):
+        self.storage = storage
+        self.key_hash = key_hash
+        self.start = _HEADER.size + set_index * _WAYS * _SLOT.size
+        self.lock = storage._locks[set_index % _LOCK_STRIPES]
+
+    def __enter__(self):
+        self.lock.acquire()
+        try:
+            fcntl.lockf(self.storage._fd, fcntl.LOCK_EX, _WAYS * _SLOT.size, self.start)
+        except BaseException:
+            self.lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            fcntl.lockf(self.storage._fd, fcntl.LOCK_UN, _WAYS * _SLOT.size, self.start)
+        finally:
+            self.lock.release()
+
+    def find(self, key, now, create=True):
+        """
+        Looks the key up in its set.
+
+        Returns:
+            tuple: (slot offset, key hash, window, current, previous). If the key is
+            absent the counters are zero and the offset points at an empty slot or
+            at the least recently used one, which the caller may overwrite; with
+            ``create=False`` the offset is None instead.
+        """
+        table = self.storage._map
+        victim, victim_atime = None, None
+        for way in range(_WAYS):
+            offset = self.start + way * _SLOT.size
+            key_hash, window, current, previous, atime = _SLOT.unpack_from(table, offset)
+            if key_hash == self.key_hash:
+                return offset, key_hash, window, current, previous
+            if victim is None or atime < victim_atime:
+                victim, victim_atime = offset, atime
+        return (victim if create else None), self.key_hash, 0.0, 0, 0
+
+    def write(self, offset, key_hash, window, current, previous, atime):
+        _SLOT.pack_into(self.storage._map, offset, key_hash, window, current, previous, atime)
+
+
+def init_rate_limits(app, limiter):
+    """
+    Applies per-blueprint rate limits from the app config.
+
+    A blueprint named ``sales`` is limited by ``RATELIMIT_SALES`` (set it with
+    ``FLASK_RATELIMIT_SALES="20 per second;600 per minute"``), which replaces
+    the default limits for its routes. Blueprints without such a key keep the
+    defaults.
+
+    Args:
+        app (Flask): The Flask application instance, with its blueprints registered.
+        limiter (Limiter): The app's rate limiter.
+    """
+    for name, blueprint in app.blueprints.items():
+        limits = app.config.get(f"RATELIMIT_{name.upper()}")
+        if limits:
+            limiter.limit(limits)(blueprint)
+
+
+def _roll(window, current, previous, now, expiry):
+    number = float(int(now // expiry))
+    if window == number:
+        return window, current, previous
+    if window == number - 1:
+        return number, 0, current
+    return number, 0, 0
+
+
+def _open_table(path, sets):
+    size = _HEADER.size + sets * _WAYS * _SLOT.size
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            header = os.pread(fd, _HEADER.size, 0)
+            if len(header) == _HEADER.size and _HEADER.unpack(header)[0] == _MAGIC:
+                existing_sets = _HEADER.unpack(header)[1]
+                if existing_sets != sets:
+                    raise ValueError(
+                        f"{path} was created with {existing_sets * _WAYS} slots, "
+                        f"not {sets * _WAYS}"
+                    )
+            else:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+                os.pwrite(fd, _HEADER.pack(_MAGIC, sets, _SLOT.size), 0)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        return fd, mmap.mmap(fd, size)
+    except BaseException:
+        os.close(fd)
+        raise
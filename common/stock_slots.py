@@ -0,0 +1,301 @@
+from common.notify import notify_inventory_change, publish
+
+HOT_ITEMS_CHANNEL = "hot_items_changed"
+STOCK_SLOTS_MAX = 64
+
+# An item's available stock: its own count plus whatever sits in its slots.
+# The slot lookup is a primary key probe, and only evaluated for hot items.
+AVAILABLE_STOCK_SQL = """
+    (inventory.count_in_stock + CASE WHEN inventory.stock_slots > 0 THEN COALESCE(
+        (SELECT sum(slots.count_in_stock)::int
+         FROM inventory_stock_slots AS slots
+         WHERE slots.item_id = inventory.id), 0) ELSE 0 END)
+"""
+
+HOT_ITEMS_SQL = "SELECT id FROM inventory WHERE stock_slots > 0"
+
+# Records that a worker saw purchases of automatically promoted hot items.
+MARK_BUSY_SQL = """
+    UPDATE inventory
+    SET stock_slots_busy_at = LOCALTIMESTAMP
+    WHERE id = ANY(%(item_ids)s) AND stock_slots > 0 AND stock_slots_auto
+"""
+
+# Automatically promoted hot items no worker has seen a purchase of for
+# `idle_for` seconds.
+IDLE_HOT_ITEMS_SQL = """
+    SELECT id FROM inventory
+    WHERE stock_slots > 0
+      AND stock_slots_auto
+      AND stock_slots_busy_at <= LOCALTIMESTAMP - make_interval(secs => %(idle_for)s)
+    ORDER BY id
+"""
+
+# Hot items whose stock is unevenly spread: some left on the item row, e.g. by a
+# restock or a fold, or empty slots next to slots that still have stock.
+UNBALANCED_SQL = """
+    SELECT inventory.id, inventory.stock_slots
+    FROM inventory
+    LEFT JOIN inventory_stock_slots AS slots ON slots.item_id = inventory.id
+    WHERE inventory.stock_slots > 0
+    GROUP BY inventory.id
+    HAVING inventory.count_in_stock > 0
+        OR count(slots.slot) <> inventory.stock_slots
+        OR (min(slots.count_in_stock) = 0 AND sum(slots.count_in_stock) >= inventory.stock_slots)
+    ORDER BY inventory.id
+"""
+
+# Locks hot items in ID order. Slots are always locked after their item row,
+# and customers before both, so none of the stock paths can deadlock. Item rows
+# are locked FOR NO KEY UPDATE, as every stock path only changes non-key
+# columns: a slot purchase inserts its sale while holding its slot, and the
+# foreign key check on the sale takes a KEY SHARE lock on the item row, which
+# FOR UPDATE would block.
+LOCK_HOT_ITEMS_SQL = """
+    SELECT id FROM inventory
+    WHERE id = ANY(%(item_ids)s) AND stock_slots > 0
+    ORDER BY id
+    FOR NO KEY UPDATE
+"""
+
+# Moves the stock of the locked items' slots back onto the item rows.
+FOLD_SQL = """
+    WITH slot AS (
+        SELECT item_id, slot, count_in_stock
+        FROM inventory_stock_slots
+        WHERE item_id = ANY(%(item_ids)s) AND count_in_stock > 0
+        ORDER BY item_id, slot
+        FOR UPDATE
+    ),
+    emptied AS (
+        UPDATE inventory_stock_slots
+        SET count_in_stock = 0
+        FROM slot
+        WHERE inventory_stock_slots.item_id = slot.item_id
+          AND inventory_stock_slots.slot = slot.slot
+    )
+    UPDATE inventory
+    SET count_in_stock = inventory.count_in_stock + moved.quantity
+    FROM (SELECT item_id, sum(count_in_stock)::int AS quantity FROM slot GROUP BY item_id) AS moved
+    WHERE inventory.id = moved.item_id
+    RETURNING inventory.id, inventory.count_in_stock
+"""
+
+CLEAR_SQL = """
+    UPDATE inventory_stock_slots
+    SET count_in_stock = 0
+    WHERE item_id = ANY(%(item_ids)s) AND count_in_stock > 0
+"""
+
+# Spreads the item's whole stock evenly over `slots` slots; the first
+# `total % slots` of them get one unit more. Existing slots are updated in place,
+# so a purchase waiting on one sees its new count rather than a deleted row.
+SPREAD_SQL = """
+    INSERT INTO inventory_stock_slots AS slots (item_id, slot, count_in_stock)
+    SELECT %(item_id)s, slot, %(total)s / %(slots)s + (slot < %(total)s %% %(slots)s)::int
+    FROM generate_series(0, %(slots)s - 1) AS slot
+    ON CONFLICT (item_id, slot) DO UPDATE SET count_in_stock = EXCLUDED.count_in_stock
+"""
+
+
+def fold_stock_slots(cur, item_ids):
+    """
+    Moves the stock held in the slots of any hot items among `item_ids` back onto
+    their item rows, so that a statement checking `inventory.count_in_stock` sees
+    the whole stock. The slots are kept, empty; `set_stock_slots` spreads the
+    stock again later. The caller commits.
+
+    Call it when a conditional decrement of the item row came up short: for a
+    regular item it costs one query and changes nothing.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        item_ids (list): The item IDs.
+
+    Returns:
+        dict: The new count_in_stock of each hot item whose slots had stock.
+    """
+    cur.execute(LOCK_HOT_ITEMS_SQL, {"item_ids": sorted(item_ids)})
+    hot = [row[0] for row in cur.fetchall()]
+    if not hot:
+        return {}
+    cur.execute(FOLD_SQL, {"item_ids": hot})
+    return dict(cur.fetchall())
+
+
+def clear_stock_slots(cur, item_ids):
+    """
+    Empties the slots of the given items, after their count_in_stock has been set
+    to an absolute value that replaces the whole stock. The caller commits.
+
+    Args:
+        cur (cursor): A cursor of the transaction that set the stock.
+        item_ids (list): The item IDs.
+    """
+    cur.execute(CLEAR_SQL, {"item_ids": sorted(item_ids)})
+
+
+def set_stock_slots(conn, item_id, slots, auto=None, idle_for=None):
+    """
+    Promotes an item to a hot item with `slots` counter slots, re-spreads the
+    stock of a hot item, or demotes it back to a regular item with 0 slots, in
+    one transaction. The whole stock is gathered and spread evenly over the new
+    slots, so no unit is lost or created.
+
+    Args:
+        conn (connection): A database connection.
+        item_id (int): The item's ID.
+        slots (int): The number of slots, 0 to `STOCK_SLOTS_MAX`.
+        auto (bool, optional): True if the lock-wait heuristic makes the change,
+            False if an operator does. None keeps how the item was promoted.
+        idle_for (float, optional): Only make the change if the item was
+            promoted automatically and no purchase of it has been seen for this
+            many seconds.
+
+    Returns:
+        int: The item's available stock, or None if the item does not exist or,
+        with `idle_for`, is not idle.
+    """
+    if not 0 <= slots <= STOCK_SLOTS_MAX:
+        raise ValueError(f"slots must be between 0 and {STOCK_SLOTS_MAX}")
+
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT count_in_stock, stock_slots,
+                   stock_slots_auto
+                   AND stock_slots_busy_at <= LOCALTIMESTAMP - make_interval(secs => %s)
+            FROM inventory
+            WHERE id = %s
+            FOR NO KEY UPDATE
+            """,
+            (idle_for or 0, item_id),
+        )
+        item = cur.fetchone()
+        if item is None or (idle_for is not None and not item[2]):
+            conn.rollback()
+            return None
+        total, previous_slots, _ = item
+        cur.execute(
+            """
+            SELECT count_in_stock FROM inventory_stock_slots
+            WHERE item_id = %s
+            ORDER BY slot
+            FOR UPDATE
+            """,
+            (item_id,),
+        )
+        total += sum(row[0] for row in cur.fetchall())
+
+        cur.execute(
+            "DELETE FROM inventory_stock_slots WHERE item_id = %s AND slot >= %s",
+            (item_id, slots),
+        )
+        if slots:
+            cur.execute(SPREAD_SQL, {"item_id": item_id, "total": total, "slots": slots})
+        cur.execute(
+            """
+            UPDATE inventory
+            SET count_in_stock = %(count_in_stock)s,
+                stock_slots = %(slots)s,
+                stock_slots_auto = %(slots)s > 0 AND COALESCE(%(auto)s, stock_slots_auto),
+                stock_slots_busy_at = CASE
+                    WHEN %(slots)s = 0 OR NOT COALESCE(%(auto)s, stock_slots_auto) THEN NULL
+                    WHEN %(auto)s THEN LOCALTIMESTAMP
+                    ELSE stock_slots_busy_at
+                END
+            WHERE id = %(item_id)s
+            """,
+            {
+                "count_in_stock": 0 if slots else total,
+                "slots": slots,
+                "auto": auto,
+                "item_id": item_id,
+            },
+        )
+        if slots != previous_slots:
+            publish(cur, HOT_ITEMS_CHANNEL, [item_id])
+        notify_inventory_change(cur, [item_id])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return total
+
+
+def rebalance_stock_slots(conn):
+    """
+    Re-spreads the stock of every hot item whose stock is unevenly spread, so that
+    purchases keep finding a slot with stock.
+
+    Args:
+        conn (connection): A database connection.
+
+    Returns:
+        int: The number of items rebalanced.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(UNBALANCED_SQL)
+        unbalanced = cur.fetchall()
+        conn.rollback()
+    finally:
+        cur.close()
+
+    for item_id, slots in unbalanced:
+        set_stock_slots(conn, item_id, slots)
+    return len(unbalanced)
+
+
+def mark_hot_items_busy(conn, item_ids):
+    """
+    Records that purchases of the given items were seen, which keeps those that
+    were promoted automatically from being demoted. The signal is stored on the
+    item rows, so it is shared by every worker.
+
+    Args:
+        conn (connection): A database connection.
+        item_ids (list): The IDs of the items purchased.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(MARK_BUSY_SQL, {"item_ids": sorted(item_ids)})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def get_idle_hot_items(cur, idle_for):
+    """
+    Reads the automatically promoted hot items no purchase of which has been
+    seen for `idle_for` seconds. Items an operator promoted are never idle.
+
+    Args:
+        cur (cursor): A database cursor.
+        idle_for (float): Seconds without a purchase.
+
+    Returns:
+        list: The item IDs.
+    """
+    cur.execute(IDLE_HOT_ITEMS_SQL, {"idle_for": idle_for})
+    return [row[0] for row in cur.fetchall()]
+
+
+def get_hot_items(cur):
+    """
+    Reads the IDs of the items that currently have stock slots.
+
+    Args:
+        cur (cursor): A database cursor.
+
+    Returns:
+        set: The hot item IDs.
+    """
+    cur.execute(HOT_ITEMS_SQL)
+    return {row[0] for row in cur.fetchall()}
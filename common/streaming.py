@@ -0,0 +1,81 @@
+import os
+import uuid
+
+from flask import Response, current_app, jsonify
+
+from common.db import detach_db, get_pool
+
+STREAM_THRESHOLD = int(os.environ.get("STREAM_THRESHOLD", "500"))
+STREAM_BATCH_SIZE = int(os.environ.get("STREAM_BATCH_SIZE", "1000"))
+
+
+def json_list_response(conn, query, params, to_dict):
+    """
+    Runs `query` on a server-side cursor and returns its rows as a JSON array.
+
+    The first `STREAM_THRESHOLD` + 1 rows are fetched up front. If that is all
+    there is, the list is returned with `jsonify` as usual. Otherwise the
+    response is streamed: rows are fetched from the server in batches of
+    `STREAM_BATCH_SIZE` and written out as they are encoded, so memory use does
+    not depend on how many rows the query returns.
+
+    A streamed response keeps the request's connection (it is detached from `g`)
+    until the last row has been sent or the response is closed, whichever comes
+    first, then returns it to the pool.
+
+    Args:
+        conn (connection): The request's database connection, as returned by `get_db`.
+        query (str): The SELECT statement to run.
+        params (tuple): The query parameters.
+        to_dict (callable): Converts a result row into a JSON-serialisable dict.
+
+    Returns:
+        Response: A JSON response containing the list of converted rows.
+    """
+    threshold = STREAM_THRESHOLD
+    batch_size = STREAM_BATCH_SIZE
+
+    cur = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+    cur.itersize = batch_size
+    try:
+        cur.execute(query, params)
+        first = cur.fetchmany(threshold + 1)
+    except Exception:
+        cur.close()
+        raise
+
+    if len(first) <= threshold:
+        cur.close()
+        return jsonify([to_dict(row) for row in first])
+
+    dumps = current_app.json.dumps
+    detach_db()
+    released = []
+
+    def release():
+        if not released:
+            released.append(True)
+            cur.close()
+            get_pool().putconn(conn)
+
+    def generate():
+        try:
+            rows = first
+            separator = "["
+            while rows:
+                chunk = []
+                for row in rows:
+                    chunk.append(separator)
+                    chunk.append(dumps(to_dict(row)))
+                    separator = ","
+                yield "".join(chunk)
+                rows = cur.fetchmany(batch_size)
+            yield "]"
+        finally:
+            release()
+
+    # A generator that never started does not run its `finally` when closed, e.g.
+    # for a HEAD request, so the connection is also released when the body closes.
+    response = Response(generate(), mimetype="application/json")
+    response.call_on_close(release)
+    return response
@@ -1,13 +1,45 @@
+import hmac
 from flask import Blueprint, request, jsonify
+from psycopg2 import sql
+from common.auth import (
+    TokenError,
+    bearer_token,
+    hash_password,
+    issue_token,
+    revoke_token,
+    verify_password,
+    verify_token,
+)
 from common.db import get_db
+from common.money import format_cents, to_cents
+from common.pagination import decode_cursor, encode_cursor, parse_limit
+from .wallet import LEDGER_PAGE_SQL, change_wallet
 
 customers_bp = Blueprint("customers", __name__)
 
+CUSTOMER_FIELDS = (
+    "id",
+    "fullname",
+    "username",
+    "age",
+    "address",
+    "gender",
+    "marital_status",
+    "wallet_balance",
+)
+# Fields whose column name differs from the field name in responses.
+CUSTOMER_COLUMNS = {"wallet_balance": "wallet_balance_cents"}
+CUSTOMERS_PAGE_SIZE = 50
+CUSTOMERS_MAX_PAGE_SIZE = 500
+LEDGER_PAGE_SIZE = 50
+LEDGER_MAX_PAGE_SIZE = 500
+
 
 @customers_bp.route("/customers", methods=["POST"])
 def register_customer():
     """
     Registers a new customer. Validates that the username is unique and stores customer information.
+    The password is stored as a salted hash (see `common.auth.hash_password`), never in plaintext.
     Returns a success message if registration is successful or an error message otherwise.
     """
     try:
@@ -28,6 +60,14 @@ def register_customer():
                 400,
             )
 
+        if not isinstance(password, str):
+            return jsonify({"error": "password must be a string"}), 400
+
+        try:
+            wallet_balance_cents = to_cents(wallet_balance or 0)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid wallet_balance: {e}"}), 400
+
         conn = get_db()
         cur = conn.cursor()
 
@@ -39,18 +79,25 @@ def register_customer():
 
         cur.execute(
             """
-            INSERT INTO customers (fullname, username, password, age, address, gender, marital_status, wallet_balance)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            WITH customer AS (
+                INSERT INTO customers (fullname, username, password_hash, age, address, gender, marital_status, wallet_balance_cents)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id, wallet_balance_cents
+            )
+            INSERT INTO wallet_ledger (customer_id, amount_cents, kind)
+            SELECT id, wallet_balance_cents, 'opening'
+            FROM customer
+            WHERE wallet_balance_cents <> 0
             """,
             (
                 fullname,
                 username,
-                password,
+                hash_password(password),
                 age,
                 address,
                 gender,
                 marital_status,
-                wallet_balance,
+                wallet_balance_cents,
             ),
         )
         conn.commit()
@@ -63,6 +110,103 @@ def register_customer():
         return jsonify({"error": str(e)}), 500
 
 
+@customers_bp.route("/customers/login", methods=["POST"])
+def login():
+    """
+    Verifies a customer's username and password and issues a signed session token.
+
+    The request must include:
+    - username: The customer's username.
+    - password: The customer's password.
+
+    Other services accept the token in an `Authorization: Bearer <token>` header
+    and verify it without querying the database, until it expires after
+    AUTH_TOKEN_TTL seconds or is revoked with `POST /customers/logout`.
+
+    Customers registered before passwords were hashed still have a plaintext
+    password; it is replaced by a hash on their first successful login.
+
+    Returns the token and its lifetime in seconds, or 401 if the credentials are invalid.
+    """
+    try:
+        data = request.json
+        username = data.get("username")
+        password = data.get("password")
+
+        if not username or not password:
+            return jsonify({"error": "username and password are required"}), 400
+
+        if not isinstance(password, str):
+            return jsonify({"error": "password must be a string"}), 400
+
+        conn = get_db()
+        cur = conn.cursor()
+
+        cur.execute(
+            "SELECT id, password_hash, password FROM customers WHERE username = %s",
+            (username,),
+        )
+        customer = cur.fetchone()
+
+        if customer and customer[1] is not None:
+            valid = verify_password(password, customer[1])
+        elif customer and customer[2] is not None:
+            valid = hmac.compare_digest(customer[2].encode(), password.encode())
+            if valid:
+                cur.execute(
+                    "UPDATE customers SET password_hash = %s, password = NULL WHERE id = %s",
+                    (hash_password(password), customer[0]),
+                )
+                conn.commit()
+        else:
+            valid = False
+
+        cur.close()
+
+        if not valid:
+            return jsonify({"error": "Invalid username or password"}), 401
+
+        token, claims = issue_token(customer[0], username)
+        return (
+            jsonify({"token": token, "expires_in": claims["exp"] - claims["iat"]}),
+            200,
+        )
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@customers_bp.route("/customers/logout", methods=["POST"])
+def logout():
+    """
+    Revokes the session token sent in the `Authorization: Bearer <token>` header.
+
+    Every worker stops accepting the token once it has received the revocation
+    (see `common.auth.RevocationList`), normally within milliseconds.
+
+    Returns a success message, or 401 if the token is missing or invalid.
+    """
+    try:
+        token = bearer_token(request)
+        if token is None:
+            return jsonify({"error": "Missing bearer token"}), 401
+        try:
+            claims = verify_token(token)
+        except TokenError as e:
+            return jsonify({"error": str(e)}), 401
+
+        conn = get_db()
+        cur = conn.cursor()
+        revoke_token(cur, claims)
+        conn.commit()
+        cur.close()
+
+        return jsonify({"message": "Logged out successfully"}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @customers_bp.route("/customers/<username>", methods=["DELETE"])
 def delete_customer(username):
     """
@@ -95,6 +239,7 @@ def update_customer(username):
     """
     Updates one or more fields for a customer based on the provided username.
     Valid fields include fullname, password, age, address, gender, marital_status.
+    A new password is stored as a salted hash.
     Returns a success message if the update is successful or an error message if no valid fields are provided.
     """
     try:
@@ -115,6 +260,9 @@ def update_customer(username):
         if not update_fields:
             return jsonify({"error": "No valid fields provided for update"}), 400
 
+        if "password" in update_fields and not isinstance(update_fields["password"], str):
+            return jsonify({"error": "password must be a string"}), 400
+
         conn = get_db()
         cur = conn.cursor()
 
@@ -124,6 +272,10 @@ def update_customer(username):
         if not customer:
             return jsonify({"error": "Customer not found"}), 404
 
+        if "password" in update_fields:
+            update_fields["password_hash"] = hash_password(update_fields.pop("password"))
+            update_fields["password"] = None
+
         set_clause = ", ".join([f"{field} = %s" for field in update_fields.keys()])
         values = list(update_fields.values())
         values.append(username)
@@ -143,34 +295,67 @@ def update_customer(username):
 @customers_bp.route("/customers", methods=["GET"])
 def get_all_customers():
     """
-    Retrieves all customers and their information.
-    Returns a list of all customers' details in JSON format or an error message if there is an issue fetching the data.
+    Retrieves customers and their information, one page at a time.
+
+    Query parameters:
+    - limit: The page size (default `CUSTOMERS_PAGE_SIZE`, capped at `CUSTOMERS_MAX_PAGE_SIZE`).
+    - after_id: Only return customers with a larger id (keyset pagination).
+    - cursor: The opaque token from a previous page's `X-Next-Cursor` header, used instead of after_id.
+    - fields: A comma-separated list of fields to return; only these columns are selected.
+
+    Returns a list of customers' details in JSON format, ordered by id. When more
+    customers follow, the `X-Next-Cursor` response header holds the token for the
+    next page. Returns an error message if there is an issue fetching the data.
     """
     try:
+        try:
+            limit = parse_limit(
+                request.args.get("limit"), CUSTOMERS_PAGE_SIZE, CUSTOMERS_MAX_PAGE_SIZE
+            )
+            after_id = request.args.get("after_id", type=int)
+            if "cursor" in request.args:
+                after_id = int(decode_cursor(request.args["cursor"])[0])
+        except (ValueError, IndexError, TypeError):
+            return jsonify({"error": "Invalid limit, after_id or cursor"}), 400
+
+        fields = CUSTOMER_FIELDS
+        if request.args.get("fields"):
+            fields = tuple(field.strip() for field in request.args["fields"].split(","))
+            unknown = [field for field in fields if field not in CUSTOMER_FIELDS]
+            if unknown:
+                return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+
+        columns = ("id",) + tuple(field for field in fields if field != "id")
+
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("""SELECT * FROM customers""")
+        cur.execute(
+            sql.SQL(
+                "SELECT {} FROM customers WHERE id > %s ORDER BY id LIMIT %s"
+            ).format(
+                sql.SQL(", ").join(
+                    sql.Identifier(CUSTOMER_COLUMNS.get(column, column)) for column in columns
+                )
+            ),
+            (after_id or 0, limit + 1),
+        )
         data = cur.fetchall()
 
         cur.close()
 
-        customers = [
-            {
-                "id": row[0],
-                "fullname": row[1],
-                "username": row[2],
-                "password": row[3],
-                "age": row[4],
-                "address": row[5],
-                "gender": row[6],
-                "marital_status": row[7],
-                "wallet_balance": row[8],
-            }
-            for row in data
-        ]
+        positions = [(field, columns.index(field)) for field in fields]
+        customers = []
+        for row in data[:limit]:
+            customer = {field: row[position] for field, position in positions}
+            if "wallet_balance" in customer:
+                customer["wallet_balance"] = format_cents(customer["wallet_balance"])
+            customers.append(customer)
 
-        return jsonify(customers), 200
+        response = jsonify(customers)
+        if len(data) > limit:
+            response.headers["X-Next-Cursor"] = encode_cursor([data[limit - 1][0]])
+        return response, 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -186,7 +371,14 @@ def get_customer_by_username(username):
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("SELECT * FROM customers WHERE username = %s", (username,))
+        cur.execute(
+            """
+            SELECT id, fullname, username, age, address, gender, marital_status, wallet_balance_cents
+            FROM customers
+            WHERE username = %s
+            """,
+            (username,),
+        )
         row = cur.fetchone()
 
         cur.close()
@@ -198,12 +390,11 @@ def get_customer_by_username(username):
             "id": row[0],
             "fullname": row[1],
             "username": row[2],
-            "password": row[3],
-            "age": row[4],
-            "address": row[5],
-            "gender": row[6],
-            "marital_status": row[7],
-            "wallet_balance": row[8],
+            "age": row[3],
+            "address": row[4],
+            "gender": row[5],
+            "marital_status": row[6],
+            "wallet_balance": format_cents(row[7]),
         }
 
         return jsonify(customer), 200
@@ -217,6 +408,9 @@ def charge_customer_wallet(username):
     """
     Charges a customer's wallet with a specified amount.
     Validates that the amount is positive. Returns the new wallet balance or an error message if invalid.
+
+    The balance is incremented in place and the change is recorded in the wallet
+    ledger by one statement, so concurrent charges are never lost.
     """
     try:
         data = request.json
@@ -224,32 +418,26 @@ def charge_customer_wallet(username):
 
         if not amount or not isinstance(amount, (int, float)) or amount <= 0:
             return jsonify({"error": "Invalid amount. Must be a positive number."}), 400
+        try:
+            amount_cents = to_cents(amount)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid amount. {e}."}), 400
 
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute(
-            "SELECT wallet_balance FROM customers WHERE username = %s", (username,)
-        )
-        customer = cur.fetchone()
-
-        if not customer:
+        result = change_wallet(cur, username, amount_cents, "charge")
+        if result is None:
+            conn.rollback()
+            cur.close()
             return jsonify({"error": "Customer not found"}), 404
 
-        current_balance = customer[0]
-        new_balance = current_balance + amount
-
-        cur.execute(
-            "UPDATE customers SET wallet_balance = %s WHERE username = %s",
-            (new_balance, username),
-        )
         conn.commit()
-
         cur.close()
 
         return (
             jsonify(
-                {"message": "Wallet charged successfully", "new_balance": new_balance}
+                {"message": "Wallet charged successfully", "new_balance": format_cents(result[0])}
             ),
             200,
         )
@@ -263,6 +451,10 @@ def deduct_money_from_wallet(username):
     """
     Deducts money from a customer's wallet.
     Ensures the amount is positive and that the customer has sufficient funds. Returns the new balance or an error message if there are insufficient funds.
+
+    The funds check and the debit are one conditional UPDATE, recorded in the
+    wallet ledger by the same statement, so concurrent deductions can never
+    overdraw the wallet.
     """
     try:
         data = request.json
@@ -270,37 +462,96 @@ def deduct_money_from_wallet(username):
 
         if not amount or not isinstance(amount, (int, float)) or amount <= 0:
             return jsonify({"error": "Invalid amount. Must be a positive number."}), 400
+        try:
+            amount_cents = to_cents(amount)
+        except ValueError as e:
+            return jsonify({"error": f"Invalid amount. {e}."}), 400
 
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute(
-            "SELECT wallet_balance FROM customers WHERE username = %s", (username,)
-        )
-        customer = cur.fetchone()
-
-        if not customer:
-            return jsonify({"error": "Customer not found"}), 404
-
-        current_balance = customer[0]
-        if current_balance < amount:
+        result = change_wallet(cur, username, -amount_cents, "deduct")
+        if result is None:
+            conn.rollback()
+            cur.execute("SELECT 1 FROM customers WHERE username = %s", (username,))
+            exists = cur.fetchone()
+            cur.close()
+            if not exists:
+                return jsonify({"error": "Customer not found"}), 404
             return jsonify({"error": "Insufficient funds"}), 400
 
-        new_balance = current_balance - amount
-        cur.execute(
-            "UPDATE customers SET wallet_balance = %s WHERE username = %s",
-            (new_balance, username),
-        )
         conn.commit()
-
         cur.close()
 
         return (
             jsonify(
-                {"message": "Amount deducted successfully", "new_balance": new_balance}
+                {"message": "Amount deducted successfully", "new_balance": format_cents(result[0])}
             ),
             200,
         )
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@customers_bp.route("/customers/<username>/wallet/ledger", methods=["GET"])
+def get_wallet_ledger(username):
+    """
+    Retrieves a customer's wallet ledger, newest entry first, one page at a time.
+
+    Query parameters:
+    - limit: The page size (default `LEDGER_PAGE_SIZE`, capped at `LEDGER_MAX_PAGE_SIZE`).
+    - cursor: The opaque token from a previous page's `X-Next-Cursor` header.
+
+    Returns a list of entries with their id, signed amount, kind (opening, charge,
+    deduct, purchase or checkout), reference_id (the sale, for purchases) and
+    created_at. When older entries follow, the `X-Next-Cursor` response header
+    holds the token for the next page.
+    """
+    try:
+        try:
+            limit = parse_limit(request.args.get("limit"), LEDGER_PAGE_SIZE, LEDGER_MAX_PAGE_SIZE)
+            before_id = None
+            if "cursor" in request.args:
+                before_id = int(decode_cursor(request.args["cursor"])[0])
+        except (ValueError, IndexError, TypeError):
+            return jsonify({"error": "Invalid limit or cursor"}), 400
+
+        conn = get_db()
+        cur = conn.cursor()
+
+        cur.execute("SELECT id FROM customers WHERE username = %s", (username,))
+        customer = cur.fetchone()
+        if not customer:
+            cur.close()
+            return jsonify({"error": "Customer not found"}), 404
+
+        cur.execute(
+            LEDGER_PAGE_SQL,
+            {
+                "customer_id": customer[0],
+                "before_id": before_id if before_id is not None else 2**63 - 1,
+                "limit": limit + 1,
+            },
+        )
+        rows = cur.fetchall()
+        cur.close()
+
+        entries = [
+            {
+                "id": row[0],
+                "amount": format_cents(row[1]),
+                "kind": row[2],
+                "reference_id": row[3],
+                "created_at": row[4].isoformat(),
+            }
+            for row in rows[:limit]
+        ]
+
+        response = jsonify(entries)
+        if len(rows) > limit:
+            response.headers["X-Next-Cursor"] = encode_cursor([rows[limit - 1][0]])
+        return response, 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,237 @@
+import argparse
+import sys
+import time
+
+from common.money import format_cents
+
+SNAPSHOT_WAIT_INTERVAL = 0.05
+
+WALLET_CHANGE_SQL = """
+    WITH account AS (
+        UPDATE customers
+        SET wallet_balance_cents = wallet_balance_cents + %(amount_cents)s
+        WHERE username = %(username)s
+          AND wallet_balance_cents + %(amount_cents)s >= 0
+        RETURNING id, wallet_balance_cents
+    ),
+    entry AS (
+        INSERT INTO wallet_ledger (customer_id, amount_cents, kind)
+        SELECT id, %(amount_cents)s, %(kind)s
+        FROM account
+        RETURNING id
+    )
+    SELECT account.wallet_balance_cents, entry.id
+    FROM account, entry
+"""
+
+LEDGER_PAGE_SQL = """
+    SELECT id, amount_cents, kind, reference_id, created_at
+    FROM wallet_ledger
+    WHERE customer_id = %(customer_id)s AND id < %(before_id)s
+    ORDER BY id DESC
+    LIMIT %(limit)s
+"""
+
+_LAST_SNAPSHOTS = """
+    SELECT DISTINCT ON (customer_id) customer_id, ledger_id, balance_cents
+    FROM wallet_snapshots
+    ORDER BY customer_id, ledger_id DESC
+"""
+
+SNAPSHOT_SQL = f"""
+    WITH last AS ({_LAST_SNAPSHOTS})
+    INSERT INTO wallet_snapshots (customer_id, ledger_id, balance_cents)
+    SELECT ledger.customer_id,
+           max(ledger.id),
+           COALESCE(last.balance_cents, 0) + sum(ledger.amount_cents)::bigint
+    FROM wallet_ledger AS ledger
+    LEFT JOIN last ON last.customer_id = ledger.customer_id
+    WHERE ledger.id > COALESCE(last.ledger_id, 0)
+      AND ledger.id <= %(watermark)s
+    GROUP BY ledger.customer_id, last.balance_cents
+    HAVING count(*) >= %(min_entries)s
+"""
+
+# The transactions that may still commit ledger entries: every writer holds a
+# ROW EXCLUSIVE lock on the table from before it draws an entry ID until it ends.
+LEDGER_WRITERS_SQL = """
+    SELECT DISTINCT virtualtransaction
+    FROM pg_locks
+    WHERE locktype = 'relation'
+      AND relation = 'wallet_ledger'::regclass
+      AND mode = 'RowExclusiveLock'
+      AND pid <> pg_backend_pid()
+"""
+
+PENDING_WRITERS_SQL = """
+    SELECT count(*)
+    FROM pg_locks
+    WHERE locktype = 'relation'
+      AND relation = 'wallet_ledger'::regclass
+      AND virtualtransaction = ANY(%(writers)s)
+"""
+
+RECONCILE_SQL = f"""
+    WITH last AS ({_LAST_SNAPSHOTS})
+    SELECT username, wallet_balance_cents, ledger_balance_cents
+    FROM (
+        SELECT customers.username,
+               customers.wallet_balance_cents,
+               COALESCE(last.balance_cents, 0) + COALESCE(
+                   (
+                       SELECT sum(amount_cents)::bigint
+                       FROM wallet_ledger
+                       WHERE customer_id = customers.id
+                         AND id > COALESCE(last.ledger_id, 0)
+                   ),
+                   0
+               ) AS ledger_balance_cents
+        FROM customers
+        LEFT JOIN last ON last.customer_id = customers.id
+    ) AS balances
+    WHERE wallet_balance_cents <> ledger_balance_cents
+    ORDER BY username
+"""
+
+
+def change_wallet(cur, username, amount_cents, kind):
+    """
+    Adds `amount_cents` (negative to debit) to a customer's wallet and records it
+    in the ledger, in one statement.
+
+    The balance is updated in place by a conditional UPDATE that refuses to take
+    it below zero, so concurrent changes can neither be lost nor overdraw the
+    wallet. The caller commits.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        username (str): The customer's username.
+        amount_cents (int): The signed amount in cents.
+        kind (str): The ledger entry kind, e.g. ``charge`` or ``deduct``.
+
+    Returns:
+        tuple: (new balance in cents, ledger entry ID), or None if the customer does not
+        exist or has insufficient funds.
+    """
+    cur.execute(
+        WALLET_CHANGE_SQL,
+        {"username": username, "amount_cents": amount_cents, "kind": kind},
+    )
+    return cur.fetchone()
+
+
+def take_snapshots(conn, min_entries=1):
+    """
+    Folds the ledger entries written since each customer's last snapshot into a
+    new snapshot.
+
+    Only entries up to a watermark, the highest committed entry ID when the run
+    starts, are folded. Entry IDs are drawn before their transaction commits, so
+    the run first waits for the transactions that were writing to the ledger at
+    that point to end; after that no entry at or below the watermark can still
+    commit. The ledger is never locked, so wallet changes carry on meanwhile, and
+    later entries are left for the next run.
+
+    Args:
+        conn (connection): A database connection.
+        min_entries (int): Only snapshot customers with at least this many new entries.
+
+    Returns:
+        int: The number of snapshots taken.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT COALESCE(max(id), 0) FROM wallet_ledger")
+        watermark = cur.fetchone()[0]
+        cur.execute(LEDGER_WRITERS_SQL)
+        writers = [row[0] for row in cur.fetchall()]
+        conn.rollback()
+        while writers:
+            cur.execute(PENDING_WRITERS_SQL, {"writers": writers})
+            pending = cur.fetchone()[0]
+            conn.rollback()
+            if not pending:
+                break
+            time.sleep(SNAPSHOT_WAIT_INTERVAL)
+
+        cur.execute(SNAPSHOT_SQL, {"min_entries": min_entries, "watermark": watermark})
+        taken = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return taken
+
+
+def reconcile(conn):
+    """
+    Compares every wallet balance with the balance derived from the ledger: the
+    last snapshot plus the entries written since it.
+
+    Args:
+        conn (connection): A database connection.
+
+    Returns:
+        list: (username, wallet balance, ledger balance) in cents for every mismatch.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(RECONCILE_SQL)
+        mismatches = cur.fetchall()
+        conn.rollback()
+    finally:
+        cur.close()
+    return mismatches
+
+
+def main(argv=None):
+    """
+    Command line entry point for wallet maintenance, meant to be run periodically.
+
+    Commands:
+        snapshot [--min-entries N]: Takes ledger snapshots.
+        reconcile: Lists wallets whose balance does not match the ledger.
+
+    Args:
+        argv (list, optional): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code; 1 if `reconcile` found mismatches.
+    """
+    from common.db import connect
+
+    parser = argparse.ArgumentParser(
+        prog="python -m customers.wallet",
+        description="Maintain the wallet ledger.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = subparsers.add_parser("snapshot", help="take ledger snapshots")
+    snapshot_parser.add_argument(
+        "--min-entries",
+        type=int,
+        default=100,
+        help="only snapshot wallets with at least this many new entries",
+    )
+    subparsers.add_parser("reconcile", help="check balances against the ledger")
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        if args.command == "snapshot":
+            print(f"Took {take_snapshots(conn, args.min_entries)} snapshots")
+            return 0
+        mismatches = reconcile(conn)
+        for username, wallet_balance_cents, ledger_balance_cents in mismatches:
+            print(
+                f"{username}: wallet {format_cents(wallet_balance_cents)}, "
+                f"ledger {format_cents(ledger_balance_cents)}"
+            )
+        return 1 if mismatches else 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""
+Gunicorn configuration for serving the ecommerce services in production.
+
+Every setting can be overridden through the environment, e.g.::
+
+    PORT=5001 WEB_WORKERS=4 WEB_THREADS=8 gunicorn -c gunicorn.conf.py app:app
+
+The application is imported once in the master process (``preload_app``) so
+workers fork with the code already loaded. Per-worker resources (the database
+connection pool, the catalog replica and its notification listener) are only
+created after the fork. Send SIGHUP to the master for a graceful reload.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("WEB_THREADS", "4"))
+worker_class = "gthread"
+keepalive = int(os.environ.get("WEB_KEEPALIVE", "5"))
+timeout = int(os.environ.get("WEB_TIMEOUT", "30"))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", "30"))
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", "0"))
+preload_app = True
+# Workers share their metrics through this directory, so a scrape of any of
+# them reports the whole server (see `common.metrics.SharedMetrics`).
+os.environ.setdefault("METRICS_DIR", "/tmp/ecommerce-metrics")
+accesslog = os.environ.get("WEB_ACCESS_LOG")
+errorlog = "-"
+
+
+def when_ready(server):
+    """
+    Closes the connections the master opened while preloading the app, so that
+    no database socket is shared with the forked workers, and drops the metrics
+    of a previous run.
+    """
+    from common.db import close_pool
+    from common.metrics import shared_metrics
+
+    close_pool()
+    if shared_metrics is not None:
+        shared_metrics.reset()
+
+
+def post_worker_init(worker):
+    """
+    Opens the worker's own connection pool before it accepts requests.
+    """
+    from common.db import init_db_connection
+
+    init_db_connection()
+
+
+def worker_exit(server, worker):
+    """
+    Writes the exiting worker's last metrics.
+    """
+    from common.metrics import shared_metrics
+
+    if shared_metrics is not None:
+        shared_metrics.flush()
+
+
+def child_exit(server, worker):
+    """
+    Keeps the counters of an exited worker in the server's metrics.
+    """
+    from common.metrics import shared_metrics
+
+    if shared_metrics is not None:
+        shared_metrics.retire(worker.pid)
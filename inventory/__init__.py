@@ -1,15 +1,17 @@
+from .reservations import sweeper
 from .routes import inventory_bp
-from .db import init_inventory_db
 
 
 def init_inventory_service(app):
     """
-    Initializes the inventory service by setting up the database and registering
-    the inventory blueprint with the provided Flask app.
+    Initializes the inventory service by registering the inventory blueprint with
+    the provided Flask app. The `inventory` table is created by the schema migrations.
+
+    The sweeper that returns the stock of expired reservations is started by the
+    first request each process serves, so every forked worker runs its own.
 
     Args:
         app: The Flask application instance to register the blueprint with.
     """
-    with app.app_context():
-        init_inventory_db()
     app.register_blueprint(inventory_bp)
+    app.before_request(sweeper.ensure_running)
@@ -0,0 +1,278 @@
+import csv
+import io
+import json
+import os
+
+from common.money import to_cents
+from common.notify import notify_inventory_change
+from common.stock_slots import clear_stock_slots
+
+CATEGORIES = ("food", "clothes", "accessories", "electronics")
+
+BULK_CHUNK_SIZE = int(os.environ.get("INVENTORY_BULK_CHUNK_SIZE", "5000"))
+BULK_MAX_ERRORS = 1000
+
+NAME_MAX_LENGTH = 50
+SKU_MAX_LENGTH = 64
+
+# The largest values the INT stock and BIGINT price columns hold. A row beyond
+# them would make COPY fail for its whole chunk.
+COUNT_IN_STOCK_MAX = 2**31 - 1
+PRICE_CENTS_MAX = 2**63 - 1
+
+# Column order of the staging table, and of the rows written to COPY.
+_COPY_COLUMNS = (
+    "line",
+    "sku",
+    "name",
+    "category",
+    "price_per_item_cents",
+    "description",
+    "count_in_stock",
+)
+
+_STAGING_SQL = """
+    CREATE TEMPORARY TABLE inventory_import (
+        line INT NOT NULL,
+        sku VARCHAR(64),
+        name VARCHAR(50) NOT NULL,
+        category VARCHAR(50) NOT NULL,
+        price_per_item_cents BIGINT NOT NULL,
+        description TEXT,
+        count_in_stock INT NOT NULL
+    ) ON COMMIT DROP
+"""
+
+# Rows without a SKU are always new items.
+_INSERT_SQL = """
+    INSERT INTO inventory (name, category, price_per_item_cents, description, count_in_stock)
+    SELECT name, category, price_per_item_cents, description, count_in_stock
+    FROM inventory_import
+    WHERE sku IS NULL
+    ORDER BY line
+    RETURNING id
+"""
+
+# Rows with a SKU update the item with that SKU, or add it. When a SKU appears
+# more than once in a chunk the last row wins, as it would across chunks.
+_UPSERT_SQL = """
+    INSERT INTO inventory AS item (sku, name, category, price_per_item_cents, description, count_in_stock)
+    SELECT DISTINCT ON (sku) sku, name, category, price_per_item_cents, description, count_in_stock
+    FROM inventory_import
+    WHERE sku IS NOT NULL
+    ORDER BY sku, line DESC
+    ON CONFLICT (sku) DO UPDATE SET
+        name = EXCLUDED.name,
+        category = EXCLUDED.category,
+        price_per_item_cents = EXCLUDED.price_per_item_cents,
+        description = EXCLUDED.description,
+        count_in_stock = EXCLUDED.count_in_stock
+    RETURNING id, xmax = 0
+"""
+
+
+def validate_item(data):
+    """
+    Checks the fields of a new inventory item, as sent to `POST /inventory`.
+
+    Args:
+        data (dict): The item's name, category, price_per_item, optional
+            description and count_in_stock.
+
+    Returns:
+        tuple: (name, category, price in cents, description, count_in_stock).
+
+    Raises:
+        ValueError: With the message to report if a field is missing or invalid.
+    """
+    name = data.get("name")
+    category = data.get("category")
+    price_per_item = data.get("price_per_item")
+    description = data.get("description")
+    count_in_stock = data.get("count_in_stock")
+
+    if not name or not category or price_per_item is None or count_in_stock is None:
+        raise ValueError("Missing required fields")
+
+    if category not in CATEGORIES:
+        raise ValueError("Invalid category")
+
+    if not isinstance(name, str) or len(name) > NAME_MAX_LENGTH:
+        raise ValueError(f"name must be a string of at most {NAME_MAX_LENGTH} characters")
+
+    try:
+        price_per_item_cents = to_cents(price_per_item)
+    except ValueError as e:
+        raise ValueError(f"Invalid price_per_item: {e}")
+
+    if price_per_item_cents < 0:
+        raise ValueError("Price and count_in_stock must be non-negative")
+
+    if price_per_item_cents > PRICE_CENTS_MAX:
+        raise ValueError("price_per_item is too large")
+
+    if not isinstance(count_in_stock, int) or isinstance(count_in_stock, bool):
+        raise ValueError("count_in_stock must be an integer")
+
+    if count_in_stock < 0:
+        raise ValueError("Count of items in stock must be non-negative")
+
+    if count_in_stock > COUNT_IN_STOCK_MAX:
+        raise ValueError(f"count_in_stock must be at most {COUNT_IN_STOCK_MAX}")
+
+    return name, category, price_per_item_cents, description, count_in_stock
+
+
+def read_ndjson(stream):
+    """
+    Reads items from newline-delimited JSON, one object per line. Blank lines are skipped.
+
+    Args:
+        stream (file): A binary stream, e.g. the request body.
+
+    Yields:
+        tuple: (line number, item dict), or (line number, error message) for a
+        line that is not a JSON object.
+    """
+    for line_number, line in enumerate(io.TextIOWrapper(stream, encoding="utf-8"), 1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, "Invalid JSON"
+            continue
+        if not isinstance(item, dict):
+            yield line_number, "Each line must be a JSON object"
+            continue
+        yield line_number, item
+
+
+def read_csv(stream):
+    """
+    Reads items from CSV with a header row naming the columns: name, category,
+    price_per_item, count_in_stock and optionally description and sku. Empty
+    optional fields are treated as missing.
+
+    Args:
+        stream (file): A binary stream, e.g. the request body.
+
+    Yields:
+        tuple: (line number, item dict), or (line number, error message) for a
+        row that cannot be read.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding="utf-8", newline=""))
+    for row in reader:
+        item = {key: value for key, value in row.items() if key and value != ""}
+        if None in row:
+            yield reader.line_num, "Too many fields"
+            continue
+        count_in_stock = item.get("count_in_stock")
+        if count_in_stock is not None:
+            try:
+                item["count_in_stock"] = int(count_in_stock)
+            except ValueError:
+                pass
+        yield reader.line_num, item
+
+
+def import_items(conn, records, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Validates items and loads them into the inventory in chunks.
+
+    Each chunk of valid rows is copied into a temporary table with
+    ``COPY FROM STDIN`` and moved into `inventory` by two set-based statements, in
+    its own transaction: rows without a SKU are added, and rows with a SKU update
+    the item with that SKU or add it. A chunk that the database rejects is rolled
+    back and reported, and the import carries on with the next one, so invalid
+    rows never cost the valid ones.
+
+    Args:
+        conn (connection): A database connection.
+        records (iterable): (line number, item dict or error message) pairs, as
+            produced by `read_ndjson` or `read_csv`.
+        chunk_size (int): The number of valid rows loaded per transaction.
+
+    Returns:
+        dict: The number of items inserted and updated, the number of rejected
+        rows, and the errors (line and message), at most `BULK_MAX_ERRORS` of them.
+    """
+    result = {"inserted": 0, "updated": 0, "rejected": 0, "errors": []}
+
+    def reject(line, error):
+        result["rejected"] += 1
+        if len(result["errors"]) < BULK_MAX_ERRORS:
+            result["errors"].append({"line": line, "error": error})
+
+    chunk = []
+    for line, item in records:
+        if isinstance(item, str):
+            reject(line, item)
+            continue
+        try:
+            values = validate_item(item)
+            sku = item.get("sku")
+            if sku is not None and (not isinstance(sku, str) or len(sku) > SKU_MAX_LENGTH):
+                raise ValueError(f"sku must be a string of at most {SKU_MAX_LENGTH} characters")
+        except ValueError as e:
+            reject(line, str(e))
+            continue
+        chunk.append((line, sku) + values)
+        if len(chunk) >= chunk_size:
+            _load_chunk(conn, chunk, result, reject)
+            chunk = []
+    if chunk:
+        _load_chunk(conn, chunk, result, reject)
+
+    return result
+
+
+def _load_chunk(conn, rows, result, reject):
+    cur = conn.cursor()
+    try:
+        cur.execute(_STAGING_SQL)
+        cur.copy_expert(
+            f"COPY inventory_import ({', '.join(_COPY_COLUMNS)}) FROM STDIN",
+            io.StringIO("".join(_copy_line(row) for row in rows)),
+        )
+        cur.execute(_INSERT_SQL)
+        item_ids = [row[0] for row in cur.fetchall()]
+        inserted = len(item_ids)
+        cur.execute(_UPSERT_SQL)
+        updated_ids = []
+        for item_id, was_inserted in cur.fetchall():
+            item_ids.append(item_id)
+            inserted += was_inserted
+            if not was_inserted:
+                updated_ids.append(item_id)
+        if updated_ids:
+            # The imported count replaces the whole stock of a hot item too.
+            clear_stock_slots(cur, updated_ids)
+        notify_inventory_change(cur, item_ids)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        for row in rows:
+            reject(row[0], f"Chunk rejected by the database: {e}".strip())
+        return
+    finally:
+        cur.close()
+
+    result["inserted"] += inserted
+    result["updated"] += len(item_ids) - inserted
+
+
+def _copy_line(row):
+    return "\t".join(_copy_value(value) for value in row) + "\n"
+
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
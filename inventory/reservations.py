@@ -0,0 +1,342 @@
+import argparse
+import logging
+import os
+import sys
+import threading
+
+from common.notify import notify_inventory_change
+from common.stock_slots import AVAILABLE_STOCK_SQL, fold_stock_slots
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_TTL = int(os.environ.get("RESERVATION_TTL", "300"))
+RESERVATION_MAX_TTL = int(os.environ.get("RESERVATION_MAX_TTL", "3600"))
+RESERVATION_SWEEP_INTERVAL = float(os.environ.get("RESERVATION_SWEEP_INTERVAL", "30"))
+RESERVATION_SWEEP_BATCH = int(os.environ.get("RESERVATION_SWEEP_BATCH", "1000"))
+
+# Takes the stock and records the hold in one statement: if the item does not
+# have enough stock, neither happens.
+HOLD_SQL = f"""
+    WITH item AS (
+        UPDATE inventory
+        SET count_in_stock = count_in_stock - %(quantity)s
+        WHERE id = %(item_id)s AND count_in_stock >= %(quantity)s
+        RETURNING id, {AVAILABLE_STOCK_SQL} AS count_in_stock
+    ),
+    reservation AS (
+        INSERT INTO stock_reservations (item_id, quantity, expires_at)
+        SELECT id, %(quantity)s, LOCALTIMESTAMP + make_interval(secs => %(ttl)s)
+        FROM item
+        RETURNING id, expires_at
+    )
+    SELECT reservation.id, reservation.expires_at, item.count_in_stock
+    FROM item, reservation
+"""
+
+CONFIRM_SQL = """
+    UPDATE stock_reservations
+    SET status = 'confirmed'
+    WHERE id = %(reservation_id)s AND status = 'held' AND expires_at > LOCALTIMESTAMP
+    RETURNING item_id, quantity
+"""
+
+# Settles the hold and gives its stock back in one statement. A hold that has
+# expired but not been swept yet can still be released.
+RELEASE_SQL = """
+    WITH reservation AS (
+        UPDATE stock_reservations
+        SET status = 'released'
+        WHERE id = %(reservation_id)s AND status = 'held'
+        RETURNING item_id, quantity
+    )
+    UPDATE inventory
+    SET count_in_stock = inventory.count_in_stock + reservation.quantity
+    FROM reservation
+    WHERE inventory.id = reservation.item_id
+    RETURNING inventory.id, inventory.count_in_stock
+"""
+
+# A hold past its expiry time that has not been swept yet is reported as expired.
+RESERVATION_SQL = """
+    SELECT id, item_id, quantity,
+           CASE WHEN status = 'held' AND expires_at <= LOCALTIMESTAMP THEN 'expired' ELSE status END,
+           expires_at, created_at
+    FROM stock_reservations
+    WHERE id = %s
+"""
+
+# Marks a batch of expired holds, skipping any that a concurrent confirm,
+# release or sweeper has locked, and adds up their quantities per item.
+EXPIRE_SQL = """
+    WITH expired AS (
+        SELECT id
+        FROM stock_reservations
+        WHERE status = 'held' AND expires_at <= LOCALTIMESTAMP
+        ORDER BY expires_at
+        LIMIT %(batch_size)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    swept AS (
+        UPDATE stock_reservations
+        SET status = 'expired'
+        FROM expired
+        WHERE stock_reservations.id = expired.id
+        RETURNING stock_reservations.item_id, stock_reservations.quantity
+    )
+    SELECT item_id, sum(quantity)::int, count(*)
+    FROM swept
+    GROUP BY item_id
+    ORDER BY item_id
+"""
+
+# Locks the items in ID order, like `inventory.stock`, so a sweep cannot
+# deadlock with a stock adjustment batch.
+LOCK_ITEMS_SQL = """
+    SELECT id FROM inventory WHERE id = ANY(%(item_ids)s) ORDER BY id FOR NO KEY UPDATE
+"""
+
+RESTOCK_SQL = """
+    UPDATE inventory
+    SET count_in_stock = inventory.count_in_stock + returned.quantity
+    FROM unnest(%(item_ids)s::int[], %(quantities)s::int[]) AS returned (item_id, quantity)
+    WHERE inventory.id = returned.item_id
+"""
+
+
+def hold_stock(cur, item_id, quantity, ttl=RESERVATION_TTL):
+    """
+    Takes stock out of an item and records it as held for `ttl` seconds. The
+    caller commits.
+
+    No row lock outlives the statement: until the hold is confirmed, released or
+    swept, the stock is simply not available to anyone else. The stock is taken
+    from the item row; a hot item's slots are folded onto it if it has too little.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        item_id (int): The item to hold stock of.
+        quantity (int): The number of units to hold.
+        ttl (int): Seconds until the hold expires.
+
+    Returns:
+        tuple: (reservation ID, expiry time, remaining stock), or None if the item
+        does not exist or does not have enough stock.
+    """
+    params = {"item_id": item_id, "quantity": quantity, "ttl": ttl}
+    cur.execute(HOLD_SQL, params)
+    held = cur.fetchone()
+    if held is None and fold_stock_slots(cur, [item_id]):
+        cur.execute(HOLD_SQL, params)
+        held = cur.fetchone()
+    if held is not None:
+        notify_inventory_change(cur, [item_id])
+    return held
+
+
+def confirm_reservation(cur, reservation_id):
+    """
+    Confirms a hold that has not expired, making the deduction final. The caller commits.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        reservation_id (int): The reservation's ID.
+
+    Returns:
+        tuple: (item_id, quantity), or None if the reservation does not exist, is
+        not held, or has expired.
+    """
+    cur.execute(CONFIRM_SQL, {"reservation_id": reservation_id})
+    return cur.fetchone()
+
+
+def release_reservation(cur, reservation_id):
+    """
+    Releases a hold and returns its stock to the item. The caller commits.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        reservation_id (int): The reservation's ID.
+
+    Returns:
+        tuple: (item_id, new stock), or None if the reservation does not exist or
+        is not held.
+    """
+    cur.execute(RELEASE_SQL, {"reservation_id": reservation_id})
+    released = cur.fetchone()
+    if released is not None:
+        notify_inventory_change(cur, [released[0]])
+    return released
+
+
+def get_reservation(cur, reservation_id):
+    """
+    Reads a reservation.
+
+    Args:
+        cur (cursor): A database cursor.
+        reservation_id (int): The reservation's ID.
+
+    Returns:
+        dict: The reservation's fields, or None if it does not exist. A hold past
+        its expiry time that has not been swept yet is reported as expired.
+    """
+    cur.execute(RESERVATION_SQL, (reservation_id,))
+    row = cur.fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row[0],
+        "item_id": row[1],
+        "quantity": row[2],
+        "status": row[3],
+        "expires_at": row[4].isoformat(),
+        "created_at": row[5].isoformat(),
+    }
+
+
+def sweep_expired(conn, batch_size=RESERVATION_SWEEP_BATCH):
+    """
+    Returns the stock of expired holds to their items, one batch per transaction,
+    until no expired hold is left.
+
+    Several sweepers, e.g. one per server process, can run at once: each batch
+    skips the holds another transaction has locked.
+
+    Args:
+        conn (connection): A database connection.
+        batch_size (int): The number of holds expired per transaction.
+
+    Returns:
+        int: The number of holds expired.
+    """
+    swept = 0
+    while True:
+        cur = conn.cursor()
+        try:
+            cur.execute(EXPIRE_SQL, {"batch_size": batch_size})
+            returned = cur.fetchall()
+            if returned:
+                item_ids = [row[0] for row in returned]
+                cur.execute(LOCK_ITEMS_SQL, {"item_ids": item_ids})
+                cur.execute(
+                    RESTOCK_SQL,
+                    {"item_ids": item_ids, "quantities": [row[1] for row in returned]},
+                )
+                notify_inventory_change(cur, item_ids)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cur.close()
+
+        expired = sum(row[2] for row in returned)
+        swept += expired
+        if expired < batch_size:
+            return swept
+
+
+class ReservationSweeper:
+    """
+    Runs `sweep_expired` every `interval` seconds in a daemon thread, with a
+    connection checked out of the pool for each sweep.
+
+    The thread belongs to the process that started it; a forked worker starts its
+    own on its next `ensure_running`.
+
+    Args:
+        interval (float): Seconds between sweeps. 0 disables the sweeper.
+        batch_size (int): The number of holds expired per transaction.
+    """
+
+    def __init__(self, interval=RESERVATION_SWEEP_INTERVAL, batch_size=RESERVATION_SWEEP_BATCH):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+    def ensure_running(self):
+        """
+        Starts the sweeper thread in this process if it is not running yet.
+        """
+        if not self.interval or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, name="reservation-sweeper", daemon=True
+            )
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def stop(self):
+        """
+        Stops the sweeper thread.
+        """
+        self._stop.set()
+
+    def _run(self):
+        from common.db import get_pool
+
+        stop = self._stop
+        while not stop.wait(self.interval):
+            try:
+                pool = get_pool()
+                conn = pool.getconn()
+                try:
+                    swept = sweep_expired(conn, self.batch_size)
+                finally:
+                    pool.putconn(conn)
+                if swept:
+                    logger.info("Returned the stock of %d expired reservations", swept)
+            except Exception:
+                logger.exception("Sweeping expired reservations failed")
+
+
+sweeper = ReservationSweeper()
+
+
+def main(argv=None):
+    """
+    Command line entry point for returning the stock of expired reservations, e.g.
+    from cron when the in-process sweeper is disabled.
+
+    Commands:
+        sweep [--batch-size N]: Expires every hold past its expiry time.
+
+    Args:
+        argv (list, optional): The command line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: The process exit code.
+    """
+    from common.db import connect
+
+    parser = argparse.ArgumentParser(
+        prog="python -m inventory.reservations",
+        description="Maintain stock reservations.",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    sweep_parser = subparsers.add_parser("sweep", help="return the stock of expired holds")
+    sweep_parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=RESERVATION_SWEEP_BATCH,
+        help="holds expired per transaction",
+    )
+    args = parser.parse_args(argv)
+
+    conn = connect()
+    try:
+        print(f"Expired {sweep_expired(conn, args.batch_size)} reservations")
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,5 +1,29 @@
+import io
 from flask import Blueprint, request, jsonify
 from common.db import get_db
+from common.money import format_cents, to_cents
+from common.pagination import decode_cursor, encode_cursor, parse_limit
+from common.notify import notify_inventory_change
+from common.stock_slots import STOCK_SLOTS_MAX, clear_stock_slots, fold_stock_slots, set_stock_slots
+from .bulk import (
+    CATEGORIES,
+    COUNT_IN_STOCK_MAX,
+    PRICE_CENTS_MAX,
+    import_items,
+    read_csv,
+    read_ndjson,
+    validate_item,
+)
+from .reservations import (
+    RESERVATION_MAX_TTL,
+    RESERVATION_TTL,
+    confirm_reservation,
+    get_reservation,
+    hold_stock,
+    release_reservation,
+)
+from .search import SEARCH_MAX_PAGE_SIZE, SEARCH_PAGE_SIZE, SEARCH_QUERY_MAX_LENGTH, search_items
+from .stock import BATCH_ID_MAX_LENGTH, STOCK_BATCH_MAX, BatchConflictError, adjust_stock
 
 inventory_bp = Blueprint("inventory", __name__)
 
@@ -12,7 +36,7 @@ def add_goods():
     This route accepts a JSON request containing the item's details:
     - name (str)
     - category (str)
-    - price_per_item (float)
+    - price_per_item (number or decimal string, at most two decimal places)
     - description (str, optional)
     - count_in_stock (int)
 
@@ -29,49 +53,234 @@ def add_goods():
     try:
         data = request.json
 
-        name = data.get("name")
-        category = data.get("category")
-        price_per_item = data.get("price_per_item")
-        description = data.get("description")
-        count_in_stock = data.get("count_in_stock")
+        try:
+            name, category, price_per_item_cents, description, count_in_stock = validate_item(
+                data
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        if not name or not category or price_per_item is None or count_in_stock is None:
-            return jsonify({"error": "Missing required fields"}), 400
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO inventory (name, category, price_per_item_cents, description, count_in_stock)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING id
+            """,
+            (name, category, price_per_item_cents, description, count_in_stock),
+        )
+        item_id = cur.fetchone()[0]
+        notify_inventory_change(cur, [item_id])
+        conn.commit()
+        cur.close()
 
-        if category not in ["food", "clothes", "accessories", "electronics"]:
-            return jsonify({"error": "Invalid category"}), 400
+        return jsonify({"message": "Item added successfully", "id": item_id}), 201
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@inventory_bp.route("/inventory/bulk", methods=["POST"])
+def add_goods_in_bulk():
+    """
+    Adds or updates many inventory items from one streamed upload.
+
+    The body is read as it arrives, in one of two formats chosen by Content-Type:
+    - application/x-ndjson: one JSON object per line, with the fields of `add_goods`.
+    - text/csv: a header row naming the columns, then one item per row.
+
+    Every row is validated with the same rules as `add_goods`. An item may also
+    carry a `sku`; items whose SKU already exists are updated instead of added.
+    Valid rows are loaded with COPY in chunks of `BULK_CHUNK_SIZE`, each committed
+    on its own (see `inventory.bulk.import_items`), so invalid rows are reported
+    without holding back the valid ones.
 
-        if price_per_item < 0:
+    Args:
+        None
+
+    Returns:
+        JSON response with the number of items inserted, updated and rejected, and
+        the line number and message of each rejected row.
+    """
+    try:
+        content_type = request.mimetype
+        if content_type in ("application/x-ndjson", "application/jsonl"):
+            reader = read_ndjson
+        elif content_type == "text/csv":
+            reader = read_csv
+        else:
             return (
-                jsonify({"error": "Price and count_in_stock must be non-negative"}),
-                400,
+                jsonify({"error": "Content-Type must be application/x-ndjson or text/csv"}),
+                415,
             )
 
-        if count_in_stock < 0:
+        records = reader(io.BufferedReader(request.stream))
+        result = import_items(get_db(), records)
+
+        return jsonify(result), 200
+    except UnicodeDecodeError:
+        return jsonify({"error": "The body must be UTF-8 encoded"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@inventory_bp.route("/inventory/search", methods=["GET"])
+def search_goods():
+    """
+    Searches the inventory by name and description, best match first, one page at a time.
+
+    Query parameters:
+    - q: The search text, at most `SEARCH_QUERY_MAX_LENGTH` characters. Every word
+      must match, the last one as a prefix; names with a typo also match where
+      the pg_trgm extension is installed.
+    - category: Only return items of this category.
+    - min_price, max_price: Only return items in this price range (decimal strings).
+    - in_stock: "true" for items in stock only, "false" for sold-out items only.
+    - limit: The page size (default `SEARCH_PAGE_SIZE`, capped at `SEARCH_MAX_PAGE_SIZE`).
+    - after: The opaque token from a previous page's `X-Next-Cursor` header.
+
+    Args:
+        None
+
+    Returns:
+        A list of matching items with their rank. When more results follow, the
+        `X-Next-Cursor` response header holds the `after` token for the next page.
+    """
+    try:
+        args = request.args
+        text = args.get("q", "").strip()
+        if not text or len(text) > SEARCH_QUERY_MAX_LENGTH:
             return (
-                jsonify({"error": "Count of items in stock must be non-negative"}),
+                jsonify({"error": f"q must be 1 to {SEARCH_QUERY_MAX_LENGTH} characters long"}),
                 400,
             )
 
+        filters = {"category": args.get("category")}
+        if filters["category"] is not None and filters["category"] not in CATEGORIES:
+            return jsonify({"error": "Invalid category"}), 400
+        try:
+            for name in ("min_price", "max_price"):
+                filters[name] = to_cents(args[name]) if name in args else None
+            limit = parse_limit(args.get("limit"), SEARCH_PAGE_SIZE, SEARCH_MAX_PAGE_SIZE)
+            after = None
+            if "after" in args:
+                rank, item_id = decode_cursor(args["after"])
+                after = (float(rank), int(item_id))
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": str(e)}), 400
+        in_stock = args.get("in_stock")
+        if in_stock is not None:
+            if in_stock not in ("true", "false"):
+                return jsonify({"error": "in_stock must be true or false"}), 400
+            filters["in_stock"] = in_stock == "true"
+
         conn = get_db()
         cur = conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO inventory (name, category, price_per_item, description, count_in_stock)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id
-            """,
-            (name, category, price_per_item, description, count_in_stock),
+        try:
+            rows = search_items(cur, text, filters, after, limit + 1)
+        finally:
+            cur.close()
+
+        response = jsonify(
+            [
+                {
+                    "id": row[0],
+                    "name": row[1],
+                    "category": row[2],
+                    "price_per_item": format_cents(row[3]),
+                    "description": row[4],
+                    "count_in_stock": row[5],
+                    "rank": row[6],
+                }
+                for row in rows[:limit]
+            ]
         )
-        item_id = cur.fetchone()[0]
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            response.headers["X-Next-Cursor"] = encode_cursor([last[6], last[0]])
+        return response, 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@inventory_bp.route("/inventory/stock", methods=["PATCH"])
+def adjust_stock_in_bulk():
+    """
+    Adjusts the stock of many items at once, e.g. for a warehouse sync.
+
+    This route accepts a JSON request containing:
+    - batch_id (str): The client's ID for this batch, at most 64 characters.
+    - adjustments (list): Up to `STOCK_BATCH_MAX` objects with an item_id and a
+      signed integer delta.
+
+    All adjustments are applied by one UPDATE (see `inventory.stock.adjust_stock`).
+    An adjustment that would take an item's stock below zero, or names an unknown
+    item, is rejected without affecting the others. Sending the same batch again
+    returns the original result without applying it twice.
+
+    Args:
+        None
+
+    Returns:
+        JSON response listing the applied adjustments with the new stock and the
+        rejected ones with the reason, and whether the result was replayed; or
+        409 if the batch ID was already used for different adjustments.
+    """
+    try:
+        data = request.json
+        batch_id = data.get("batch_id")
+        adjustments = data.get("adjustments")
+
+        if not isinstance(batch_id, str) or not 0 < len(batch_id) <= BATCH_ID_MAX_LENGTH:
+            return (
+                jsonify(
+                    {"error": f"batch_id must be 1 to {BATCH_ID_MAX_LENGTH} characters long"}
+                ),
+                400,
+            )
+        if not isinstance(adjustments, list) or not adjustments:
+            return jsonify({"error": "adjustments must be a non-empty list"}), 400
+        if len(adjustments) > STOCK_BATCH_MAX:
+            return jsonify({"error": f"At most {STOCK_BATCH_MAX} adjustments are allowed"}), 400
+
+        pairs = []
+        for adjustment in adjustments:
+            item_id = adjustment.get("item_id") if isinstance(adjustment, dict) else None
+            delta = adjustment.get("delta") if isinstance(adjustment, dict) else None
+            if not all(
+                isinstance(value, int) and not isinstance(value, bool) and abs(value) < 2**31
+                for value in (item_id, delta)
+            ):
+                return (
+                    jsonify({"error": "Each adjustment needs an integer item_id and delta"}),
+                    400,
+                )
+            pairs.append((item_id, delta))
+
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            result, replayed = adjust_stock(cur, batch_id, pairs)
+        except BatchConflictError as e:
+            conn.rollback()
+            cur.close()
+            return jsonify({"error": str(e)}), 409
         conn.commit()
         cur.close()
 
-        return jsonify({"message": "Item added successfully", "id": item_id}), 201
+        return jsonify(dict(result, replayed=replayed)), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+DEDUCT_SQL = """
+    UPDATE inventory
+    SET count_in_stock = count_in_stock - %(quantity)s
+    WHERE id = %(item_id)s AND count_in_stock >= %(quantity)s
+    RETURNING count_in_stock
+"""
+
+
 @inventory_bp.route("/inventory/<int:item_id>/deduct", methods=["PATCH"])
 def deduct_goods(item_id):
     """
@@ -80,8 +289,10 @@ def deduct_goods(item_id):
     This route accepts a JSON request containing:
     - quantity (int): The number of items to deduct from the stock.
 
-    It checks that the quantity is valid, and that sufficient stock is available
-    before proceeding with the deduction. If successful, it returns a success message.
+    The stock is checked and deducted by one conditional UPDATE, so concurrent
+    deductions can never take it below zero. The slots of a hot item are only
+    folded onto its row if that UPDATE comes up short. If successful, it returns
+    a success message.
 
     Args:
         item_id (int): The ID of the item to deduct from.
@@ -93,35 +304,155 @@ def deduct_goods(item_id):
         data = request.json
         quantity = data.get("quantity")
 
-        if quantity is None or quantity <= 0:
+        if not _is_quantity(quantity):
             return jsonify({"error": "Invalid quantity"}), 400
 
         conn = get_db()
         cur = conn.cursor()
+        try:
+            params = {"item_id": item_id, "quantity": quantity}
+            cur.execute(DEDUCT_SQL, params)
+            deducted = cur.fetchone()
+            if deducted is None and fold_stock_slots(cur, [item_id]):
+                # A hot item's stock was in its slots; it is on the item row now.
+                cur.execute(DEDUCT_SQL, params)
+                deducted = cur.fetchone()
+            if deducted is None:
+                conn.rollback()
+                return _stock_unavailable(cur, item_id)
+
+            notify_inventory_change(cur, [item_id])
+            conn.commit()
+        finally:
+            cur.close()
+
+        return jsonify({"message": "Stock deducted successfully"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        cur.execute("SELECT count_in_stock FROM inventory WHERE id = %s", (item_id,))
-        item = cur.fetchone()
 
-        if not item:
-            return jsonify({"error": "Item not found"}), 404
+@inventory_bp.route("/inventory/reservations", methods=["POST"])
+def reserve_goods():
+    """
+    Holds stock of an item for a limited time, e.g. while a checkout is paid for.
 
-        current_stock = item[0]
+    This route accepts a JSON request containing:
+    - item_id (int): The item to hold stock of.
+    - quantity (int): The number of units to hold.
+    - ttl (int, optional): Seconds until the hold expires, at most
+      `RESERVATION_MAX_TTL`. Defaults to `RESERVATION_TTL`.
 
-        if current_stock < quantity:
-            return jsonify({"error": "Not enough stock available"}), 400
+    The held units are taken out of the stock at once. Confirm the reservation to
+    make the deduction final, or release it to give them back; a hold that is
+    neither is returned to the stock by the sweeper once it expires.
 
-        cur.execute(
-            "UPDATE inventory SET count_in_stock = count_in_stock - %s WHERE id = %s",
-            (quantity, item_id),
+    Args:
+        None
+
+    Returns:
+        JSON response with the reservation and the remaining stock, or error details.
+    """
+    try:
+        data = request.json
+        item_id = data.get("item_id")
+        quantity = data.get("quantity")
+        ttl = data.get("ttl", RESERVATION_TTL)
+
+        if not _is_quantity(item_id):
+            return jsonify({"error": "Invalid item_id"}), 400
+        if not _is_quantity(quantity):
+            return jsonify({"error": "Invalid quantity"}), 400
+        if not _is_quantity(ttl) or ttl > RESERVATION_MAX_TTL:
+            return (
+                jsonify({"error": f"ttl must be 1 to {RESERVATION_MAX_TTL} seconds"}),
+                400,
+            )
+
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            held = hold_stock(cur, item_id, quantity, ttl)
+            if held is None:
+                conn.rollback()
+                return _stock_unavailable(cur, item_id)
+            conn.commit()
+        finally:
+            cur.close()
+
+        reservation_id, expires_at, count_in_stock = held
+        return (
+            jsonify(
+                {
+                    "id": reservation_id,
+                    "item_id": item_id,
+                    "quantity": quantity,
+                    "status": "held",
+                    "expires_at": expires_at.isoformat(),
+                    "count_in_stock": count_in_stock,
+                }
+            ),
+            201,
         )
-        conn.commit()
-        cur.close()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify({"message": "Stock deducted successfully"}), 200
+
+@inventory_bp.route("/inventory/reservations/<int:reservation_id>", methods=["GET"])
+def get_goods_reservation(reservation_id):
+    """
+    Retrieves a stock reservation.
+
+    Args:
+        reservation_id (int): The ID of the reservation.
+
+    Returns:
+        JSON response with the reservation, or 404 if it does not exist.
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            reservation = get_reservation(cur, reservation_id)
+        finally:
+            cur.close()
+
+        if reservation is None:
+            return jsonify({"error": "Reservation not found"}), 404
+        return jsonify(reservation), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@inventory_bp.route("/inventory/reservations/<int:reservation_id>/confirm", methods=["POST"])
+def confirm_goods_reservation(reservation_id):
+    """
+    Confirms a held reservation before it expires, making its deduction final.
+
+    Args:
+        reservation_id (int): The ID of the reservation.
+
+    Returns:
+        JSON response with the confirmed reservation, 404 if it does not exist,
+        or 409 if it is no longer held.
+    """
+    return _settle_reservation(reservation_id, confirm_reservation, "confirmed")
+
+
+@inventory_bp.route("/inventory/reservations/<int:reservation_id>/release", methods=["POST"])
+def release_goods_reservation(reservation_id):
+    """
+    Releases a held reservation, returning its units to the stock.
+
+    Args:
+        reservation_id (int): The ID of the reservation.
+
+    Returns:
+        JSON response with the released reservation, 404 if it does not exist,
+        or 409 if it is no longer held.
+    """
+    return _settle_reservation(reservation_id, release_reservation, "released")
+
+
 @inventory_bp.route("/inventory/<int:item_id>", methods=["PUT"])
 def update_goods(item_id):
     """
@@ -130,9 +461,10 @@ def update_goods(item_id):
     This route accepts a JSON request containing fields to update:
     - name (str, optional)
     - category (str, optional)
-    - price_per_item (float, optional)
+    - price_per_item (number or decimal string, optional)
     - description (str, optional)
-    - count_in_stock (int, optional)
+    - count_in_stock (int, optional): Replaces the whole stock, including any
+      held in a hot item's slots.
 
     It validates the provided fields (e.g., non-negative price and stock) and updates
     the corresponding fields in the inventory database. If successful, it returns the
@@ -158,21 +490,34 @@ def update_goods(item_id):
             "count_in_stock",
         ]:
             if field in data:
+                value = data[field]
+                if field == "price_per_item":
+                    try:
+                        value = to_cents(value)
+                    except ValueError as e:
+                        return jsonify({"error": f"Invalid price_per_item: {e}"}), 400
+                    if value < 0:
+                        return jsonify({"error": "Price must be non-negative"}), 400
+                    if value > PRICE_CENTS_MAX:
+                        return jsonify({"error": "price_per_item is too large"}), 400
+                    field = "price_per_item_cents"
                 updates.append(f"{field} = %s")
-                values.append(data[field])
+                values.append(value)
 
-        if "category" in data and data["category"] not in [
-            "food",
-            "clothes",
-            "accessories",
-            "electronics",
-        ]:
+        if "category" in data and data["category"] not in CATEGORIES:
             return jsonify({"error": "Invalid category"}), 400
 
-        if "price_per_item" in data and data["price_per_item"] < 0:
-            return jsonify({"error": "Price must be non-negative"}), 400
-        if "count_in_stock" in data and data["count_in_stock"] < 0:
-            return jsonify({"error": "Count in stock must be non-negative"}), 400
+        if "count_in_stock" in data:
+            count_in_stock = data["count_in_stock"]
+            if not isinstance(count_in_stock, int) or isinstance(count_in_stock, bool):
+                return jsonify({"error": "count_in_stock must be an integer"}), 400
+            if count_in_stock < 0:
+                return jsonify({"error": "Count in stock must be non-negative"}), 400
+            if count_in_stock > COUNT_IN_STOCK_MAX:
+                return (
+                    jsonify({"error": f"count_in_stock must be at most {COUNT_IN_STOCK_MAX}"}),
+                    400,
+                )
 
         if not updates:
             return jsonify({"error": "No fields to update"}), 400
@@ -195,6 +540,9 @@ def update_goods(item_id):
         if not updated_item_id:
             return jsonify({"error": "Item not found"}), 404
 
+        if "count_in_stock" in data:
+            clear_stock_slots(cur, [item_id])
+        notify_inventory_change(cur, [item_id])
         conn.commit()
         cur.close()
 
@@ -204,3 +552,80 @@ def update_goods(item_id):
         )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+
+@inventory_bp.route("/inventory/<int:item_id>/slots", methods=["PUT"])
+def set_goods_stock_slots(item_id):
+    """
+    Makes an item a hot item whose stock is split across counter slots, so that
+    concurrent purchases of it do not queue on one row, or makes it a regular item
+    again. Items are also promoted and demoted automatically when
+    `HOT_ITEM_WINDOW` is set (see `sales.hot_items`).
+
+    This route accepts a JSON request containing:
+    - slots (int): The number of slots, up to `STOCK_SLOTS_MAX`; 0 for a regular item.
+
+    Args:
+        item_id (int): The ID of the item.
+
+    Returns:
+        JSON response with the number of slots and the item's stock, or error details.
+    """
+    try:
+        slots = request.json.get("slots")
+
+        if (
+            not isinstance(slots, int)
+            or isinstance(slots, bool)
+            or not 0 <= slots <= STOCK_SLOTS_MAX
+        ):
+            return jsonify({"error": f"slots must be an integer from 0 to {STOCK_SLOTS_MAX}"}), 400
+
+        count_in_stock = set_stock_slots(get_db(), item_id, slots, auto=False)
+        if count_in_stock is None:
+            return jsonify({"error": "Item not found"}), 404
+
+        return (
+            jsonify({"id": item_id, "slots": slots, "count_in_stock": count_in_stock}),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _settle_reservation(reservation_id, settle, status):
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        try:
+            settled = settle(cur, reservation_id)
+            if settled is not None:
+                conn.commit()
+                return jsonify({"id": reservation_id, "status": status}), 200
+
+            conn.rollback()
+            reservation = get_reservation(cur, reservation_id)
+        finally:
+            cur.close()
+
+        if reservation is None:
+            return jsonify({"error": "Reservation not found"}), 404
+        return (
+            jsonify(
+                {"error": f"Reservation is {reservation['status']}", "status": reservation["status"]}
+            ),
+            409,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _stock_unavailable(cur, item_id):
+    cur.execute("SELECT 1 FROM inventory WHERE id = %s", (item_id,))
+    if cur.fetchone() is None:
+        return jsonify({"error": "Item not found"}), 404
+    return jsonify({"error": "Not enough stock available"}), 400
+
+
+def _is_quantity(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value < 2**31
@@ -0,0 +1,121 @@
+import re
+
+from common.stock_slots import AVAILABLE_STOCK_SQL
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+SEARCH_QUERY_MAX_LENGTH = 100
+
+# Created by migration 0016 only where pg_trgm could be installed.
+TRIGRAM_INDEX = "inventory_name_trgm_idx"
+
+# OFFSET 0 keeps the subquery from being flattened into the outer query, which
+# would compute the rank of every match twice: once for the keyset condition and
+# once for the result.
+_SEARCH_SQL = """
+    SELECT id, name, category, price_per_item_cents, description, {available_stock}, rank
+    FROM (
+        SELECT id, name, category, price_per_item_cents, description, count_in_stock,
+               stock_slots, (ts_rank_cd(search_vector, query){similarity})::float8 AS rank
+        FROM inventory, to_tsquery('english', %(tsquery)s) AS query
+        WHERE (search_vector @@ query{fuzzy_match}){filters}
+        OFFSET 0
+    ) AS inventory
+    WHERE rank < %(before_rank)s OR (rank = %(before_rank)s AND id > %(before_id)s)
+    ORDER BY rank DESC, id
+    LIMIT %(limit)s
+"""
+
+# Names within a typo or two of a query word, e.g. "iphnoe" for "iPhone". Both
+# sides are lower-cased, as in the trigram index.
+_FUZZY_MATCH_SQL = " OR %(text)s <%% lower(name)"
+_SIMILARITY_SQL = " + word_similarity(%(text)s, lower(name))"
+
+_FILTER_SQL = {
+    "category": "category = %(category)s",
+    "min_price": "price_per_item_cents >= %(min_price)s",
+    "max_price": "price_per_item_cents <= %(max_price)s",
+    "in_stock": f"(count_in_stock > 0 OR (stock_slots > 0 AND {AVAILABLE_STOCK_SQL} > 0))",
+    "out_of_stock": f"NOT (count_in_stock > 0 OR (stock_slots > 0 AND {AVAILABLE_STOCK_SQL} > 0))",
+}
+
+_fuzzy = None
+
+
+def to_prefix_tsquery(text):
+    """
+    Turns free text into a `to_tsquery` expression that matches items containing
+    every word, the last one possibly unfinished, e.g. "red sneak" matches
+    "Red Sneakers".
+
+    Args:
+        text (str): The search text.
+
+    Returns:
+        str: The tsquery expression, or None if the text has no letters or digits.
+    """
+    words = re.findall(r"\w+", text.lower())
+    if not words:
+        return None
+    return " & ".join(f"{word}:*" for word in words)
+
+
+def search_items(cur, text, filters, before=None, limit=SEARCH_PAGE_SIZE):
+    """
+    Finds items whose name or description matches the search text, best match first.
+
+    Words are matched by full-text search over the name and, with a lower weight,
+    the description, with every word treated as a prefix. Where the trigram index
+    exists, names that are merely similar to the text also match, so a typo still
+    finds the item. Both conditions are served by GIN indexes.
+
+    Args:
+        cur (cursor): A database cursor.
+        text (str): The search text.
+        filters (dict): Any of category, min_price and max_price (in cents), and
+            in_stock (bool).
+        before (tuple, optional): (rank, id) of the last item of the previous page.
+        limit (int): The number of items to return.
+
+    Returns:
+        list: (id, name, category, price in cents, description, count_in_stock,
+        rank) rows, ordered by rank descending and then ID.
+    """
+    params = {
+        "tsquery": to_prefix_tsquery(text) or "",
+        "text": text.lower(),
+        "before_rank": float("inf"),
+        "before_id": 0,
+        "limit": limit,
+    }
+    if before is not None:
+        params["before_rank"], params["before_id"] = before
+
+    conditions = []
+    for name in ("category", "min_price", "max_price"):
+        if filters.get(name) is not None:
+            conditions.append(_FILTER_SQL[name])
+            params[name] = filters[name]
+    if filters.get("in_stock") is not None:
+        conditions.append(_FILTER_SQL["in_stock" if filters["in_stock"] else "out_of_stock"])
+
+    fuzzy = _has_fuzzy_index(cur)
+    cur.execute(
+        _SEARCH_SQL.format(
+            available_stock=AVAILABLE_STOCK_SQL,
+            similarity=_SIMILARITY_SQL if fuzzy else "",
+            fuzzy_match=_FUZZY_MATCH_SQL if fuzzy else "",
+            filters="".join(f"\n          AND {condition}" for condition in conditions),
+        ),
+        params,
+    )
+    return cur.fetchall()
+
+
+def _has_fuzzy_index(cur):
+    global _fuzzy
+
+    if _fuzzy is None:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (TRIGRAM_INDEX,))
+        _fuzzy = cur.fetchone()[0]
+    return _fuzzy
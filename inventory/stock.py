@@ -0,0 +1,140 @@
+import hashlib
+import json
+
+from psycopg2.extras import Json
+
+from common.notify import notify_inventory_change
+from common.stock_slots import AVAILABLE_STOCK_SQL, fold_stock_slots
+
+from .bulk import COUNT_IN_STOCK_MAX
+
+STOCK_BATCH_MAX = 10000
+BATCH_ID_MAX_LENGTH = 64
+
+# Claims the batch. A concurrent request with the same batch ID waits here until
+# the first one commits, then finds the row and replays its result.
+CLAIM_BATCH_SQL = """
+    INSERT INTO stock_adjustment_batches (batch_id, request_hash)
+    VALUES (%(batch_id)s, %(request_hash)s)
+    ON CONFLICT (batch_id) DO NOTHING
+    RETURNING batch_id
+"""
+
+# Locks the items in ID order, so concurrent batches cannot deadlock. See
+# `common.stock_slots.LOCK_HOT_ITEMS_SQL` for why FOR NO KEY UPDATE.
+LOCK_ITEMS_SQL = """
+    SELECT id FROM inventory WHERE id = ANY(%(item_ids)s) ORDER BY id FOR NO KEY UPDATE
+"""
+
+# Applies every adjustment with one UPDATE; an adjustment that would take the
+# stock below zero, or beyond what the column holds, matches no row and is left
+# out. Hot items report their stock including their slots.
+ADJUST_STOCK_SQL = f"""
+    UPDATE inventory
+    SET count_in_stock = inventory.count_in_stock + adjustment.delta
+    FROM unnest(%(item_ids)s::int[], %(deltas)s::int[]) AS adjustment (item_id, delta)
+    WHERE inventory.id = adjustment.item_id
+      AND inventory.count_in_stock::bigint + adjustment.delta BETWEEN 0 AND {COUNT_IN_STOCK_MAX}
+    RETURNING inventory.id, {AVAILABLE_STOCK_SQL}
+"""
+
+
+class BatchConflictError(ValueError):
+    """
+    Raised when a batch ID is reused for different adjustments.
+    """
+
+
+def adjust_stock(cur, batch_id, adjustments):
+    """
+    Applies a batch of stock adjustments, at most once per batch ID. The caller commits.
+
+    Deltas for the same item are added up and applied, or rejected, together; an
+    item is rejected if its stock would go below zero or beyond
+    `COUNT_IN_STOCK_MAX`. The number of statements does not depend on the batch
+    size: the batch ID is claimed, the items are locked, one set-based UPDATE
+    guarded against out-of-range stock applies the adjustments, and the result
+    is stored.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        batch_id (str): The client's ID for the batch.
+        adjustments (list): (item_id, delta) pairs; a negative delta removes stock.
+
+    Returns:
+        tuple: (result, replayed). The result lists the applied adjustments with the
+        new stock and the rejected ones with the reason. `replayed` is True if the
+        batch had already been applied and its stored result is returned.
+
+    Raises:
+        BatchConflictError: If the batch ID was already used for other adjustments.
+    """
+    totals = {}
+    for item_id, delta in adjustments:
+        totals[item_id] = totals.get(item_id, 0) + delta
+    item_ids = sorted(totals)
+    request_hash = hashlib.sha256(
+        json.dumps([[item_id, totals[item_id]] for item_id in item_ids]).encode()
+    ).hexdigest()
+
+    cur.execute(CLAIM_BATCH_SQL, {"batch_id": batch_id, "request_hash": request_hash})
+    if cur.fetchone() is None:
+        cur.execute(
+            "SELECT request_hash, result FROM stock_adjustment_batches WHERE batch_id = %s",
+            (batch_id,),
+        )
+        stored_hash, result = cur.fetchone()
+        if stored_hash != request_hash:
+            raise BatchConflictError(f"Batch {batch_id} was already used for other adjustments")
+        return result, True
+
+    cur.execute(LOCK_ITEMS_SQL, {"item_ids": item_ids})
+    existing = {row[0] for row in cur.fetchall()}
+    # Totals beyond the range of the stock column can never be applied.
+    in_range = [item_id for item_id in item_ids if abs(totals[item_id]) <= COUNT_IN_STOCK_MAX]
+    cur.execute(
+        ADJUST_STOCK_SQL,
+        {"item_ids": in_range, "deltas": [totals[item_id] for item_id in in_range]},
+    )
+    stock = dict(cur.fetchall())
+
+    # Removals from hot items may only have come up short because the stock is
+    # in their slots: fold it onto the item rows and apply those again.
+    short = [
+        item_id
+        for item_id in existing - set(stock)
+        if -COUNT_IN_STOCK_MAX <= totals[item_id] < 0
+    ]
+    if short and fold_stock_slots(cur, short):
+        short = sorted(short)
+        cur.execute(
+            ADJUST_STOCK_SQL,
+            {"item_ids": short, "deltas": [totals[item_id] for item_id in short]},
+        )
+        stock.update(cur.fetchall())
+
+    result = {"batch_id": batch_id, "applied": [], "rejected": []}
+    for item_id in item_ids:
+        if item_id in stock:
+            result["applied"].append({"item_id": item_id, "count_in_stock": stock[item_id]})
+        elif item_id in existing and totals[item_id] > 0:
+            result["rejected"].append(
+                {
+                    "item_id": item_id,
+                    "error": f"count_in_stock must be at most {COUNT_IN_STOCK_MAX}",
+                }
+            )
+        elif item_id in existing:
+            result["rejected"].append(
+                {"item_id": item_id, "error": "Not enough stock available"}
+            )
+        else:
+            result["rejected"].append({"item_id": item_id, "error": "Item not found"})
+
+    if stock:
+        notify_inventory_change(cur, sorted(stock))
+    cur.execute(
+        "UPDATE stock_adjustment_batches SET result = %s WHERE batch_id = %s",
+        (Json(result), batch_id),
+    )
+    return result, False
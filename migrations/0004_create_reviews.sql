@@ -0,0 +1,9 @@
+CREATE TABLE IF NOT EXISTS reviews (
+    id SERIAL PRIMARY KEY,
+    customer_id INT NOT NULL REFERENCES customers(id),
+    item_id INT NOT NULL REFERENCES inventory(id),
+    rating INT CHECK (rating >= 1 AND rating <= 5) NOT NULL,
+    comment TEXT,
+    is_approved BOOLEAN DEFAULT FALSE,
+    review_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
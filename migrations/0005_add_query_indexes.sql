@@ -0,0 +1,24 @@
+-- Purchase history: WHERE customer_id = ? ORDER BY sale_date DESC.
+-- Covering, so the history is read with an index-only scan.
+CREATE INDEX IF NOT EXISTS sales_customer_id_sale_date_idx
+    ON sales (customer_id, sale_date DESC)
+    INCLUDE (id, item_id, quantity);
+
+-- Foreign key lookups from inventory to its sales.
+CREATE INDEX IF NOT EXISTS sales_item_id_idx
+    ON sales (item_id);
+
+-- Product reviews: WHERE item_id = ? AND is_approved ORDER BY review_date DESC.
+-- Partial, since only approved reviews are ever listed per product.
+CREATE INDEX IF NOT EXISTS reviews_item_id_approved_review_date_idx
+    ON reviews (item_id, review_date DESC)
+    WHERE is_approved;
+
+-- Customer reviews: WHERE customer_id = ? ORDER BY review_date DESC.
+CREATE INDEX IF NOT EXISTS reviews_customer_id_review_date_idx
+    ON reviews (customer_id, review_date DESC);
+
+ANALYZE customers;
+ANALYZE inventory;
+ANALYZE sales;
+ANALYZE reviews;
@@ -0,0 +1,41 @@
+-- Every wallet change, as a signed amount. Rows are only ever inserted; the
+-- current balance is kept in customers.wallet_balance by the same statement
+-- that inserts the entry.
+CREATE TABLE IF NOT EXISTS wallet_ledger (
+    id BIGSERIAL PRIMARY KEY,
+    customer_id INT NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+    amount NUMERIC NOT NULL,
+    kind VARCHAR(20) NOT NULL,
+    reference_id INT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Ledger pages: WHERE customer_id = ? AND id < ? ORDER BY id DESC.
+CREATE INDEX IF NOT EXISTS wallet_ledger_customer_id_id_idx
+    ON wallet_ledger (customer_id, id);
+
+CREATE OR REPLACE FUNCTION wallet_ledger_append_only() RETURNS trigger AS $$
+BEGIN
+    RAISE EXCEPTION 'wallet_ledger is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER wallet_ledger_append_only
+    BEFORE UPDATE ON wallet_ledger
+    FOR EACH ROW EXECUTE FUNCTION wallet_ledger_append_only();
+
+-- The ledger balance of a customer up to and including `ledger_id`, so the
+-- ledger can be checked against wallet_balance without summing its whole history.
+CREATE TABLE IF NOT EXISTS wallet_snapshots (
+    customer_id INT NOT NULL REFERENCES customers(id) ON DELETE CASCADE,
+    ledger_id BIGINT NOT NULL,
+    balance NUMERIC NOT NULL,
+    taken_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (customer_id, ledger_id)
+);
+
+-- Existing balances become opening entries.
+INSERT INTO wallet_ledger (customer_id, amount, kind)
+SELECT id, wallet_balance, 'opening'
+FROM customers
+WHERE wallet_balance <> 0;
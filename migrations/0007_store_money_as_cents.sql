@@ -0,0 +1,20 @@
+-- Money is stored as a whole number of cents. Existing amounts are rounded to
+-- the nearest cent; the columns are renamed so the unit is explicit.
+ALTER TABLE customers ALTER COLUMN wallet_balance DROP DEFAULT;
+ALTER TABLE customers
+    ALTER COLUMN wallet_balance TYPE BIGINT USING round(COALESCE(wallet_balance, 0) * 100);
+ALTER TABLE customers ALTER COLUMN wallet_balance SET DEFAULT 0;
+ALTER TABLE customers ALTER COLUMN wallet_balance SET NOT NULL;
+ALTER TABLE customers RENAME COLUMN wallet_balance TO wallet_balance_cents;
+
+ALTER TABLE inventory
+    ALTER COLUMN price_per_item TYPE BIGINT USING round(price_per_item * 100);
+ALTER TABLE inventory RENAME COLUMN price_per_item TO price_per_item_cents;
+
+ALTER TABLE wallet_ledger
+    ALTER COLUMN amount TYPE BIGINT USING round(amount * 100);
+ALTER TABLE wallet_ledger RENAME COLUMN amount TO amount_cents;
+
+ALTER TABLE wallet_snapshots
+    ALTER COLUMN balance TYPE BIGINT USING round(balance * 100);
+ALTER TABLE wallet_snapshots RENAME COLUMN balance TO balance_cents;
@@ -0,0 +1,18 @@
+-- Passwords are stored as salted PBKDF2 hashes (see common.auth). Existing
+-- plaintext passwords stay in `password` until the customer next logs in, when
+-- they are replaced by a hash.
+ALTER TABLE customers ADD COLUMN IF NOT EXISTS password_hash TEXT;
+ALTER TABLE customers ALTER COLUMN password DROP NOT NULL;
+
+-- Session tokens revoked before they expire. Workers keep a copy of the
+-- unexpired rows in memory; rows past expires_at can be deleted at any time.
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id BIGSERIAL PRIMARY KEY,
+    jti VARCHAR(64) UNIQUE NOT NULL,
+    customer_id INT REFERENCES customers(id) ON DELETE CASCADE,
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS revoked_tokens_expires_at_idx
+    ON revoked_tokens (expires_at);
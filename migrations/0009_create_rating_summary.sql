@@ -0,0 +1,31 @@
+-- Per-item totals of approved reviews, kept up to date by the review routes in
+-- the same transaction as the review change (see reviews.summary).
+CREATE TABLE IF NOT EXISTS rating_summary (
+    item_id INT PRIMARY KEY REFERENCES inventory(id) ON DELETE CASCADE,
+    review_count INT NOT NULL DEFAULT 0,
+    rating_sum BIGINT NOT NULL DEFAULT 0,
+    rating_1 INT NOT NULL DEFAULT 0,
+    rating_2 INT NOT NULL DEFAULT 0,
+    rating_3 INT NOT NULL DEFAULT 0,
+    rating_4 INT NOT NULL DEFAULT 0,
+    rating_5 INT NOT NULL DEFAULT 0,
+    last_review_date TIMESTAMP
+);
+
+INSERT INTO rating_summary (
+    item_id, review_count, rating_sum,
+    rating_1, rating_2, rating_3, rating_4, rating_5, last_review_date
+)
+SELECT item_id, count(*), sum(rating),
+       count(*) FILTER (WHERE rating = 1),
+       count(*) FILTER (WHERE rating = 2),
+       count(*) FILTER (WHERE rating = 3),
+       count(*) FILTER (WHERE rating = 4),
+       count(*) FILTER (WHERE rating = 5),
+       max(review_date)
+FROM reviews
+WHERE is_approved
+GROUP BY item_id
+ON CONFLICT (item_id) DO NOTHING;
+
+ANALYZE rating_summary;
@@ -0,0 +1,18 @@
+-- Review listings are paginated on (review_date, id), newest first, so every
+-- review needs a date.
+UPDATE reviews SET review_date = CURRENT_TIMESTAMP WHERE review_date IS NULL;
+ALTER TABLE reviews ALTER COLUMN review_date SET NOT NULL;
+
+-- Product reviews: WHERE item_id = ? AND is_approved AND (review_date, id) < (?, ?)
+-- ORDER BY review_date DESC, id DESC, read by a backward index scan.
+CREATE INDEX IF NOT EXISTS reviews_item_id_approved_review_date_id_idx
+    ON reviews (item_id, review_date, id)
+    WHERE is_approved;
+DROP INDEX IF EXISTS reviews_item_id_approved_review_date_idx;
+
+-- Customer reviews: the same on customer_id, approved or not.
+CREATE INDEX IF NOT EXISTS reviews_customer_id_review_date_id_idx
+    ON reviews (customer_id, review_date, id);
+DROP INDEX IF EXISTS reviews_customer_id_review_date_idx;
+
+ANALYZE reviews;
@@ -0,0 +1,13 @@
+-- When a moderator last approved or rejected the review. Reviews that were
+-- never moderated form the moderation queue; rejected ones leave it.
+ALTER TABLE reviews ADD COLUMN IF NOT EXISTS moderated_at TIMESTAMP;
+UPDATE reviews SET moderated_at = review_date WHERE is_approved;
+
+-- Pending reviews: WHERE NOT is_approved AND moderated_at IS NULL
+-- ORDER BY review_date, id. Only the queue is indexed, so the index stays
+-- small however many reviews have been moderated.
+CREATE INDEX IF NOT EXISTS reviews_pending_review_date_id_idx
+    ON reviews (review_date, id)
+    WHERE is_approved = FALSE AND moderated_at IS NULL;
+
+ANALYZE reviews;
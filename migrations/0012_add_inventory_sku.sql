@@ -0,0 +1,4 @@
+-- An optional external stock keeping unit, used by bulk imports to update
+-- existing items instead of adding duplicates.
+ALTER TABLE inventory ADD COLUMN IF NOT EXISTS sku VARCHAR(64);
+CREATE UNIQUE INDEX IF NOT EXISTS inventory_sku_key ON inventory (sku);
@@ -0,0 +1,8 @@
+-- Stock adjustment batches that have been applied, with the response that was
+-- sent, so a retried batch is answered without being applied twice.
+CREATE TABLE IF NOT EXISTS stock_adjustment_batches (
+    batch_id VARCHAR(64) PRIMARY KEY,
+    request_hash CHAR(64) NOT NULL,
+    result JSONB,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
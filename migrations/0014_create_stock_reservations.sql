@@ -0,0 +1,16 @@
+-- Stock held for a checkout. The held quantity has already been taken out of
+-- inventory.count_in_stock; it is given back when the hold is released or expires.
+CREATE TABLE IF NOT EXISTS stock_reservations (
+    id BIGSERIAL PRIMARY KEY,
+    item_id INT NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+    quantity INT NOT NULL CHECK (quantity > 0),
+    status VARCHAR(10) NOT NULL DEFAULT 'held'
+        CHECK (status IN ('held', 'confirmed', 'released', 'expired')),
+    expires_at TIMESTAMP NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Lets the sweeper find expired holds without scanning settled reservations.
+CREATE INDEX IF NOT EXISTS stock_reservations_held_expires_at_idx
+    ON stock_reservations (expires_at)
+    WHERE status = 'held';
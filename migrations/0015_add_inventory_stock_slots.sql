@@ -0,0 +1,13 @@
+-- Hot items: an item's stock can be split across counter slots so concurrent
+-- purchases update different rows. The item's available stock is its own
+-- count_in_stock plus the sum of its slots; stock_slots is the number of slots
+-- purchases spread over, 0 for a regular item.
+ALTER TABLE inventory
+    ADD COLUMN IF NOT EXISTS stock_slots SMALLINT NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS inventory_stock_slots (
+    item_id INT NOT NULL REFERENCES inventory(id) ON DELETE CASCADE,
+    slot SMALLINT NOT NULL,
+    count_in_stock INT NOT NULL CHECK (count_in_stock >= 0),
+    PRIMARY KEY (item_id, slot)
+);
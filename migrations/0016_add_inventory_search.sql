@@ -0,0 +1,30 @@
+-- Product search: a weighted full-text vector over name and description, kept
+-- up to date by PostgreSQL on every insert and update, with a GIN index.
+ALTER TABLE inventory
+    ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS inventory_search_vector_idx
+    ON inventory USING gin (search_vector);
+
+-- Typo-tolerant name matching needs the pg_trgm extension. Where it cannot be
+-- installed, search still works, without fuzzy matches.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS inventory_name_trgm_idx
+            ON inventory USING gin (lower(name) gin_trgm_ops);
+    ELSE
+        RAISE NOTICE 'pg_trgm is not available; fuzzy product search is disabled';
+    END IF;
+EXCEPTION
+    WHEN insufficient_privilege THEN
+        RAISE NOTICE 'Not allowed to create pg_trgm; fuzzy product search is disabled';
+END
+$$;
+
+ANALYZE inventory;
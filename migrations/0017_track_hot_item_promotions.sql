@@ -0,0 +1,7 @@
+-- Automatic hot items: whether the sales workers' lock-wait heuristic, rather
+-- than an operator, gave an item its slots, and when any worker last saw a
+-- purchase of it. Only such items are demoted, and only once no worker has seen
+-- a purchase for the cooldown.
+ALTER TABLE inventory
+    ADD COLUMN IF NOT EXISTS stock_slots_auto BOOLEAN NOT NULL DEFAULT false,
+    ADD COLUMN IF NOT EXISTS stock_slots_busy_at TIMESTAMP;
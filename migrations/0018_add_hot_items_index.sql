@@ -0,0 +1,4 @@
+-- Purchases reload the set of hot items after every promotion or demotion, and
+-- the hot item reviews look them up: a partial index holds just those rows.
+CREATE INDEX IF NOT EXISTS inventory_hot_items_idx
+    ON inventory (id) WHERE stock_slots > 0;
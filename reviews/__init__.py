@@ -1,15 +1,15 @@
+from common.auth import RevocationList
 from .routes import reviews_bp
-from .db import init_reviews_db
 
 
 def init_reviews_service(app):
     """
-    Initializes the reviews service by setting up the database and registering
-    the reviews blueprint with the given Flask application.
+    Initializes the reviews service by registering the reviews blueprint with the
+    given Flask application.
 
-    This function is meant to be called within the Flask app context. It ensures
-    that the necessary database tables are created and prepares the routes
-    for handling review-related API requests.
+    The `reviews` table is created by the schema migrations, so this function only
+    prepares the routes for handling review-related API requests, and gives the
+    app the `RevocationList` its routes check session tokens against.
 
     Args:
         app (Flask): The Flask application instance to register the blueprint with.
@@ -17,6 +17,5 @@ def init_reviews_service(app):
     Returns:
         None
     """
-    with app.app_context():
-        init_reviews_db()
+    app.extensions["token_revocations"] = RevocationList()
     app.register_blueprint(reviews_bp)
@@ -0,0 +1,55 @@
+from .summary import update_rating_summaries
+
+MODERATION_BATCH_MAX = 1000
+
+# Locks the requested reviews in ID order, so concurrent batches cannot
+# deadlock, and returns their approval state before this change.
+MODERATE_SQL = """
+    WITH target AS (
+        SELECT id, is_approved
+        FROM reviews
+        WHERE id = ANY(%(review_ids)s)
+        ORDER BY id
+        FOR UPDATE
+    )
+    UPDATE reviews
+    SET is_approved = %(is_approved)s, moderated_at = CURRENT_TIMESTAMP
+    FROM target
+    WHERE reviews.id = target.id
+    RETURNING reviews.id, reviews.item_id, reviews.rating, reviews.review_date,
+              target.is_approved
+"""
+
+
+def moderate_reviews(cur, review_ids, is_approved):
+    """
+    Approves or rejects a batch of reviews with one UPDATE, and applies the
+    approvals that changed to the items' rating summaries. The caller commits.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        review_ids (list): The IDs of the reviews to moderate.
+        is_approved (bool): True to approve the reviews, False to reject them.
+
+    Returns:
+        dict: The status of every requested ID: ``approved``, ``rejected`` or
+        ``not_found``.
+    """
+    cur.execute(MODERATE_SQL, {"review_ids": list(review_ids), "is_approved": is_approved})
+    rows = cur.fetchall()
+
+    changed = [
+        (item_id, rating, review_date)
+        for _, item_id, rating, review_date, was_approved in rows
+        if bool(was_approved) != is_approved
+    ]
+    if is_approved:
+        update_rating_summaries(cur, added=changed)
+    else:
+        update_rating_summaries(cur, removed=changed)
+
+    status = "approved" if is_approved else "rejected"
+    found = {row[0] for row in rows}
+    return {
+        review_id: status if review_id in found else "not_found" for review_id in review_ids
+    }
@@ -1,15 +1,59 @@
-from flask import Blueprint, request, jsonify
+import hmac
+from datetime import datetime
+from flask import Blueprint, current_app, request, jsonify
+from common.auth import (
+    TokenError,
+    bearer_token,
+    get_revocations,
+    verify_password_cached,
+    verify_token,
+)
 from common.db import get_db
+from common.pagination import decode_cursor, encode_cursor, parse_limit
+from .moderation import MODERATION_BATCH_MAX, moderate_reviews
+from .summary import get_rating_summaries, update_rating_summary
 from psycopg2 import sql
 
 reviews_bp = Blueprint("reviews", __name__)
 
+# Locks the review so that its approval and rating cannot change between reading
+# them and applying the change to the item's rating summary.
+REVIEW_FOR_UPDATE_SQL = """
+    SELECT customer_id, item_id, rating, is_approved, review_date
+    FROM reviews
+    WHERE id = %s
+    FOR UPDATE
+"""
+SUMMARY_MAX_ITEMS = 100
+REVIEWS_PAGE_SIZE = 50
+REVIEWS_MAX_PAGE_SIZE = 500
+
 
 def authenticate_user(request):
     """
-    Authenticates the user by checking the 'username' and 'password' in HTTP headers.
-    Returns the customer_id if valid, otherwise returns None.
+    Authenticates the user of a request and returns their customer_id, or None.
+
+    A session token from `POST /customers/login`, sent as `Authorization: Bearer
+    <token>`, is verified locally: its signature and expiry are checked and its
+    ID is looked up in the worker's in-memory revocation list, so no query is
+    made.
+
+    For older clients, the 'Username' and 'Password' HTTP headers are still
+    accepted and checked against the stored password hash. This costs a query
+    per request, and a password hash the first time the worker sees the
+    credentials (see `common.auth.verify_password_cached`), so clients should
+    log in instead.
     """
+    token = bearer_token(request)
+    if token is not None:
+        try:
+            claims = verify_token(token)
+        except TokenError:
+            return None
+        if get_revocations(current_app).is_revoked(claims["jti"]):
+            return None
+        return claims["sub"]
+
     username = request.headers.get("Username")
     password = request.headers.get("Password")
 
@@ -19,12 +63,19 @@ def authenticate_user(request):
     conn = get_db()
     cur = conn.cursor()
 
-    cur.execute("SELECT id, password FROM customers WHERE username = %s", (username,))
+    cur.execute(
+        "SELECT id, password_hash, password FROM customers WHERE username = %s",
+        (username,),
+    )
     user = cur.fetchone()
 
     cur.close()
 
-    if user and user[1] == password:
+    if not user:
+        return None
+    if user[1] is not None:
+        return user[0] if verify_password_cached(password, user[1]) else None
+    if user[2] is not None and hmac.compare_digest(user[2].encode(), password.encode()):
         return user[0]
     return None
 
@@ -42,11 +93,11 @@ def submit_review():
     Returns:
         A success message with the review ID, or error messages for invalid input.
     """
-    customer_id = authenticate_user(request)
-    if not customer_id:
-        return jsonify({"error": "Unauthorized, invalid username or password"}), 401
-
     try:
+        customer_id = authenticate_user(request)
+        if not customer_id:
+            return jsonify({"error": "Unauthorized, invalid username or password"}), 401
+
         data = request.json
         item_id = data.get("item_id")
         rating = data.get("rating")
@@ -71,11 +122,13 @@ def submit_review():
             """
             INSERT INTO reviews (customer_id, item_id, rating, comment)
             VALUES (%s, %s, %s, %s)
-            RETURNING id
+            RETURNING id, is_approved, review_date
             """,
             (customer_id, item_id, rating, comment),
         )
-        review_id = cur.fetchone()[0]
+        review_id, is_approved, review_date = cur.fetchone()
+        if is_approved:
+            update_rating_summary(cur, item_id, added=(rating, review_date))
         conn.commit()
         cur.close()
 
@@ -101,11 +154,11 @@ def update_review(review_id):
     Returns:
         A success message if the review was updated or an error if the review cannot be updated.
     """
-    customer_id = authenticate_user(request)
-    if not customer_id:
-        return jsonify({"error": "Unauthorized, invalid username or password"}), 401
-
     try:
+        customer_id = authenticate_user(request)
+        if not customer_id:
+            return jsonify({"error": "Unauthorized, invalid username or password"}), 401
+
         data = request.json
         rating = data.get("rating")
         comment = data.get("comment", "")
@@ -122,12 +175,14 @@ def update_review(review_id):
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("SELECT customer_id FROM reviews WHERE id = %s", (review_id,))
+        cur.execute(REVIEW_FOR_UPDATE_SQL, (review_id,))
         review = cur.fetchone()
         if not review:
+            conn.rollback()
             cur.close()
             return jsonify({"error": "Review not found"}), 404
         if review[0] != customer_id:
+            conn.rollback()
             cur.close()
             return jsonify({"error": "Unauthorized action"}), 403
 
@@ -150,6 +205,11 @@ def update_review(review_id):
             """,
             values,
         )
+        _, item_id, old_rating, is_approved, review_date = review
+        if is_approved and rating is not None and rating != old_rating:
+            update_rating_summary(
+                cur, item_id, removed=(old_rating, review_date), added=(rating, review_date)
+            )
         conn.commit()
         cur.close()
 
@@ -166,24 +226,29 @@ def delete_review(review_id):
     Returns:
         A success message if the review was deleted or an error if the review cannot be deleted.
     """
-    customer_id = authenticate_user(request)
-    if not customer_id:
-        return jsonify({"error": "Unauthorized, invalid username or password"}), 401
-
     try:
+        customer_id = authenticate_user(request)
+        if not customer_id:
+            return jsonify({"error": "Unauthorized, invalid username or password"}), 401
+
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("SELECT customer_id FROM reviews WHERE id = %s", (review_id,))
+        cur.execute(REVIEW_FOR_UPDATE_SQL, (review_id,))
         review = cur.fetchone()
         if not review:
+            conn.rollback()
             cur.close()
             return jsonify({"error": "Review not found"}), 404
         if review[0] != customer_id:
+            conn.rollback()
             cur.close()
             return jsonify({"error": "Unauthorized action"}), 403
 
         cur.execute("DELETE FROM reviews WHERE id = %s", (review_id,))
+        _, item_id, rating, is_approved, review_date = review
+        if is_approved:
+            update_rating_summary(cur, item_id, removed=(rating, review_date))
         conn.commit()
         cur.close()
 
@@ -192,56 +257,201 @@ def delete_review(review_id):
         return jsonify({"error": str(e)}), 500
 
 
+# Keyset pagination on (review_date, id), newest first. Both listings are served
+# by an index on (item_id or customer_id, review_date, id) scanned backwards, so
+# every page costs the same however deep it is.
+PRODUCT_REVIEWS_SQL = """
+    SELECT reviews.id, customers.username, reviews.rating, reviews.comment, reviews.review_date
+    FROM reviews
+    JOIN customers ON reviews.customer_id = customers.id
+    WHERE reviews.item_id = %(owner_id)s AND reviews.is_approved = TRUE
+      AND (reviews.review_date, reviews.id) < (%(before_date)s, %(before_id)s)
+      AND (%(rating)s::int IS NULL OR reviews.rating = %(rating)s)
+    ORDER BY reviews.review_date DESC, reviews.id DESC
+    LIMIT %(limit)s
+"""
+
+
+def _review_page_params(args):
+    """
+    Parses the pagination query parameters of the review listings.
+
+    Query parameters:
+    - limit: The page size (default `REVIEWS_PAGE_SIZE`, capped at `REVIEWS_MAX_PAGE_SIZE`).
+    - before: The opaque token from a previous page's `X-Next-Cursor` header.
+    - rating: Only return reviews with this rating, from 1 to 5.
+
+    Returns:
+        tuple: (query parameters without owner_id, page size).
+
+    Raises:
+        ValueError: If a parameter is invalid.
+    """
+    limit = parse_limit(args.get("limit"), REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE)
+    before_date, before_id = "infinity", 2**31 - 1
+    if "before" in args:
+        before_date, before_id = decode_cursor(args["before"])
+        before_date = datetime.fromisoformat(before_date)
+        before_id = int(before_id)
+    rating = args.get("rating", type=int)
+    if "rating" in args and (rating is None or not 1 <= rating <= 5):
+        raise ValueError("rating must be between 1 and 5")
+    params = {
+        "before_date": before_date,
+        "before_id": before_id,
+        "rating": rating,
+        "limit": limit + 1,
+    }
+    return params, limit
+
+
+def _review_page_response(rows, limit, serialize):
+    response = jsonify([serialize(row) for row in rows[:limit]])
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_cursor([last[4].isoformat(), last[0]])
+    return response
+
+
 @reviews_bp.route("/reviews/product/<int:item_id>", methods=["GET"])
 def get_product_reviews(item_id):
     """
-    Retrieves all approved reviews for a specific product.
+    Retrieves the approved reviews for a specific product, newest first, one page at a time.
+
+    Query parameters:
+    - limit: The page size (default `REVIEWS_PAGE_SIZE`, capped at `REVIEWS_MAX_PAGE_SIZE`).
+    - before: The opaque token from a previous page's `X-Next-Cursor` header.
+    - rating: Only return reviews with this rating.
 
     Returns:
-        A list of reviews for the product, or an error if no reviews are found.
+        A list of reviews for the product. When older reviews follow, the
+        `X-Next-Cursor` response header holds the `before` token for the next page.
     """
     try:
+        try:
+            params, limit = _review_page_params(request.args)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid limit, before or rating"}), 400
+        params["owner_id"] = item_id
+
         conn = get_db()
         cur = conn.cursor()
+        cur.execute(PRODUCT_REVIEWS_SQL, params)
+        rows = cur.fetchall()
+        cur.close()
 
-        cur.execute(
-            """
-            SELECT reviews.id, customers.username, reviews.rating, reviews.comment, reviews.review_date
-            FROM reviews
-            JOIN customers ON reviews.customer_id = customers.id
-            WHERE reviews.item_id = %s AND reviews.is_approved = TRUE
-            ORDER BY reviews.review_date DESC
-        """,
-            (item_id,),
+        return (
+            _review_page_response(
+                rows,
+                limit,
+                lambda row: {
+                    "review_id": row[0],
+                    "username": row[1],
+                    "rating": row[2],
+                    "comment": row[3],
+                    "review_date": row[4].isoformat(),
+                },
+            ),
+            200,
         )
-        reviews = cur.fetchall()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@reviews_bp.route("/reviews/product/<int:item_id>/summary", methods=["GET"])
+def get_product_rating_summary(item_id):
+    """
+    Retrieves the rating summary of a product: the number of approved reviews,
+    their average rating, how many gave each rating from 1 to 5, and the date of
+    the latest one. The summary is maintained as reviews change, so this reads
+    one row however many reviews the product has.
+
+    Returns:
+        The product's rating summary, or an error if the product does not exist.
+    """
+    try:
+        conn = get_db()
+        cur = conn.cursor()
+        summaries = get_rating_summaries(cur, [item_id])
+        cur.close()
+
+        if not summaries:
+            return jsonify({"error": "Item not found"}), 404
+
+        return jsonify(summaries[0]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@reviews_bp.route("/reviews/summary", methods=["GET"])
+def get_rating_summaries_for_items():
+    """
+    Retrieves the rating summaries of several products in one query, e.g. for a
+    product listing page.
+
+    Query parameters:
+    - item_ids: A comma-separated list of up to `SUMMARY_MAX_ITEMS` item IDs.
+
+    Returns:
+        A list of rating summaries, ordered by item ID. IDs of products that do not
+        exist are left out.
+    """
+    try:
+        try:
+            item_ids = sorted(
+                {int(item_id) for item_id in request.args.get("item_ids", "").split(",")}
+            )
+        except ValueError:
+            return jsonify({"error": "item_ids must be a comma-separated list of IDs"}), 400
+        if len(item_ids) > SUMMARY_MAX_ITEMS:
+            return (
+                jsonify({"error": f"At most {SUMMARY_MAX_ITEMS} item_ids are allowed"}),
+                400,
+            )
+
+        conn = get_db()
+        cur = conn.cursor()
+        summaries = get_rating_summaries(cur, item_ids)
         cur.close()
 
-        reviews_list = [
-            {
-                "review_id": row[0],
-                "username": row[1],
-                "rating": row[2],
-                "comment": row[3],
-                "review_date": row[4].isoformat(),
-            }
-            for row in reviews
-        ]
-
-        return jsonify(reviews_list), 200
+        return jsonify(summaries), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+CUSTOMER_REVIEWS_SQL = """
+    SELECT reviews.id, inventory.name, reviews.rating, reviews.comment, reviews.review_date, reviews.is_approved
+    FROM reviews
+    JOIN inventory ON reviews.item_id = inventory.id
+    WHERE reviews.customer_id = %(owner_id)s
+      AND (reviews.review_date, reviews.id) < (%(before_date)s, %(before_id)s)
+      AND (%(rating)s::int IS NULL OR reviews.rating = %(rating)s)
+    ORDER BY reviews.review_date DESC, reviews.id DESC
+    LIMIT %(limit)s
+"""
+
+
 @reviews_bp.route("/reviews/customer/<username>", methods=["GET"])
 def get_customer_reviews(username):
     """
-    Lists all reviews submitted by a specific customer.
+    Lists the reviews submitted by a specific customer, newest first, one page at a time.
+
+    Query parameters:
+    - limit: The page size (default `REVIEWS_PAGE_SIZE`, capped at `REVIEWS_MAX_PAGE_SIZE`).
+    - before: The opaque token from a previous page's `X-Next-Cursor` header.
+    - rating: Only return reviews with this rating.
 
     Returns:
-        A list of reviews made by the customer, or an error if no reviews are found.
+        A list of reviews made by the customer, or an error if the customer does not
+        exist. When older reviews follow, the `X-Next-Cursor` response header holds
+        the `before` token for the next page.
     """
     try:
+        try:
+            params, limit = _review_page_params(request.args)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid limit, before or rating"}), 400
+
         conn = get_db()
         cur = conn.cursor()
 
@@ -250,34 +460,27 @@ def get_customer_reviews(username):
         if not customer:
             cur.close()
             return jsonify({"error": "Customer not found"}), 404
-        customer_id = customer[0]
+        params["owner_id"] = customer[0]
 
-        cur.execute(
-            """
-            SELECT reviews.id, inventory.name, reviews.rating, reviews.comment, reviews.review_date, reviews.is_approved
-            FROM reviews
-            JOIN inventory ON reviews.item_id = inventory.id
-            WHERE reviews.customer_id = %s
-            ORDER BY reviews.review_date DESC
-        """,
-            (customer_id,),
-        )
-        reviews = cur.fetchall()
+        cur.execute(CUSTOMER_REVIEWS_SQL, params)
+        rows = cur.fetchall()
         cur.close()
 
-        reviews_list = [
-            {
-                "review_id": row[0],
-                "product_name": row[1],
-                "rating": row[2],
-                "comment": row[3],
-                "review_date": row[4].isoformat(),
-                "is_approved": row[5],
-            }
-            for row in reviews
-        ]
-
-        return jsonify(reviews_list), 200
+        return (
+            _review_page_response(
+                rows,
+                limit,
+                lambda row: {
+                    "review_id": row[0],
+                    "product_name": row[1],
+                    "rating": row[2],
+                    "comment": row[3],
+                    "review_date": row[4].isoformat(),
+                    "is_approved": row[5],
+                },
+            ),
+            200,
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -285,7 +488,8 @@ def get_customer_reviews(username):
 @reviews_bp.route("/reviews/<int:review_id>/moderate", methods=["PATCH"])
 def moderate_review(review_id):
     """
-    Allows administrators to approve or flag reviews.
+    Allows administrators to approve or flag reviews. The review is updated by one
+    statement; see `PATCH /reviews/moderate` to moderate many at once.
 
     The request must include:
     - is_approved: Boolean value indicating whether the review should be approved or flagged.
@@ -299,20 +503,18 @@ def moderate_review(review_id):
 
         if is_approved is None:
             return jsonify({"error": "is_approved is required"}), 400
+        if not isinstance(is_approved, bool):
+            return jsonify({"error": "is_approved must be a boolean"}), 400
 
         conn = get_db()
         cur = conn.cursor()
 
-        cur.execute("SELECT id FROM reviews WHERE id = %s", (review_id,))
-        review = cur.fetchone()
-        if not review:
+        results = moderate_reviews(cur, [review_id], is_approved)
+        if results[review_id] == "not_found":
+            conn.rollback()
             cur.close()
             return jsonify({"error": "Review not found"}), 404
 
-        cur.execute(
-            "UPDATE reviews SET is_approved = %s WHERE id = %s",
-            (is_approved, review_id),
-        )
         conn.commit()
         cur.close()
 
@@ -321,6 +523,137 @@ def moderate_review(review_id):
         return jsonify({"error": str(e)}), 500
 
 
+@reviews_bp.route("/reviews/moderate", methods=["PATCH"])
+def moderate_reviews_in_bulk():
+    """
+    Approves or rejects many reviews at once, e.g. to work through the
+    moderation queue after a campaign.
+
+    The request must include:
+    - review_ids: A list of up to `MODERATION_BATCH_MAX` review IDs.
+    - is_approved: True to approve the reviews, False to reject them.
+
+    All reviews are updated by one statement in one transaction, and the rating
+    summaries of their items are adjusted along with them.
+
+    Returns:
+        The number of reviews updated and the status of every requested ID:
+        approved, rejected or not_found.
+    """
+    try:
+        data = request.json
+        review_ids = data.get("review_ids")
+        is_approved = data.get("is_approved")
+
+        if not isinstance(is_approved, bool):
+            return jsonify({"error": "is_approved must be a boolean"}), 400
+        if (
+            not isinstance(review_ids, list)
+            or not review_ids
+            or not all(
+                isinstance(review_id, int) and not isinstance(review_id, bool)
+                for review_id in review_ids
+            )
+        ):
+            return jsonify({"error": "review_ids must be a non-empty list of IDs"}), 400
+        review_ids = list(dict.fromkeys(review_ids))
+        if len(review_ids) > MODERATION_BATCH_MAX:
+            return (
+                jsonify({"error": f"At most {MODERATION_BATCH_MAX} review_ids are allowed"}),
+                400,
+            )
+
+        conn = get_db()
+        cur = conn.cursor()
+        results = moderate_reviews(cur, review_ids, is_approved)
+        conn.commit()
+        cur.close()
+
+        return (
+            jsonify(
+                {
+                    "updated": sum(status != "not_found" for status in results.values()),
+                    "results": [
+                        {"review_id": review_id, "status": status}
+                        for review_id, status in results.items()
+                    ],
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+PENDING_REVIEWS_SQL = """
+    SELECT reviews.id, reviews.item_id, customers.username, reviews.rating, reviews.comment,
+           reviews.review_date
+    FROM reviews
+    JOIN customers ON reviews.customer_id = customers.id
+    WHERE reviews.is_approved = FALSE AND reviews.moderated_at IS NULL
+      AND (reviews.review_date, reviews.id) > (%(after_date)s, %(after_id)s)
+    ORDER BY reviews.review_date, reviews.id
+    LIMIT %(limit)s
+"""
+
+
+@reviews_bp.route("/reviews/pending", methods=["GET"])
+def get_pending_reviews():
+    """
+    Lists the reviews awaiting moderation, oldest first, one page at a time.
+    Reviews leave the queue once they are approved or rejected.
+
+    Query parameters:
+    - limit: The page size (default `REVIEWS_PAGE_SIZE`, capped at `REVIEWS_MAX_PAGE_SIZE`).
+    - after: The opaque token from a previous page's `X-Next-Cursor` header.
+
+    Returns:
+        A list of pending reviews. When more follow, the `X-Next-Cursor` response
+        header holds the `after` token for the next page.
+    """
+    try:
+        try:
+            limit = parse_limit(
+                request.args.get("limit"), REVIEWS_PAGE_SIZE, REVIEWS_MAX_PAGE_SIZE
+            )
+            after_date, after_id = "-infinity", 0
+            if "after" in request.args:
+                after_date, after_id = decode_cursor(request.args["after"])
+                after_date = datetime.fromisoformat(after_date)
+                after_id = int(after_id)
+        except (ValueError, TypeError):
+            return jsonify({"error": "Invalid limit or after"}), 400
+
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute(
+            PENDING_REVIEWS_SQL,
+            {"after_date": after_date, "after_id": after_id, "limit": limit + 1},
+        )
+        rows = cur.fetchall()
+        cur.close()
+
+        response = jsonify(
+            [
+                {
+                    "review_id": row[0],
+                    "item_id": row[1],
+                    "username": row[2],
+                    "rating": row[3],
+                    "comment": row[4],
+                    "review_date": row[5].isoformat(),
+                }
+                for row in rows[:limit]
+            ]
+        )
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            response.headers["X-Next-Cursor"] = encode_cursor([last[5].isoformat(), last[0]])
+        return response, 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @reviews_bp.route("/reviews/<int:review_id>", methods=["GET"])
 def get_review_details(review_id):
     """
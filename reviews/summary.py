@@ -0,0 +1,201 @@
+# Applies a batch of (item_id, rating, sign, review_date) changes, aggregated
+# per item, with one relative upsert.
+RATING_DELTA_SQL = """
+    INSERT INTO rating_summary AS summary (
+        item_id, review_count, rating_sum,
+        rating_1, rating_2, rating_3, rating_4, rating_5, last_review_date
+    )
+    SELECT item_id,
+           sum(sign),
+           sum(sign * rating),
+           COALESCE(sum(sign) FILTER (WHERE rating = 1), 0),
+           COALESCE(sum(sign) FILTER (WHERE rating = 2), 0),
+           COALESCE(sum(sign) FILTER (WHERE rating = 3), 0),
+           COALESCE(sum(sign) FILTER (WHERE rating = 4), 0),
+           COALESCE(sum(sign) FILTER (WHERE rating = 5), 0),
+           max(review_date) FILTER (WHERE sign > 0)
+    FROM unnest(%(item_ids)s::int[], %(ratings)s::int[], %(signs)s::int[], %(review_dates)s::timestamp[])
+        AS change (item_id, rating, sign, review_date)
+    GROUP BY item_id
+    ORDER BY item_id
+    ON CONFLICT (item_id) DO UPDATE SET
+        review_count = summary.review_count + EXCLUDED.review_count,
+        rating_sum = summary.rating_sum + EXCLUDED.rating_sum,
+        rating_1 = summary.rating_1 + EXCLUDED.rating_1,
+        rating_2 = summary.rating_2 + EXCLUDED.rating_2,
+        rating_3 = summary.rating_3 + EXCLUDED.rating_3,
+        rating_4 = summary.rating_4 + EXCLUDED.rating_4,
+        rating_5 = summary.rating_5 + EXCLUDED.rating_5,
+        last_review_date = GREATEST(summary.last_review_date, EXCLUDED.last_review_date)
+"""
+
+# Only run for items whose latest approved review may have been removed; served
+# by the partial reviews (item_id, review_date, id) WHERE is_approved index.
+LAST_REVIEW_DATE_SQL = """
+    UPDATE rating_summary
+    SET last_review_date = (
+        SELECT max(review_date)
+        FROM reviews
+        WHERE reviews.item_id = rating_summary.item_id AND is_approved
+    )
+    WHERE item_id = ANY(%(item_ids)s)
+"""
+
+SUMMARIES_SQL = """
+    SELECT inventory.id,
+           COALESCE(summary.review_count, 0),
+           COALESCE(summary.rating_sum, 0),
+           COALESCE(summary.rating_1, 0),
+           COALESCE(summary.rating_2, 0),
+           COALESCE(summary.rating_3, 0),
+           COALESCE(summary.rating_4, 0),
+           COALESCE(summary.rating_5, 0),
+           summary.last_review_date
+    FROM inventory
+    LEFT JOIN rating_summary AS summary ON summary.item_id = inventory.id
+    WHERE inventory.id = ANY(%s)
+    ORDER BY inventory.id
+"""
+
+REBUILD_SQL = """
+    INSERT INTO rating_summary AS summary (
+        item_id, review_count, rating_sum,
+        rating_1, rating_2, rating_3, rating_4, rating_5, last_review_date
+    )
+    SELECT inventory.id,
+           count(reviews.id),
+           COALESCE(sum(reviews.rating), 0),
+           count(*) FILTER (WHERE reviews.rating = 1),
+           count(*) FILTER (WHERE reviews.rating = 2),
+           count(*) FILTER (WHERE reviews.rating = 3),
+           count(*) FILTER (WHERE reviews.rating = 4),
+           count(*) FILTER (WHERE reviews.rating = 5),
+           max(reviews.review_date)
+    FROM inventory
+    LEFT JOIN reviews ON reviews.item_id = inventory.id AND reviews.is_approved
+    GROUP BY inventory.id
+    ON CONFLICT (item_id) DO UPDATE SET
+        review_count = EXCLUDED.review_count,
+        rating_sum = EXCLUDED.rating_sum,
+        rating_1 = EXCLUDED.rating_1,
+        rating_2 = EXCLUDED.rating_2,
+        rating_3 = EXCLUDED.rating_3,
+        rating_4 = EXCLUDED.rating_4,
+        rating_5 = EXCLUDED.rating_5,
+        last_review_date = EXCLUDED.last_review_date
+"""
+
+
+def update_rating_summary(cur, item_id, removed=None, added=None):
+    """
+    Applies a change to an item's approved reviews to its rating summary.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        item_id (int): The reviewed item's ID.
+        removed (tuple, optional): (rating, review_date) of an approved review that
+            no longer counts: deleted, rejected or about to be re-rated.
+        added (tuple, optional): (rating, review_date) of an approved review that
+            now counts.
+    """
+    update_rating_summaries(
+        cur,
+        removed=[(item_id,) + removed] if removed is not None else (),
+        added=[(item_id,) + added] if added is not None else (),
+    )
+
+
+def update_rating_summaries(cur, removed=(), added=()):
+    """
+    Applies changes to approved reviews, of any number of items, to their rating
+    summaries.
+
+    The counts are adjusted in place by one upsert, so concurrent changes to the
+    same item are serialized on its summary row and none is lost. Call it in the
+    transaction that changes the reviews, with the review rows locked, and let the
+    caller commit.
+
+    Args:
+        cur (cursor): A cursor of the transaction to run in.
+        removed (list): (item_id, rating, review_date) of approved reviews that no
+            longer count: deleted, rejected or about to be re-rated.
+        added (list): (item_id, rating, review_date) of approved reviews that now count.
+    """
+    changes = [review + (-1,) for review in removed] + [review + (1,) for review in added]
+    if not changes:
+        return
+
+    cur.execute(
+        RATING_DELTA_SQL,
+        {
+            "item_ids": [change[0] for change in changes],
+            "ratings": [change[1] for change in changes],
+            "review_dates": [change[2] for change in changes],
+            "signs": [change[3] for change in changes],
+        },
+    )
+
+    latest_added = {}
+    for item_id, _, review_date in added:
+        if item_id not in latest_added or review_date > latest_added[item_id]:
+            latest_added[item_id] = review_date
+    stale = sorted(
+        {
+            item_id
+            for item_id, _, review_date in removed
+            if item_id not in latest_added or latest_added[item_id] < review_date
+        }
+    )
+    if stale:
+        cur.execute(LAST_REVIEW_DATE_SQL, {"item_ids": stale})
+
+
+def get_rating_summaries(cur, item_ids):
+    """
+    Reads the rating summaries of several items in one query.
+
+    Args:
+        cur (cursor): A database cursor.
+        item_ids (list): The item IDs.
+
+    Returns:
+        list: One summary dictionary per existing item, ordered by item ID. Items
+        without approved reviews have a review_count of 0 and no average.
+    """
+    cur.execute(SUMMARIES_SQL, (list(item_ids),))
+    return [_summary(row) for row in cur.fetchall()]
+
+
+def rebuild_rating_summaries(conn):
+    """
+    Recomputes every item's rating summary from its approved reviews, e.g. after
+    reviews were changed outside the review routes.
+
+    Args:
+        conn (connection): A database connection.
+
+    Returns:
+        int: The number of summaries written.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(REBUILD_SQL)
+        written = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return written
+
+
+def _summary(row):
+    count, total = row[1], row[2]
+    return {
+        "item_id": row[0],
+        "review_count": count,
+        "average_rating": round(total / count, 2) if count else None,
+        "histogram": {str(rating): row[2 + rating] for rating in range(1, 6)},
+        "last_review_date": row[8].isoformat() if row[8] else None,
+    }
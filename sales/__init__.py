@@ -1,12 +1,22 @@
 from .routes import sales_bp
-from .db import init_sales_db
+from .catalog import CatalogReplica, SALES_CATALOG_REPLICA
+from .hot_items import HotItems
+from .suggest import SALES_SUGGEST_INDEX, SuggestIndex
 
 
 def init_sales_service(app):
     """
-    Initializes the sales service for the application by setting up the database
-    and registering the sales blueprint with the app.
+    Initializes the sales service for the application by registering the sales
+    blueprint with the app. The `sales` table is created by the schema migrations.
+
+    Unless SALES_CATALOG_REPLICA is set to "0", the app also gets an in-memory
+    `CatalogReplica` that serves the goods listing and detail endpoints. A
+    `HotItems` tracker routes purchases of hot items to their stock slots. Unless
+    SALES_SUGGEST_INDEX is "0", a `SuggestIndex` serves the type-ahead suggestions.
     """
-    with app.app_context():
-        init_sales_db()
+    if SALES_CATALOG_REPLICA:
+        app.extensions["sales_catalog"] = CatalogReplica()
+    if SALES_SUGGEST_INDEX:
+        app.extensions["sales_suggest"] = SuggestIndex()
+    app.extensions["sales_hot_items"] = HotItems()
     app.register_blueprint(sales_bp)
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+
+from common.db import get_db
+from common.money import format_cents
+from common.notify import INVENTORY_CHANNEL, last_heartbeat, subscribe
+from common.stock_slots import AVAILABLE_STOCK_SQL
+
+SALES_CATALOG_REPLICA = os.environ.get("SALES_CATALOG_REPLICA", "1") == "1"
+SALES_CATALOG_MAX_STALENESS = float(os.environ.get("SALES_CATALOG_MAX_STALENESS", "5"))
+
+_CATALOG_COLUMNS = f"id, name, category, price_per_item_cents, description, {AVAILABLE_STOCK_SQL}"
+
+
+class CatalogReplica:
+    """
+    An in-memory copy of the inventory catalog that serves the sales read endpoints.
+
+    Items are kept as compact tuples keyed by ID. Inventory writes announce the
+    changed IDs on `INVENTORY_CHANNEL` (see `common.notify`); the replica marks
+    them dirty and reloads just those rows, in one query, on the next read. While
+    no change is pending a read never touches the database.
+
+    If the notification listener is down for longer than `max_staleness` seconds,
+    changes may have been missed, so the whole catalog is reloaded at most once
+    per `max_staleness` seconds until the listener recovers.
+
+    Args:
+        max_staleness (float): Upper bound, in seconds, on how out of date the
+            replica may be when notifications cannot be received.
+    """
+
+    def __init__(self, max_staleness=SALES_CATALOG_MAX_STALENESS):
+        self.max_staleness = max_staleness
+        self._items = {}
+        self._available = None
+        self._dirty = set()
+        self._reload_all = True
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._subscribed = False
+
+        self.hits = 0
+        self.misses = 0
+        self.full_reloads = 0
+
+    def get(self, item_id):
+        """
+        Returns the details of a single item.
+
+        Args:
+            item_id (int): The ID of the item.
+
+        Returns:
+            dict: The item's details, or None if it does not exist.
+        """
+        self._sync()
+        row = self._items.get(item_id)
+        if row is None:
+            return None
+        return {
+            "id": item_id,
+            "name": row[0],
+            "category": row[1],
+            "price_per_item": format_cents(row[2]),
+            "description": row[3],
+            "count_in_stock": row[4],
+        }
+
+    def available_goods(self):
+        """
+        Returns the ID, name and price of every item that is in stock, ordered by ID.
+
+        Returns:
+            list: A list of dictionaries, one per available item.
+        """
+        self._sync()
+        with self._lock:
+            if self._available is None:
+                items = self._items
+                self._available = [
+                    {
+                        "id": item_id,
+                        "name": items[item_id][0],
+                        "price_per_item": format_cents(items[item_id][2]),
+                    }
+                    for item_id in sorted(items)
+                    if items[item_id][4] > 0
+                ]
+            return self._available
+
+    def invalidate(self, item_ids=None):
+        """
+        Marks items as changed so they are reloaded on the next read.
+
+        Args:
+            item_ids (list, optional): The changed item IDs. None reloads everything.
+        """
+        with self._lock:
+            if item_ids is None:
+                self._reload_all = True
+            else:
+                self._dirty.update(item_ids)
+
+    def stats(self):
+        """
+        Returns the replica's counters.
+
+        Returns:
+            dict: The number of cached items, read hits and misses, and full reloads.
+        """
+        return {
+            "items": len(self._items),
+            "hits": self.hits,
+            "misses": self.misses,
+            "full_reloads": self.full_reloads,
+        }
+
+    def _sync(self):
+        if not self._subscribed:
+            self._subscribed = True
+            subscribe(INVENTORY_CHANNEL, self.invalidate)
+
+        now = time.monotonic()
+        heartbeat = last_heartbeat()
+        if (heartbeat is None or now - heartbeat > self.max_staleness) and (
+            self._synced_at is None or now - self._synced_at > self.max_staleness
+        ):
+            self.invalidate()
+
+        if not self._reload_all and not self._dirty:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        with self._load_lock:
+            with self._lock:
+                reload_all, self._reload_all = self._reload_all, False
+                dirty, self._dirty = self._dirty, set()
+
+            try:
+                if reload_all:
+                    self._load_all()
+                elif dirty:
+                    self._load(dirty)
+            except Exception:
+                self.invalidate(None if reload_all else dirty)
+                raise
+
+    def _load_all(self):
+        cur = get_db().cursor()
+        cur.execute(f"SELECT {_CATALOG_COLUMNS} FROM inventory")
+        items = {row[0]: _compact(row) for row in cur.fetchall()}
+        cur.close()
+        with self._lock:
+            self._items = items
+            self._available = None
+        self._synced_at = time.monotonic()
+        self.full_reloads += 1
+
+    def _load(self, item_ids):
+        cur = get_db().cursor()
+        cur.execute(
+            f"SELECT {_CATALOG_COLUMNS} FROM inventory WHERE id = ANY(%s)",
+            (list(item_ids),),
+        )
+        rows = {row[0]: _compact(row) for row in cur.fetchall()}
+        cur.close()
+
+        with self._lock:
+            for item_id in item_ids:
+                if item_id in rows:
+                    self._items[item_id] = rows[item_id]
+                else:
+                    self._items.pop(item_id, None)
+            self._available = None
+
+
+def _compact(row):
+    return (row[1], row[2], row[3], row[4], row[5])
+
+
+def get_catalog(app):
+    """
+    Returns the catalog replica of the given app, or None if the replica is disabled.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        CatalogReplica: The app's catalog replica.
+    """
+    return app.extensions.get("sales_catalog")
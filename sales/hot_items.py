@@ -0,0 +1,256 @@
+import logging
+import os
+import threading
+import time
+
+from common.db import get_db
+from common.notify import last_heartbeat, subscribe
+from common.stock_slots import (
+    HOT_ITEMS_CHANNEL,
+    get_hot_items,
+    get_idle_hot_items,
+    mark_hot_items_busy,
+    rebalance_stock_slots,
+    set_stock_slots,
+)
+
+logger = logging.getLogger(__name__)
+
+HOT_ITEM_SLOTS = int(os.environ.get("HOT_ITEM_SLOTS", "8"))
+HOT_ITEM_WINDOW = float(os.environ.get("HOT_ITEM_WINDOW", "0"))
+HOT_ITEM_WAIT_MS = float(os.environ.get("HOT_ITEM_WAIT_MS", "20"))
+HOT_ITEM_PROMOTE_WAITS = int(os.environ.get("HOT_ITEM_PROMOTE_WAITS", "20"))
+HOT_ITEM_COOLDOWN = float(os.environ.get("HOT_ITEM_COOLDOWN", "300"))
+HOT_ITEM_MAX_STALENESS = float(os.environ.get("HOT_ITEM_MAX_STALENESS", "5"))
+
+
+class HotItems:
+    """
+    Tracks which items are hot, i.e. have their stock split across counter slots
+    (see `common.stock_slots`), and decides which items should be.
+
+    The set of hot items is loaded on first use and reloaded after an item is
+    promoted or demoted anywhere, as announced on `HOT_ITEMS_CHANNEL`; if the
+    notification listener is down it is reloaded at most once per `max_staleness`
+    seconds. A purchase of an item missing from a stale set still succeeds, it
+    just takes the slower path.
+
+    Every purchase reports how long its statement took. An uncontended purchase
+    updates one row by its primary key and takes a millisecond or two, so one
+    that took longer than `wait_ms` was almost certainly queued behind other
+    purchases' row locks and is counted as a lock wait. The statement time is
+    used rather than ``pg_locks`` because it costs nothing to measure. It cannot
+    tell a lock wait from a slow database, though: when every statement is slow,
+    the most bought items are promoted even without contention, which only costs
+    their reads a sum over the slots. `wait_ms` should therefore stay above the
+    uncontended purchase latency, as reported by the
+    ``ecommerce_db_query_duration_seconds`` histogram.
+
+    Unless `window` is 0, a daemon thread reviews the counts every `window`
+    seconds: an item with at least `promote_waits` lock waits in a window is
+    promoted to `slots` slots. Each review also records on the item rows which
+    automatically promoted items this process saw purchases of, and demotes
+    those that no process has seen a purchase of for `cooldown` seconds. Items
+    an operator promoted with ``PUT /inventory/<id>/slots`` are left alone. The
+    thread also re-spreads hot items whose stock has become uneven. Each
+    process runs its own; promotion and demotion are idempotent.
+
+    Args:
+        window (float): Seconds between reviews. 0 disables automatic promotion.
+        slots (int): The number of slots a promoted item gets.
+        wait_ms (float): Statement time, in milliseconds, counted as a lock wait.
+        promote_waits (int): Lock waits in one window that promote an item.
+        cooldown (float): Seconds without a purchase after which an automatically
+            promoted item is demoted.
+        max_staleness (float): Upper bound, in seconds, on how out of date the
+            hot item set may be when notifications cannot be received.
+    """
+
+    def __init__(
+        self,
+        window=HOT_ITEM_WINDOW,
+        slots=HOT_ITEM_SLOTS,
+        wait_ms=HOT_ITEM_WAIT_MS,
+        promote_waits=HOT_ITEM_PROMOTE_WAITS,
+        cooldown=HOT_ITEM_COOLDOWN,
+        max_staleness=HOT_ITEM_MAX_STALENESS,
+    ):
+        self.window = window
+        self.slots = slots
+        self.wait_ms = wait_ms
+        self.promote_waits = promote_waits
+        self.cooldown = cooldown
+        self.max_staleness = max_staleness
+        self._hot = frozenset()
+        self._stale = True
+        self._synced_at = None
+        self._subscribed = False
+        self._counts = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+
+        self.promotions = 0
+        self.demotions = 0
+
+    def is_hot(self, item_id):
+        """
+        Args:
+            item_id (int): The item's ID.
+
+        Returns:
+            bool: True if the item's stock is split across slots.
+        """
+        self._sync()
+        return item_id in self._hot
+
+    def record(self, item_id, elapsed):
+        """
+        Records a purchase of an item and how long its statement took.
+
+        Args:
+            item_id (int): The item's ID.
+            elapsed (float): The statement's duration in seconds.
+        """
+        waited = elapsed * 1000 > self.wait_ms
+        with self._lock:
+            counts = self._counts.get(item_id)
+            if counts is None:
+                counts = self._counts[item_id] = [0, 0]
+            counts[0] += 1
+            counts[1] += waited
+        self._ensure_reviewer()
+
+    def invalidate(self, item_ids=None):
+        """
+        Marks the hot item set to be reloaded on the next check.
+        """
+        self._stale = True
+
+    def review(self, conn):
+        """
+        Promotes, demotes and rebalances items based on the purchases recorded
+        since the last review.
+
+        Args:
+            conn (connection): A database connection.
+        """
+        with self._lock:
+            counts, self._counts = self._counts, {}
+
+        cur = conn.cursor()
+        try:
+            hot = get_hot_items(cur)
+            conn.rollback()
+        finally:
+            cur.close()
+
+        for item_id, (purchases, waits) in sorted(counts.items()):
+            if waits >= self.promote_waits and item_id not in hot:
+                if set_stock_slots(conn, item_id, self.slots, auto=True) is not None:
+                    self.promotions += 1
+                    hot.add(item_id)
+                    logger.info("Promoted item %d to %d stock slots", item_id, self.slots)
+
+        purchased = [item_id for item_id in counts if item_id in hot]
+        if purchased:
+            mark_hot_items_busy(conn, purchased)
+
+        cur = conn.cursor()
+        try:
+            idle = get_idle_hot_items(cur, self.cooldown)
+            conn.rollback()
+        finally:
+            cur.close()
+        for item_id in idle:
+            if item_id in counts:
+                continue
+            if set_stock_slots(conn, item_id, 0, idle_for=self.cooldown) is not None:
+                self.demotions += 1
+                logger.info("Demoted item %d to a regular item", item_id)
+
+        rebalance_stock_slots(conn)
+
+    def stats(self):
+        """
+        Returns the tracker's counters.
+
+        Returns:
+            dict: The number of hot items, and of promotions and demotions made
+            by this process.
+        """
+        return {
+            "items": len(self._hot),
+            "promotions": self.promotions,
+            "demotions": self.demotions,
+        }
+
+    def stop(self):
+        """
+        Stops the review thread.
+        """
+        self._stop.set()
+
+    def _sync(self):
+        if not self._subscribed:
+            self._subscribed = True
+            subscribe(HOT_ITEMS_CHANNEL, self.invalidate)
+
+        now = time.monotonic()
+        heartbeat = last_heartbeat()
+        if (heartbeat is None or now - heartbeat > self.max_staleness) and (
+            self._synced_at is None or now - self._synced_at > self.max_staleness
+        ):
+            self._stale = True
+
+        if self._stale:
+            self._stale = False
+            cur = get_db().cursor()
+            try:
+                self._hot = frozenset(get_hot_items(cur))
+            except Exception:
+                self._stale = True
+                raise
+            finally:
+                cur.close()
+            self._synced_at = now
+
+    def _ensure_reviewer(self):
+        if not self.window or (self._thread_pid == os.getpid() and self._thread.is_alive()):
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="hot-items", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        from common.db import get_pool
+
+        stop = self._stop
+        while not stop.wait(self.window):
+            try:
+                pool = get_pool()
+                conn = pool.getconn()
+                try:
+                    self.review(conn)
+                finally:
+                    pool.putconn(conn)
+            except Exception:
+                logger.exception("Reviewing hot items failed")
+
+
+def get_hot_items_tracker(app):
+    """
+    Returns the hot item tracker of the given app.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        HotItems: The app's hot item tracker, or None if the sales service is not loaded.
+    """
+    return app.extensions.get("sales_hot_items")
@@ -1,5 +1,21 @@
-from flask import Blueprint, request, jsonify
+import time
+from flask import Blueprint, current_app, request, jsonify
 from common.db import get_db
+from common.money import format_cents
+from common.notify import notify_inventory_change
+from common.pagination import parse_limit
+from common.stock_slots import AVAILABLE_STOCK_SQL, fold_stock_slots
+from common.streaming import json_list_response
+from .catalog import get_catalog
+from .hot_items import get_hot_items_tracker
+from .suggest import (
+    SUGGEST_MAX_PAGE_SIZE,
+    SUGGEST_PAGE_SIZE,
+    SUGGEST_PREFIX_MAX_LENGTH,
+    SUGGEST_SQL,
+    get_suggest_index,
+    suggest_pattern,
+)
 
 sales_bp = Blueprint("sales", __name__)
 
@@ -9,27 +25,75 @@ def display_available_goods():
     """
     Returns a list of available goods with their name and price.
     Filters out items with zero stock and only includes those with available quantity.
+    Served from the in-memory catalog replica when it is enabled, and streamed from
+    a server-side cursor otherwise.
     """
     try:
+        catalog = get_catalog(current_app)
+        if catalog is not None:
+            return jsonify(catalog.available_goods()), 200
+
         conn = get_db()
-        cur = conn.cursor()
 
-        cur.execute(
-            """
-            SELECT id, name, price_per_item
-            FROM inventory
-            WHERE count_in_stock > 0
-        """
+        return (
+            json_list_response(
+                conn,
+                f"""
+                SELECT id, name, price_per_item_cents
+                FROM inventory
+                WHERE count_in_stock > 0 OR (stock_slots > 0 AND {AVAILABLE_STOCK_SQL} > 0)
+            """,
+                (),
+                lambda row: {"id": row[0], "name": row[1], "price_per_item": format_cents(row[2])},
+            ),
+            200,
         )
-        goods = cur.fetchall()
-        cur.close()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        goods_list = [
-            {"id": row[0], "name": row[1], "price_per_item": float(row[2])}
-            for row in goods
-        ]
 
-        return jsonify(goods_list), 200
+@sales_bp.route("/sales/goods/suggest", methods=["GET"])
+def suggest_goods():
+    """
+    Returns type-ahead suggestions: the items with a name, or a word in their name,
+    starting with the `prefix` query parameter, with their category and whether
+    they are in stock. At most `limit` items are returned (default
+    `SUGGEST_PAGE_SIZE`, capped at `SUGGEST_MAX_PAGE_SIZE`).
+    Served from the in-memory suggestion index when it is enabled.
+    """
+    try:
+        prefix = request.args.get("prefix", "")
+        if not prefix.strip() or len(prefix) > SUGGEST_PREFIX_MAX_LENGTH:
+            return (
+                jsonify(
+                    {"error": f"prefix must be 1 to {SUGGEST_PREFIX_MAX_LENGTH} characters long"}
+                ),
+                400,
+            )
+        try:
+            limit = parse_limit(request.args.get("limit"), SUGGEST_PAGE_SIZE, SUGGEST_MAX_PAGE_SIZE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        index = get_suggest_index(current_app)
+        if index is not None:
+            return jsonify(index.suggest(prefix, limit)), 200
+
+        conn = get_db()
+        cur = conn.cursor()
+        cur.execute(SUGGEST_SQL, {"pattern": suggest_pattern(prefix), "limit": limit})
+        rows = cur.fetchall()
+        cur.close()
+
+        return (
+            jsonify(
+                [
+                    {"id": row[0], "name": row[1], "category": row[2], "in_stock": row[3]}
+                    for row in rows
+                ]
+            ),
+            200,
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -39,14 +103,22 @@ def get_good_details(item_id):
     """
     Returns full information related to a specific good by item_id.
     Retrieves details including the name, category, price, description, and stock count.
+    Served from the in-memory catalog replica when it is enabled.
     """
     try:
+        catalog = get_catalog(current_app)
+        if catalog is not None:
+            item = catalog.get(item_id)
+            if item is None:
+                return jsonify({"error": "Item not found"}), 404
+            return jsonify(item), 200
+
         conn = get_db()
         cur = conn.cursor()
 
         cur.execute(
-            """
-            SELECT id, name, category, price_per_item, description, count_in_stock
+            f"""
+            SELECT id, name, category, price_per_item_cents, description, {AVAILABLE_STOCK_SQL}
             FROM inventory
             WHERE id = %s
         """,
@@ -62,7 +134,7 @@ def get_good_details(item_id):
             "id": row[0],
             "name": row[1],
             "category": row[2],
-            "price_per_item": float(row[3]),
+            "price_per_item": format_cents(row[3]),
             "description": row[4],
             "count_in_stock": row[5],
         }
@@ -72,11 +144,144 @@ def get_good_details(item_id):
         return jsonify({"error": str(e)}), 500
 
 
+def validate_purchase(username, item_id, quantity):
+    """
+    Validates a purchase request for a single item.
+
+    Args:
+        username (str): The buying customer's username.
+        item_id (int): The ID of the item being bought.
+        quantity (int): The number of units being bought.
+
+    Returns:
+        str: An error message if the request is invalid, otherwise None.
+    """
+    if not username or not item_id or not quantity:
+        return "username, item_id, and quantity are required"
+
+    if quantity <= 0:
+        return "Quantity must be positive"
+
+    return None
+
+
+# Debits the wallet and records the sale and its ledger entry, once the `buyer`
+# and `stock` steps of a purchase statement have succeeded.
+_SETTLE_PURCHASE_SQL = """
+    debit AS (
+        UPDATE customers
+        SET wallet_balance_cents = customers.wallet_balance_cents - stock.total_cents
+        FROM buyer, stock
+        WHERE customers.id = buyer.id
+        RETURNING customers.id
+    ),
+    sale AS (
+        INSERT INTO sales (customer_id, item_id, quantity)
+        SELECT debit.id, stock.id, %(quantity)s
+        FROM debit, stock
+        RETURNING id
+    ),
+    entry AS (
+        INSERT INTO wallet_ledger (customer_id, amount_cents, kind, reference_id)
+        SELECT debit.id, -stock.total_cents, 'purchase', sale.id
+        FROM debit, stock, sale
+    )
+    SELECT (SELECT id FROM buyer), (SELECT id FROM sale)
+"""
+
+PURCHASE_SQL = (
+    """
+    WITH buyer AS (
+        SELECT id, wallet_balance_cents
+        FROM customers
+        WHERE username = %(username)s
+        FOR UPDATE
+    ),
+    stock AS (
+        UPDATE inventory
+        SET count_in_stock = inventory.count_in_stock - %(quantity)s
+        FROM buyer
+        WHERE inventory.id = %(item_id)s
+          AND inventory.count_in_stock >= %(quantity)s
+          AND buyer.wallet_balance_cents >= inventory.price_per_item_cents * %(quantity)s
+        RETURNING inventory.id, inventory.price_per_item_cents * %(quantity)s AS total_cents
+    ),
+"""
+    + _SETTLE_PURCHASE_SQL
+)
+
+# The purchase statement for a hot item: the stock is taken from one randomly
+# chosen slot that has enough, and the item row is only read, so concurrent
+# purchases of the item mostly lock different rows.
+_SLOT_PURCHASE_SQL = (
+    """
+    WITH buyer AS (
+        SELECT id, wallet_balance_cents
+        FROM customers
+        WHERE username = %(username)s
+        FOR UPDATE
+    ),
+    item AS (
+        SELECT inventory.id, inventory.price_per_item_cents * %(quantity)s AS total_cents
+        FROM inventory, buyer
+        WHERE inventory.id = %(item_id)s
+          AND buyer.wallet_balance_cents >= inventory.price_per_item_cents * %(quantity)s
+    ),
+    slot AS (
+        SELECT item_id, slot
+        FROM inventory_stock_slots
+        WHERE item_id = (SELECT id FROM item) AND count_in_stock >= %(quantity)s
+        ORDER BY {order}
+        LIMIT 1
+        {lock}
+    ),
+    stock AS (
+        UPDATE inventory_stock_slots
+        SET count_in_stock = inventory_stock_slots.count_in_stock - %(quantity)s
+        FROM slot, item
+        WHERE inventory_stock_slots.item_id = slot.item_id
+          AND inventory_stock_slots.slot = slot.slot
+          AND inventory_stock_slots.count_in_stock >= %(quantity)s
+        RETURNING item.id, item.total_cents
+    ),
+"""
+    + _SETTLE_PURCHASE_SQL
+)
+
+# A free slot first; if every slot with stock is busy, queue for one of them.
+# The queueing variant takes the slots in order: a slot it waited for and then
+# found too small stays locked, and locking the next one in random order could
+# deadlock with another queued purchase or a fold.
+SLOT_PURCHASE_SQL = (
+    _SLOT_PURCHASE_SQL.format(order="random()", lock="FOR UPDATE SKIP LOCKED"),
+    _SLOT_PURCHASE_SQL.format(order="slot", lock="FOR UPDATE"),
+)
+
+ITEM_STOCK_SQL = f"""
+    SELECT {AVAILABLE_STOCK_SQL}, count_in_stock
+    FROM inventory
+    WHERE id = %s
+"""
+
+
 @sales_bp.route("/sales/purchase", methods=["POST"])
 def make_purchase():
     """
     Processes a sale where a customer purchases an item.
     Checks for sufficient stock, customer funds, and updates both wallet and inventory accordingly.
+
+    The whole purchase runs as a single statement (`PURCHASE_SQL`): the customer row is
+    locked, the stock is decremented with a conditional UPDATE that also checks the
+    wallet, the wallet is debited and the sale and its wallet ledger entry are
+    recorded, all in one round trip.
+    Concurrent purchases of the same item therefore can never oversell or overdraw.
+    Only a failed purchase issues a second query, to report why it failed.
+
+    For a hot item (see `sales.hot_items`) the stock is taken from one of the
+    item's counter slots instead (`SLOT_PURCHASE_SQL`). If the stock is there but
+    the statement could not reach it, e.g. every slot is too small, the slots
+    are folded back onto the item row and the purchase is retried with
+    `PURCHASE_SQL`. Each purchase's duration is reported to the hot item tracker.
     """
     try:
         data = request.json
@@ -85,83 +290,236 @@ def make_purchase():
         item_id = data.get("item_id")
         quantity = data.get("quantity")
 
-        if not username or not item_id or not quantity:
-            return (
-                jsonify({"error": "username, item_id, and quantity are required"}),
-                400,
-            )
+        error = validate_purchase(username, item_id, quantity)
+        if error:
+            return jsonify({"error": error}), 400
 
-        if quantity <= 0:
-            return jsonify({"error": "Quantity must be positive"}), 400
+        conn = get_db()
+        cur = conn.cursor()
+        params = {"username": username, "item_id": item_id, "quantity": quantity}
+
+        hot_items = get_hot_items_tracker(current_app)
+        hot = hot_items is not None and hot_items.is_hot(item_id)
+        started = time.perf_counter()
+        for statement in SLOT_PURCHASE_SQL if hot else (PURCHASE_SQL,):
+            cur.execute(statement, params)
+            customer_id, sale_id = cur.fetchone()
+            if sale_id is not None or customer_id is None:
+                break
+            conn.rollback()
+        if hot_items is not None:
+            hot_items.record(item_id, time.perf_counter() - started)
+
+        item = None
+        if sale_id is None and customer_id is not None:
+            conn.rollback()
+            cur.execute(ITEM_STOCK_SQL, (item_id,))
+            item = cur.fetchone()
+            if item is not None and item[0] >= quantity and (hot or item[1] < quantity):
+                # The customer is locked first, as in every purchase statement.
+                cur.execute(
+                    "SELECT id FROM customers WHERE username = %s FOR UPDATE", (username,)
+                )
+                if item[1] < quantity:
+                    fold_stock_slots(cur, [item_id])
+                cur.execute(PURCHASE_SQL, params)
+                customer_id, sale_id = cur.fetchone()
+                if sale_id is None:
+                    conn.rollback()
+                    cur.execute(ITEM_STOCK_SQL, (item_id,))
+                    item = cur.fetchone()
+
+        if sale_id is None:
+            conn.rollback()
+            cur.close()
+            if customer_id is None:
+                return jsonify({"error": "Customer not found"}), 404
+            if not item:
+                return jsonify({"error": "Item not found"}), 404
+            if item[0] < quantity:
+                return jsonify({"error": "Not enough stock available"}), 400
+            return jsonify({"error": "Insufficient funds"}), 400
+
+        notify_inventory_change(cur, [item_id])
+        conn.commit()
+        cur.close()
+
+        return jsonify({"message": "Purchase successful"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+CHECKOUT_SQL = """
+    WITH lines AS (
+        SELECT *
+        FROM unnest(%(item_ids)s::int[], %(quantities)s::int[]) AS line(item_id, quantity)
+    ),
+    priced AS (
+        SELECT sum(inventory.price_per_item_cents * lines.quantity)::bigint AS total_cents
+        FROM lines
+        JOIN inventory ON inventory.id = lines.item_id
+    ),
+    debit AS (
+        UPDATE customers
+        SET wallet_balance_cents = wallet_balance_cents - priced.total_cents
+        FROM priced
+        WHERE customers.id = %(customer_id)s
+          AND customers.wallet_balance_cents >= priced.total_cents
+        RETURNING priced.total_cents
+    ),
+    stock AS (
+        UPDATE inventory
+        SET count_in_stock = inventory.count_in_stock - lines.quantity
+        FROM lines, debit
+        WHERE inventory.id = lines.item_id
+        RETURNING inventory.id
+    ),
+    sale AS (
+        INSERT INTO sales (customer_id, item_id, quantity)
+        SELECT %(customer_id)s, lines.item_id, lines.quantity
+        FROM lines, debit
+        ORDER BY lines.item_id
+        RETURNING id
+    ),
+    entry AS (
+        INSERT INTO wallet_ledger (customer_id, amount_cents, kind, reference_id)
+        SELECT %(customer_id)s, -debit.total_cents, 'checkout', (SELECT min(id) FROM sale)
+        FROM debit
+    )
+    SELECT (SELECT total_cents FROM debit), ARRAY(SELECT id FROM sale ORDER BY id)
+"""
+
+
+@sales_bp.route("/sales/checkout", methods=["POST"])
+def checkout():
+    """
+    Processes a cart where a customer purchases several items in one transaction.
+
+    The request must include:
+    - username: The buying customer's username.
+    - items: A list of objects with an item_id and a quantity.
+
+    The customer row and then the inventory rows (in item_id order) are locked, so
+    concurrent checkouts and purchases always acquire locks in the same order and
+    cannot deadlock. The slots of hot items are folded onto their rows, stock is
+    checked against the locked rows, then one batched
+    statement (`CHECKOUT_SQL`) totals the cart in SQL, debits the wallet only if
+    it covers the total, and writes the stock decrements, the ledger entry and all
+    sales rows. Either every item is bought or none is.
+
+    Returns:
+        A success message with the sale IDs and total price, or error details.
+    """
+    try:
+        data = request.json
+
+        username = data.get("username")
+        items = data.get("items")
+
+        if not username or not items or not isinstance(items, list):
+            return jsonify({"error": "username and a list of items are required"}), 400
+
+        cart = {}
+        for line in items:
+            if not isinstance(line, dict):
+                return jsonify({"error": "Each item must have an item_id and a quantity"}), 400
+            item_id = line.get("item_id")
+            quantity = line.get("quantity")
+            error = validate_purchase(username, item_id, quantity)
+            if error:
+                return jsonify({"error": error, "item_id": item_id}), 400
+            cart[item_id] = cart.get(item_id, 0) + quantity
+
+        item_ids = sorted(cart)
+        quantities = [cart[item_id] for item_id in item_ids]
 
         conn = get_db()
         cur = conn.cursor()
 
         cur.execute(
-            "SELECT id, wallet_balance FROM customers WHERE username = %s", (username,)
+            "SELECT id FROM customers WHERE username = %s FOR UPDATE",
+            (username,),
         )
         customer = cur.fetchone()
         if not customer:
             cur.close()
+            conn.rollback()
             return jsonify({"error": "Customer not found"}), 404
         customer_id = customer[0]
-        wallet_balance = float(customer[1])
-
-        cur.execute(
-            "SELECT id, price_per_item, count_in_stock FROM inventory WHERE id = %s",
-            (item_id,),
-        )
-        item = cur.fetchone()
-        if not item:
-            cur.close()
-            return jsonify({"error": "Item not found"}), 404
-        item_id = item[0]
-        price_per_item = float(item[1])
-        count_in_stock = item[2]
-
-        if count_in_stock < quantity:
-            cur.close()
-            return jsonify({"error": "Not enough stock available"}), 400
-
-        total_price = price_per_item * quantity
 
-        if wallet_balance < total_price:
-            cur.close()
-            return jsonify({"error": "Insufficient funds"}), 400
-
-        new_wallet_balance = wallet_balance - total_price
-        cur.execute(
-            "UPDATE customers SET wallet_balance = %s WHERE id = %s",
-            (new_wallet_balance, customer_id),
-        )
-
-        new_count_in_stock = count_in_stock - quantity
         cur.execute(
-            "UPDATE inventory SET count_in_stock = %s WHERE id = %s",
-            (new_count_in_stock, item_id),
+            """
+            SELECT id, count_in_stock, stock_slots
+            FROM inventory
+            WHERE id = ANY(%s)
+            ORDER BY id
+            FOR NO KEY UPDATE
+            """,
+            (item_ids,),
         )
+        rows = cur.fetchall()
+        stock = {row[0]: row[1] for row in rows}
+        hot = [row[0] for row in rows if row[2]]
+        if hot:
+            stock.update(fold_stock_slots(cur, hot))
+
+        for item_id in item_ids:
+            if item_id not in stock:
+                cur.close()
+                conn.rollback()
+                return jsonify({"error": "Item not found", "item_id": item_id}), 404
+            if stock[item_id] < cart[item_id]:
+                cur.close()
+                conn.rollback()
+                return (
+                    jsonify({"error": "Not enough stock available", "item_id": item_id}),
+                    400,
+                )
 
         cur.execute(
-            """
-            INSERT INTO sales (customer_id, item_id, quantity)
-            VALUES (%s, %s, %s)
-            """,
-            (customer_id, item_id, quantity),
+            CHECKOUT_SQL,
+            {"item_ids": item_ids, "quantities": quantities, "customer_id": customer_id},
         )
+        total_cents, sale_ids = cur.fetchone()
+        if total_cents is None:
+            cur.close()
+            conn.rollback()
+            return jsonify({"error": "Insufficient funds"}), 400
 
+        notify_inventory_change(cur, item_ids)
         conn.commit()
         cur.close()
 
-        return jsonify({"message": "Purchase successful"}), 200
+        return (
+            jsonify(
+                {
+                    "message": "Checkout successful",
+                    "sale_ids": sale_ids,
+                    "total_price": format_cents(total_cents),
+                }
+            ),
+            200,
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+CUSTOMER_PURCHASES_SQL = """
+    SELECT sales.id, sales.quantity, sales.sale_date,
+           inventory.id AS item_id, inventory.name, inventory.price_per_item_cents
+    FROM sales
+    JOIN inventory ON sales.item_id = inventory.id
+    WHERE sales.customer_id = %s
+    ORDER BY sales.sale_date DESC
+"""
+
+
 @sales_bp.route("/sales/customers/<username>/purchases", methods=["GET"])
 def get_customer_purchases(username):
     """
     Returns all historical purchases made by a specific customer.
     Retrieves a list of all past purchases including item details, quantity, and sale date.
+    Long histories are streamed from a server-side cursor (see `common.streaming`).
     """
     try:
         conn = get_db()
@@ -174,30 +532,21 @@ def get_customer_purchases(username):
             return jsonify({"error": "Customer not found"}), 404
         customer_id = customer[0]
 
-        cur.execute(
-            """
-            SELECT sales.id, sales.quantity, sales.sale_date,
-                   inventory.id AS item_id, inventory.name, inventory.price_per_item
-            FROM sales
-            JOIN inventory ON sales.item_id = inventory.id
-            WHERE sales.customer_id = %s
-            ORDER BY sales.sale_date DESC
-        """,
-            (customer_id,),
-        )
-        purchases = cur.fetchall()
         cur.close()
 
-        purchases_list = [
-            {
-                "sale_id": row[0],
-                "quantity": row[1],
-                "sale_date": row[2].isoformat(),
-                "item": {"id": row[3], "name": row[4], "price_per_item": float(row[5])},
-            }
-            for row in purchases
-        ]
-
-        return jsonify(purchases_list), 200
+        return (
+            json_list_response(
+                conn,
+                CUSTOMER_PURCHASES_SQL,
+                (customer_id,),
+                lambda row: {
+                    "sale_id": row[0],
+                    "quantity": row[1],
+                    "sale_date": row[2].isoformat(),
+                    "item": {"id": row[3], "name": row[4], "price_per_item": format_cents(row[5])},
+                },
+            ),
+            200,
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
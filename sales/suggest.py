@@ -0,0 +1,446 @@
+import os
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from common.db import get_db
+from common.notify import INVENTORY_CHANNEL, last_heartbeat, subscribe
+from common.stock_slots import AVAILABLE_STOCK_SQL
+
+SALES_SUGGEST_INDEX = os.environ.get("SALES_SUGGEST_INDEX", "1") == "1"
+SALES_SUGGEST_MEMORY_MB = float(os.environ.get("SALES_SUGGEST_MEMORY_MB", "64"))
+SALES_SUGGEST_MAX_STALENESS = float(os.environ.get("SALES_SUGGEST_MAX_STALENESS", "5"))
+
+SUGGEST_PAGE_SIZE = 10
+SUGGEST_MAX_PAGE_SIZE = 50
+SUGGEST_PREFIX_MAX_LENGTH = 100
+
+_SUGGEST_COLUMNS = f"id, name, category, {AVAILABLE_STOCK_SQL} > 0"
+
+# Used when the index is disabled. Matches the prefix at the start of a word,
+# with the pattern built by `suggest_pattern`.
+SUGGEST_SQL = f"""
+    SELECT {_SUGGEST_COLUMNS}
+    FROM inventory
+    WHERE lower(name) ~ %(pattern)s
+    ORDER BY lower(name), id
+    LIMIT %(limit)s
+"""
+
+_WORD = re.compile(r"\w+")
+
+# A key packs an item's slot and the offset of a word in its lower-cased name;
+# words starting further in than 255 characters are not indexed.
+_OFFSET_BITS = 8
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+_IN_STOCK = 1
+_DELETED = 2
+
+# Bytes per item besides its name and keys: a name offset, an ID, a flag byte
+# and a category byte. Items added after a build also cost a str and a dict slot.
+_ITEM_BYTES = 14
+_APPENDED_ITEM_BYTES = 160
+
+# Changes applied in place since the last build, as a fraction of its items,
+# after which the index is rebuilt from memory.
+_COMPACT_RATIO = 0.1
+_COMPACT_MIN = 1000
+
+
+class SuggestIndex:
+    """
+    An in-memory prefix index of inventory names that serves type-ahead
+    suggestions without touching the database.
+
+    Every word of an item's name starts an index key: the lower-cased name from
+    that word on, so "sneak" suggests "Red Sneakers". Items are kept in slots
+    ordered by ID: the names in one UTF-8 blob with an `array` of offsets, and
+    the IDs, in-stock flags and categories in parallel arrays. The keys are one
+    sorted `array` of packed (slot, word offset) integers, so a lookup is a
+    binary search over the names followed by a short scan, and a key costs 8
+    bytes.
+
+    Inventory writes announce the changed IDs on `INVENTORY_CHANNEL` (see
+    `common.notify`); the index reloads just those rows, in one query, on the
+    next lookup. A stock change flips the item's flag; a new or renamed item
+    gets a slot at the end and its keys are inserted in place, and a deleted or
+    renamed item's old slot is left empty. Once such changes add up to a tenth
+    of the index it is rebuilt from memory. While no change is pending a lookup
+    never touches the database. As in `CatalogReplica`, the whole index is
+    reloaded at most once per `max_staleness` seconds while the notification
+    listener is down.
+
+    The index stays within `memory_budget` bytes, as estimated from its arrays.
+    A build indexes in-stock items first and leaves out whatever does not fit;
+    between builds, new items that do not fit are left out.
+
+    Args:
+        memory_budget (int): The most memory, in bytes, the index may use.
+        max_staleness (float): Upper bound, in seconds, on how out of date the
+            index may be when notifications cannot be received.
+    """
+
+    def __init__(
+        self,
+        memory_budget=int(SALES_SUGGEST_MEMORY_MB * 1024 * 1024),
+        max_staleness=SALES_SUGGEST_MAX_STALENESS,
+    ):
+        self.memory_budget = memory_budget
+        self.max_staleness = max_staleness
+        self._dirty = set()
+        self._reload_all = True
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._subscribed = False
+        self._build([])
+
+        self.hits = 0
+        self.misses = 0
+        self.full_reloads = 0
+
+    def suggest(self, prefix, limit=SUGGEST_PAGE_SIZE):
+        """
+        Returns the items with a name, or a word in their name, starting with `prefix`.
+
+        Args:
+            prefix (str): What the user typed so far. Case and repeated spaces
+                are ignored; a trailing space ends the last word.
+            limit (int): The most items to return.
+
+        Returns:
+            list: Dictionaries with the id, name (with its whitespace collapsed),
+            category and in_stock flag of each item, ordered by the matching part
+            of the name.
+        """
+        self._sync()
+        text = normalize_prefix(prefix)
+        if not text:
+            return []
+
+        found = []
+        seen = set()
+        with self._lock:
+            keys = self._keys
+            i = self._bisect(text)
+            while i < len(keys) and len(found) < limit:
+                slot, offset = keys[i] >> _OFFSET_BITS, keys[i] & _OFFSET_MASK
+                i += 1
+                name = self._name(slot)
+                if not name.lower().startswith(text, offset):
+                    break
+                if slot in seen:
+                    continue
+                seen.add(slot)
+                found.append(
+                    {
+                        "id": self._ids[slot],
+                        "name": name,
+                        "category": self._categories[self._category_codes[slot]],
+                        "in_stock": bool(self._flags[slot] & _IN_STOCK),
+                    }
+                )
+        return found
+
+    def invalidate(self, item_ids=None):
+        """
+        Marks items as changed so they are reloaded on the next lookup.
+
+        Args:
+            item_ids (list, optional): The changed item IDs. None reloads everything.
+        """
+        with self._lock:
+            if item_ids is None:
+                self._reload_all = True
+            else:
+                self._dirty.update(item_ids)
+
+    def stats(self):
+        """
+        Returns the index's size and counters.
+
+        Returns:
+            dict: The number of indexed items and keys, the estimated size in
+            bytes, whether items were left out to stay within the memory budget,
+            lookup hits and misses, and full reloads.
+        """
+        return {
+            "items": len(self._ids) - self._deleted,
+            "keys": len(self._keys),
+            "bytes": self._size,
+            "truncated": self._truncated,
+            "hits": self.hits,
+            "misses": self.misses,
+            "full_reloads": self.full_reloads,
+        }
+
+    def _sync(self):
+        if not self._subscribed:
+            self._subscribed = True
+            subscribe(INVENTORY_CHANNEL, self.invalidate)
+
+        now = time.monotonic()
+        heartbeat = last_heartbeat()
+        if (heartbeat is None or now - heartbeat > self.max_staleness) and (
+            self._synced_at is None or now - self._synced_at > self.max_staleness
+        ):
+            self.invalidate()
+
+        if not self._reload_all and not self._dirty:
+            self.hits += 1
+            return
+
+        self.misses += 1
+        with self._load_lock:
+            with self._lock:
+                reload_all, self._reload_all = self._reload_all, False
+                dirty, self._dirty = self._dirty, set()
+
+            try:
+                if reload_all:
+                    self._load_all()
+                elif dirty:
+                    self._load(dirty)
+            except Exception:
+                self.invalidate(None if reload_all else dirty)
+                raise
+
+    def _load_all(self):
+        cur = get_db().cursor()
+        cur.execute(f"SELECT {_SUGGEST_COLUMNS} FROM inventory")
+        rows = cur.fetchall()
+        cur.close()
+        self._build(rows)
+        self._synced_at = time.monotonic()
+        self.full_reloads += 1
+
+    def _load(self, item_ids):
+        cur = get_db().cursor()
+        cur.execute(
+            f"SELECT {_SUGGEST_COLUMNS} FROM inventory WHERE id = ANY(%s)",
+            (list(item_ids),),
+        )
+        rows = {row[0]: row[1:] for row in cur.fetchall()}
+        cur.close()
+
+        with self._lock:
+            for item_id in item_ids:
+                slot = self._slot(item_id)
+                row = rows.get(item_id)
+                if slot is not None and row is not None and self._name(slot) == _clean(row[0]):
+                    self._flags[slot] = _IN_STOCK if row[2] else 0
+                    self._category_codes[slot] = self._category_code(row[1])
+                    continue
+                if slot is not None:
+                    self._remove(slot)
+                if row is not None:
+                    self._append(item_id, *row)
+            compact = self._appended + self._deleted > max(
+                _COMPACT_MIN, self._built * _COMPACT_RATIO
+            )
+        if compact:
+            self._compact()
+
+    def _build(self, rows):
+        # In-stock items first, so they are the ones kept when the budget runs out.
+        rows = sorted(rows, key=lambda row: (not row[3], row[0]))
+        chosen = []
+        size = 0
+        truncated = False
+        for item_id, name, category, in_stock in rows:
+            name = _clean(name).encode()
+            item_size = _item_size(name, _word_offsets(name.decode().lower()))
+            if size + item_size > self.memory_budget:
+                truncated = True
+                break
+            size += item_size
+            chosen.append((item_id, name, category, in_stock))
+        chosen.sort()
+
+        categories = []
+        category_codes = {}
+        starts = array("I", [0])
+        keys = []
+        for slot, (_, name, category, _) in enumerate(chosen):
+            starts.append(starts[-1] + len(name))
+            category_codes.setdefault(category, len(categories))
+            if len(categories) < len(category_codes):
+                categories.append(category)
+            folded = name.decode().lower()
+            keys.extend(
+                (folded[offset:], slot << _OFFSET_BITS | offset)
+                for offset in _word_offsets(folded)
+            )
+        keys.sort()
+
+        with self._lock:
+            self._text = b"".join(item[1] for item in chosen)
+            self._starts = starts
+            self._ids = array("q", (item[0] for item in chosen))
+            self._flags = bytearray(_IN_STOCK if item[3] else 0 for item in chosen)
+            self._categories = categories
+            self._category_index = category_codes
+            self._category_codes = bytearray(category_codes[item[2]] for item in chosen)
+            self._keys = array("Q", (key for _, key in keys))
+            self._built = len(chosen)
+            self._appended_names = []
+            self._appended_slots = {}
+            self._appended = 0
+            self._deleted = 0
+            self._size = size
+            self._truncated = truncated
+
+    def _compact(self):
+        with self._lock:
+            rows = [
+                (
+                    self._ids[slot],
+                    self._name(slot),
+                    self._categories[self._category_codes[slot]],
+                    self._flags[slot] & _IN_STOCK,
+                )
+                for slot in range(len(self._ids))
+                if not self._flags[slot] & _DELETED
+            ]
+            truncated = self._truncated
+        self._build(rows)
+        self._truncated = self._truncated or truncated
+
+    def _name(self, slot):
+        if slot < self._built:
+            return self._text[self._starts[slot] : self._starts[slot + 1]].decode()
+        return self._appended_names[slot - self._built]
+
+    def _slot(self, item_id):
+        slot = self._appended_slots.get(item_id)
+        if slot is None:
+            i = bisect_left(self._ids, item_id, 0, self._built)
+            if i < self._built and self._ids[i] == item_id:
+                slot = i
+        if slot is None or self._flags[slot] & _DELETED:
+            return None
+        return slot
+
+    def _category_code(self, category):
+        code = self._category_index.get(category)
+        if code is None:
+            code = self._category_index[category] = len(self._categories)
+            self._categories.append(category)
+        return code
+
+    def _bisect(self, text, key=-1):
+        # The position of the first key sorting at or after (text, key).
+        keys = self._keys
+        lo, hi = 0, len(keys)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            slot, offset = keys[mid] >> _OFFSET_BITS, keys[mid] & _OFFSET_MASK
+            if (self._name(slot).lower()[offset:], keys[mid]) < (text, key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _append(self, item_id, name, category, in_stock):
+        name = _clean(name)
+        folded = name.lower()
+        offsets = _word_offsets(folded)
+        item_size = _item_size(name.encode(), offsets) + _APPENDED_ITEM_BYTES
+        if self._size + item_size > self.memory_budget:
+            self._truncated = True
+            return
+
+        slot = len(self._ids)
+        self._ids.append(item_id)
+        self._flags.append(_IN_STOCK if in_stock else 0)
+        self._category_codes.append(self._category_code(category))
+        self._appended_names.append(name)
+        self._appended_slots[item_id] = slot
+        self._appended += 1
+        for offset in offsets:
+            key = slot << _OFFSET_BITS | offset
+            self._keys.insert(self._bisect(folded[offset:], key), key)
+        self._size += item_size
+
+    def _remove(self, slot):
+        name = self._name(slot)
+        folded = name.lower()
+        offsets = _word_offsets(folded)
+        for offset in offsets:
+            key = slot << _OFFSET_BITS | offset
+            del self._keys[self._bisect(folded[offset:], key)]
+        self._flags[slot] = _DELETED
+        self._deleted += 1
+        # A built item's name stays in the text blob until the next compaction,
+        # which the count of deleted items bounds.
+        self._size -= _item_size(name.encode(), offsets)
+        if slot >= self._built:
+            self._size -= _APPENDED_ITEM_BYTES
+            self._appended_slots.pop(self._ids[slot])
+            self._appended_names[slot - self._built] = ""
+
+
+def normalize_prefix(text):
+    """
+    Lower-cases `text` and collapses its whitespace, the way index keys are built,
+    keeping one trailing space if it had any.
+
+    Args:
+        text (str): The typed prefix.
+
+    Returns:
+        str: The normalized prefix, empty if `text` was blank.
+    """
+    normalized = _clean(text).lower()
+    if normalized and text[-1].isspace():
+        normalized += " "
+    return normalized
+
+
+def suggest_pattern(prefix):
+    """
+    Builds the regular expression `SUGGEST_SQL` matches lower-cased names against.
+
+    It finds the normalized prefix where the index would: at the start of a
+    word, with words split the same way (``\\m`` starts a word of letters,
+    digits and underscores, like ``\\w``), so "shirt" finds "T-Shirt" either way.
+    Spaces match any run of whitespace, and every other character is literal.
+
+    Args:
+        prefix (str): The typed prefix.
+
+    Returns:
+        str: A PostgreSQL regular expression.
+    """
+    text = re.sub(r"[^\w ]", r"\\\g<0>", normalize_prefix(prefix))
+    return r"\m" + text.replace(" ", r"\s+")
+
+
+def _clean(name):
+    return " ".join(name.split())
+
+
+def _word_offsets(folded):
+    return [
+        match.start() for match in _WORD.finditer(folded) if match.start() <= _OFFSET_MASK
+    ]
+
+
+def _item_size(encoded_name, offsets):
+    return len(encoded_name) + _ITEM_BYTES + 8 * len(offsets)
+
+
+def get_suggest_index(app):
+    """
+    Returns the suggestion index of the given app, or None if it is disabled.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        SuggestIndex: The app's suggestion index.
+    """
+    return app.extensions.get("sales_suggest")
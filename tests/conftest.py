@@ -2,44 +2,47 @@ import sys
 import os
 
 sys.path.insert(0, os.path.abspath(os.path.dirname(os.path.dirname(__file__))))
+os.environ.setdefault("AUTH_TOKEN_SECRET", "test-secret")
+os.environ.setdefault("PASSWORD_HASH_ITERATIONS", "1000")
+os.environ.setdefault("RESERVATION_SWEEP_INTERVAL", "0")
 import pytest
 from app_init import create_app
-from common.db import get_db, close_db
+from common.db import connect
+from common.migrations import apply_migrations
 from memory_profiler import profile
 
 
+def reset_database():
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("DROP TABLE IF EXISTS inventory_stock_slots")
+    cur.execute("DROP TABLE IF EXISTS stock_reservations")
+    cur.execute("DROP TABLE IF EXISTS stock_adjustment_batches")
+    cur.execute("DROP TABLE IF EXISTS rating_summary")
+    cur.execute("DROP TABLE IF EXISTS revoked_tokens")
+    cur.execute("DROP TABLE IF EXISTS wallet_snapshots")
+    cur.execute("DROP TABLE IF EXISTS wallet_ledger")
+    cur.execute("DROP FUNCTION IF EXISTS wallet_ledger_append_only")
+    cur.execute("DROP TABLE IF EXISTS reviews")
+    cur.execute("DROP TABLE IF EXISTS sales")
+    cur.execute("DROP TABLE IF EXISTS customers")
+    cur.execute("DROP TABLE IF EXISTS inventory")
+    cur.execute("DROP TABLE IF EXISTS schema_version")
+    conn.commit()
+    cur.close()
+    return conn
+
+
 @profile
 @pytest.fixture
-def app():
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv("FLASK_RATELIMIT_STORAGE_URI", f"shm://{tmp_path}/ratelimit")
+    conn = reset_database()
+    apply_migrations(conn)
+    conn.close()
     app = create_app()
-    with app.app_context():
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("DROP TABLE IF EXISTS reviews")
-        cur.execute("DROP TABLE IF EXISTS sales")
-        cur.execute("DROP TABLE IF EXISTS customers")
-        cur.execute("DROP TABLE IF EXISTS inventory")
-        from customers.db import init_customers_db
-        from inventory.db import init_inventory_db
-        from sales.db import init_sales_db
-        from reviews.db import init_reviews_db
-
-        init_customers_db()
-        init_inventory_db()
-        init_sales_db()
-        init_reviews_db()
-        conn.commit()
-        cur.close()
     yield app
-    with app.app_context():
-        conn = get_db()
-        cur = conn.cursor()
-        cur.execute("DROP TABLE IF EXISTS reviews")
-        cur.execute("DROP TABLE IF EXISTS sales")
-        cur.execute("DROP TABLE IF EXISTS customers")
-        cur.execute("DROP TABLE IF EXISTS inventory")
-        conn.commit()
-        cur.close()
+    reset_database().close()
 
 
 @profile
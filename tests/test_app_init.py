@@ -0,0 +1,36 @@
+import subprocess
+import sys
+
+import pytest
+from memory_profiler import profile
+
+from app_init import create_app
+
+
+@profile
+def test_create_app_with_one_service(app):
+    client = create_app(services=["customers"]).test_client()
+
+    assert client.get("/customers").status_code == 200
+    assert client.get("/sales/goods").status_code == 404
+
+    with pytest.raises(ValueError):
+        create_app(services=["customers", "shipping"])
+
+
+@profile
+def test_unused_services_are_not_imported(app):
+    for service in ("customers", "sales"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                f"import sys; from app_init import create_app; create_app([{service!r}]); "
+                "print(sorted(m for m in ('customers', 'inventory', 'sales', 'reviews') "
+                "if m in sys.modules))",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        assert output.strip() == f"[{service!r}]"
@@ -0,0 +1,53 @@
+import json
+import threading
+
+import pytest
+from memory_profiler import profile
+
+from common.credentials import CredentialsCache, CredentialsError, FileCredentialsProvider
+from common.db import connect
+from common.pool import ConnectionPool
+
+
+@profile
+def test_file_provider(tmp_path):
+    path = tmp_path / "db_credentials.json"
+    provider = FileCredentialsProvider(str(path))
+    with pytest.raises(CredentialsError):
+        provider.fetch()
+
+    path.write_text(json.dumps({"DB_USER": "shop", "DB_PASSWORD": "secret"}))
+    assert provider.fetch() == {"DB_USER": "shop", "DB_PASSWORD": "secret"}
+
+
+@profile
+def test_rotation_retires_pool_without_dropping_requests(tmp_path):
+    path = tmp_path / "db_credentials.json"
+    path.write_text(json.dumps({"DB_USER": "shop", "DB_PASSWORD": "old"}))
+    cache = CredentialsCache(FileCredentialsProvider(str(path)), ttl=0.2)
+    assert cache.get()["DB_PASSWORD"] == "old"
+
+    pool = ConnectionPool(connect, min_size=2, max_size=2)
+    pool.warm_up()
+    in_flight = pool.getconn()
+    rotated = threading.Event()
+    cache.on_change(lambda secret: (pool.retire(), rotated.set()))
+
+    path.write_text(json.dumps({"DB_USER": "shop", "DB_PASSWORD": "new"}))
+    assert rotated.wait(2)
+    cache.stop()
+    assert cache.get()["DB_PASSWORD"] == "new"
+    assert pool.stats()["idle"] == 0
+
+    cur = in_flight.cursor()
+    cur.execute("SELECT 1")
+    assert cur.fetchone() == (1,)
+    cur.close()
+    pool.putconn(in_flight)
+    assert in_flight.closed
+
+    replacement = pool.getconn()
+    assert replacement is not in_flight
+    assert pool.stats()["recycled"] == 2
+    pool.putconn(replacement)
+    pool.closeall()
@@ -131,7 +131,7 @@ def test_charge_customer_wallet(client):
     assert response.status_code == 200
     data = response.get_json()
     assert data["message"] == "Wallet charged successfully"
-    assert int(data["new_balance"]) == 150
+    assert data["new_balance"] == "150.00"
 
 
 @profile
@@ -150,7 +150,7 @@ def test_deduct_money_from_wallet(client):
     assert response.status_code == 200
     data = response.get_json()
     assert data["message"] == "Amount deducted successfully"
-    assert int(data["new_balance"]) == 150
+    assert data["new_balance"] == "150.00"
 
     response = client.post("/customers/batman/deduct", json={"amount": 300})
     assert response.status_code == 400
@@ -187,3 +187,253 @@ def test_get_all_customers(client):
     usernames = [customer["username"] for customer in data]
     assert "superman" in usernames
     assert "greenlantern" in usernames
+
+
+@profile
+def test_get_all_customers_pagination(client):
+    for index in range(5):
+        client.post(
+            "/customers",
+            json={
+                "fullname": f"Page Reader {index}",
+                "username": f"pagereader{index}",
+                "password": "password123",
+            },
+        )
+
+    response = client.get("/customers?limit=2&fields=username,age")
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data == [
+        {"username": "pagereader0", "age": None},
+        {"username": "pagereader1", "age": None},
+    ]
+
+    usernames = [customer["username"] for customer in data]
+    cursor = response.headers["X-Next-Cursor"]
+    while cursor:
+        response = client.get(f"/customers?limit=2&fields=username&cursor={cursor}")
+        assert response.status_code == 200
+        usernames += [customer["username"] for customer in response.get_json()]
+        cursor = response.headers.get("X-Next-Cursor")
+    assert usernames == [f"pagereader{index}" for index in range(5)]
+
+    response = client.get("/customers?after_id=4")
+    assert [customer["id"] for customer in response.get_json()] == [5]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/customers?fields=username,secret")
+    assert response.status_code == 400
+
+    response = client.get("/customers?limit=0")
+    assert response.status_code == 400
+
+
+@profile
+def test_concurrent_wallet_changes_are_not_lost(app, client):
+    import threading
+    from datetime import datetime
+
+    from common.db import connect
+    from customers.wallet import reconcile, take_snapshots
+
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Busy Wallet",
+            "username": "busywallet",
+            "password": "password123",
+            "wallet_balance": 10,
+        },
+    )
+
+    statuses = []
+
+    def change(operation):
+        test_client = app.test_client()
+        for _ in range(6):
+            response = test_client.post(
+                f"/customers/busywallet/{operation}", json={"amount": 2.5}
+            )
+            statuses.append(response.status_code)
+
+    threads = [
+        threading.Thread(target=change, args=(operation,))
+        for operation in ("charge", "charge", "charge", "deduct", "deduct", "deduct")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses.count(200) + statuses.count(400) == 36
+    deducted = statuses.count(200) - 18
+    balance = float(client.get("/customers/busywallet").get_json()["wallet_balance"])
+    assert balance == 10 + 18 * 2.5 - deducted * 2.5
+    assert balance >= 0
+
+    conn = connect()
+    assert take_snapshots(conn) == 1
+    assert reconcile(conn) == []
+    conn.close()
+
+    response = client.post("/customers/busywallet/charge", json={"amount": 0.1})
+    assert float(response.get_json()["new_balance"]) == round(balance + 0.1, 2)
+
+    response = client.post("/customers/busywallet/charge", json={"amount": 0.001})
+    assert response.status_code == 400
+
+    response = client.get("/customers/busywallet/wallet/ledger?limit=30")
+    entries = response.get_json()
+    assert len(entries) == 30
+    assert entries[0]["kind"] == "charge" and entries[0]["amount"] == "0.10"
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/customers/busywallet/wallet/ledger?limit=30&cursor={cursor}")
+    older = response.get_json()
+    assert "X-Next-Cursor" not in response.headers
+    assert older[-1] == {
+        "id": older[-1]["id"],
+        "amount": "10.00",
+        "kind": "opening",
+        "reference_id": None,
+        "created_at": older[-1]["created_at"],
+    }
+    assert len(entries) + len(older) == 2 + statuses.count(200)
+    datetime.fromisoformat(entries[0]["created_at"])
+
+
+@profile
+def test_snapshots_do_not_block_wallet_changes(client):
+    import threading
+    import time
+
+    from common.db import connect
+    from customers.wallet import change_wallet, reconcile, take_snapshots
+
+    for username in ("slowwallet", "fastwallet"):
+        client.post(
+            "/customers",
+            json={"fullname": "Wallet", "username": username, "password": "password123"},
+        )
+
+    # An entry that draws its ID and then commits after a later entry.
+    writer = connect()
+    writer_cur = writer.cursor()
+    _, slow_entry_id = change_wallet(writer_cur, "slowwallet", 500, "charge")
+    assert client.post("/customers/fastwallet/charge", json={"amount": 1}).status_code == 200
+
+    conn = connect()
+    thread = threading.Thread(target=take_snapshots, args=(conn,))
+    thread.start()
+    time.sleep(0.2)
+
+    # The snapshot waits for the writer, but wallet changes are not held up.
+    assert thread.is_alive()
+    statuses = []
+    charge = threading.Thread(
+        target=lambda: statuses.append(
+            client.post("/customers/fastwallet/charge", json={"amount": 1}).status_code
+        )
+    )
+    charge.start()
+    charge.join(5)
+    blocked = charge.is_alive()
+    assert thread.is_alive()
+
+    writer.commit()
+    writer.close()
+    charge.join()
+    thread.join()
+    assert not blocked and statuses == [200]
+
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT max(ledger_id) FROM wallet_snapshots
+        WHERE customer_id = (SELECT id FROM customers WHERE username = 'slowwallet')
+        """
+    )
+    assert cur.fetchone()[0] == slow_entry_id
+    cur.close()
+    assert reconcile(conn) == []
+    conn.close()
+
+
+@profile
+def test_login_and_logout(client):
+    from common.db import connect
+
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Dana Scully",
+            "username": "dscully",
+            "password": "password123",
+        },
+    )
+
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT password, password_hash FROM customers WHERE username = 'dscully'"
+    )
+    password, password_hash = cur.fetchone()
+    assert password is None and password_hash.startswith("pbkdf2_sha256$")
+    assert "password" not in client.get("/customers/dscully").get_json()
+
+    response = client.post(
+        "/customers/login", json={"username": "dscully", "password": "wrong"}
+    )
+    assert response.status_code == 401
+    response = client.post(
+        "/customers/login", json={"username": "nobody", "password": "password123"}
+    )
+    assert response.status_code == 401
+
+    for password in (123456, ["password123"]):
+        response = client.post(
+            "/customers/login", json={"username": "dscully", "password": password}
+        )
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "password must be a string"
+        response = client.post(
+            "/customers",
+            json={"fullname": "Fox Mulder", "username": "fmulder", "password": password},
+        )
+        assert response.status_code == 400
+        response = client.put("/customers/dscully", json={"password": password})
+        assert response.status_code == 400
+
+    response = client.post(
+        "/customers/login", json={"username": "dscully", "password": "password123"}
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["expires_in"] == 900
+    headers = {"Authorization": f"Bearer {data['token']}"}
+
+    response = client.post("/customers/logout", headers=headers)
+    assert response.status_code == 200
+    response = client.post(
+        "/customers/logout", headers={"Authorization": data["token"][:-2] + "xx"}
+    )
+    assert response.status_code == 401
+
+    # Customers stored before passwords were hashed are upgraded on login.
+    cur.execute(
+        """
+        INSERT INTO customers (fullname, username, password)
+        VALUES ('Fox Mulder', 'fmulder', 'trustno1')
+        """
+    )
+    conn.commit()
+    response = client.post(
+        "/customers/login", json={"username": "fmulder", "password": "trustno1"}
+    )
+    assert response.status_code == 200
+    cur.execute("SELECT password, password_hash FROM customers WHERE username = 'fmulder'")
+    password, password_hash = cur.fetchone()
+    assert password is None and password_hash.startswith("pbkdf2_sha256$")
+    conn.rollback()
+    cur.close()
+    conn.close()
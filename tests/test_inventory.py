@@ -55,6 +55,18 @@ def test_add_goods(client):
         "Price and count_in_stock must be non-negative" in response.get_json()["error"]
     )
 
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Grain",
+            "category": "food",
+            "price_per_item": 0.01,
+            "count_in_stock": 3000000000,
+        },
+    )
+    assert response.status_code == 400
+    assert "count_in_stock must be at most" in response.get_json()["error"]
+
 
 @profile
 def test_deduct_goods(client):
@@ -107,6 +119,351 @@ def test_update_goods(client):
     assert response.status_code == 400
     assert "Invalid category" in response.get_json()["error"]
 
+    response = client.put(f"/inventory/{item_id}", json={"count_in_stock": 3000000000})
+    assert response.status_code == 400
+    assert "count_in_stock must be at most" in response.get_json()["error"]
+
     response = client.put(f"/inventory/9999", json={"price_per_item": 59.99})
     assert response.status_code == 404
     assert "Item not found" in response.get_json()["error"]
+
+
+@profile
+def test_prices_are_exact_cents(client):
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Gum",
+            "category": "food",
+            "price_per_item": "0.10",
+            "count_in_stock": 3,
+        },
+    )
+    item_id = response.get_json()["id"]
+    assert client.get(f"/sales/goods/{item_id}").get_json()["price_per_item"] == "0.10"
+
+    response = client.put(f"/inventory/{item_id}", json={"price_per_item": 0.3})
+    assert response.status_code == 200
+    assert client.get(f"/sales/goods/{item_id}").get_json()["price_per_item"] == "0.30"
+
+    response = client.put(f"/inventory/{item_id}", json={"price_per_item": 0.305})
+    assert response.status_code == 400
+
+
+@profile
+def test_bulk_import(client):
+    import json
+
+    lines = [
+        {
+            "sku": "KB-1",
+            "name": "Keyboard",
+            "category": "electronics",
+            "price_per_item": "25.50",
+            "count_in_stock": 10,
+        },
+        {"name": "Apple", "category": "food", "price_per_item": 0.4, "count_in_stock": 100},
+        {"name": "Car", "category": "vehicles", "price_per_item": 1, "count_in_stock": 1},
+        {"name": "Hat", "category": "clothes", "price_per_item": -1, "count_in_stock": 1},
+        {"name": "Pen", "category": "food", "price_per_item": 1, "count_in_stock": 3000000000},
+        {"name": "Gem", "category": "food", "price_per_item": 10**17, "count_in_stock": 1},
+    ]
+    body = "\n".join(json.dumps(line) for line in lines) + "\nnot json\n\n"
+    response = client.post(
+        "/inventory/bulk", data=body, content_type="application/x-ndjson"
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert (data["inserted"], data["updated"], data["rejected"]) == (2, 0, 5)
+    assert data["errors"] == [
+        {"line": 3, "error": "Invalid category"},
+        {"line": 4, "error": "Price and count_in_stock must be non-negative"},
+        {"line": 5, "error": "count_in_stock must be at most 2147483647"},
+        {"line": 6, "error": "price_per_item is too large"},
+        {"line": 7, "error": "Invalid JSON"},
+    ]
+
+    body = (
+        "sku,name,category,price_per_item,count_in_stock,description\n"
+        'KB-1,Keyboard,electronics,19.99,7,"Mechanical, tenkeyless"\n'
+        "MS-1,Mouse,electronics,9,abc,\n"
+        "MS-2,Mouse,electronics,9,3,\n"
+    )
+    response = client.post("/inventory/bulk", data=body, content_type="text/csv")
+    data = response.get_json()
+    assert (data["inserted"], data["updated"], data["rejected"]) == (1, 1, 1)
+    assert data["errors"] == [{"line": 3, "error": "count_in_stock must be an integer"}]
+
+    goods = {item["name"]: item for item in client.get("/sales/goods").get_json()}
+    assert set(goods) == {"Keyboard", "Apple", "Mouse"}
+    keyboard = client.get(f"/sales/goods/{goods['Keyboard']['id']}").get_json()
+    assert keyboard["price_per_item"] == "19.99"
+    assert keyboard["count_in_stock"] == 7
+    assert keyboard["description"] == "Mechanical, tenkeyless"
+
+    response = client.post("/inventory/bulk", data="{}", content_type="application/json")
+    assert response.status_code == 415
+
+
+@profile
+def test_bulk_import_keeps_valid_chunks(app):
+    from common.db import connect
+    from inventory.bulk import import_items
+
+    items = [
+        {"name": f"Item {n}", "category": "food", "price_per_item": 1, "count_in_stock": n}
+        for n in range(6)
+    ]
+    # NUL characters pass validation but are refused by PostgreSQL.
+    items[3]["description"] = "bad\x00byte"
+
+    conn = connect()
+    result = import_items(conn, enumerate(items, 1), chunk_size=2)
+    cur = conn.cursor()
+    cur.execute("SELECT count(*) FROM inventory")
+    assert cur.fetchone()[0] == 4
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+    assert (result["inserted"], result["rejected"]) == (4, 2)
+    assert [error["line"] for error in result["errors"]] == [3, 4]
+
+
+@profile
+def test_bulk_stock_adjustment(client):
+    item_ids = [
+        client.post(
+            "/inventory",
+            json={
+                "name": name,
+                "category": "accessories",
+                "price_per_item": 3,
+                "count_in_stock": 10,
+            },
+        ).get_json()["id"]
+        for name in ("Strap", "Buckle", "Clasp")
+    ]
+    batch = {
+        "batch_id": "nightly-2024-06-01",
+        "adjustments": [
+            {"item_id": item_ids[0], "delta": -4},
+            {"item_id": item_ids[1], "delta": -11},
+            {"item_id": item_ids[2], "delta": 5},
+            {"item_id": item_ids[0], "delta": -1},
+            {"item_id": 999999, "delta": 1},
+        ],
+    }
+
+    response = client.patch("/inventory/stock", json=batch)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["replayed"] is False
+    assert data["applied"] == [
+        {"item_id": item_ids[0], "count_in_stock": 5},
+        {"item_id": item_ids[2], "count_in_stock": 15},
+    ]
+    assert data["rejected"] == [
+        {"item_id": item_ids[1], "error": "Not enough stock available"},
+        {"item_id": 999999, "error": "Item not found"},
+    ]
+
+    response = client.patch("/inventory/stock", json=batch)
+    assert response.get_json() == dict(data, replayed=True)
+    assert client.get(f"/sales/goods/{item_ids[0]}").get_json()["count_in_stock"] == 5
+
+    batch["adjustments"] = batch["adjustments"][:1]
+    assert client.patch("/inventory/stock", json=batch).status_code == 409
+    response = client.patch(
+        "/inventory/stock",
+        json={"batch_id": "bad", "adjustments": [{"item_id": item_ids[0], "delta": "1"}]},
+    )
+    assert response.status_code == 400
+
+    # Deltas that are each in range can add up to more than the stock column holds.
+    big = 2**31 - 1
+    response = client.patch(
+        "/inventory/stock",
+        json={
+            "batch_id": "overflow",
+            "adjustments": [
+                {"item_id": item_ids[0], "delta": big},
+                {"item_id": item_ids[0], "delta": big},
+                {"item_id": item_ids[1], "delta": big},
+                {"item_id": item_ids[2], "delta": -big},
+                {"item_id": item_ids[2], "delta": -big},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["applied"] == []
+    assert data["rejected"] == [
+        {"item_id": item_ids[0], "error": f"count_in_stock must be at most {big}"},
+        {"item_id": item_ids[1], "error": f"count_in_stock must be at most {big}"},
+        {"item_id": item_ids[2], "error": "Not enough stock available"},
+    ]
+    assert client.get(f"/sales/goods/{item_ids[0]}").get_json()["count_in_stock"] == 5
+
+
+@profile
+def test_concurrent_deductions_do_not_oversell(app, client):
+    import threading
+
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Concert Ticket",
+            "category": "accessories",
+            "price_per_item": 50,
+            "count_in_stock": 5,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    statuses = []
+
+    def deduct():
+        response = app.test_client().patch(
+            f"/inventory/{item_id}/deduct", json={"quantity": 1}
+        )
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=deduct) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses.count(200) == 5
+    assert statuses.count(400) == 3
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 0
+
+    response = client.patch("/inventory/999999/deduct", json={"quantity": 1})
+    assert response.status_code == 404
+
+
+@profile
+def test_stock_reservations(app, client):
+    from common.db import connect
+    from inventory.reservations import sweep_expired
+
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Desk Lamp",
+            "category": "electronics",
+            "price_per_item": 25,
+            "count_in_stock": 10,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    def reserve(quantity):
+        return client.post(
+            "/inventory/reservations", json={"item_id": item_id, "quantity": quantity}
+        )
+
+    response = reserve(4)
+    assert response.status_code == 201
+    confirmed = response.get_json()
+    assert (confirmed["status"], confirmed["count_in_stock"]) == ("held", 6)
+    released = reserve(3).get_json()
+    expired = reserve(2).get_json()
+    assert reserve(2).status_code == 400
+    response = client.post("/inventory/reservations", json={"item_id": 999999, "quantity": 1})
+    assert response.status_code == 404
+    response = client.post(
+        "/inventory/reservations", json={"item_id": item_id, "quantity": 1, "ttl": 10**6}
+    )
+    assert response.status_code == 400
+
+    response = client.post(f"/inventory/reservations/{confirmed['id']}/confirm")
+    assert response.get_json() == {"id": confirmed["id"], "status": "confirmed"}
+    response = client.post(f"/inventory/reservations/{released['id']}/release")
+    assert response.status_code == 200
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 4
+    response = client.post(f"/inventory/reservations/{released['id']}/confirm")
+    assert response.status_code == 409
+    assert response.get_json()["status"] == "released"
+    assert client.post("/inventory/reservations/999999/release").status_code == 404
+
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute(
+        "UPDATE stock_reservations SET expires_at = LOCALTIMESTAMP - interval '1 second' WHERE id = %s",
+        (expired["id"],),
+    )
+    conn.commit()
+    cur.close()
+
+    response = client.post(f"/inventory/reservations/{expired['id']}/confirm")
+    assert response.status_code == 409
+    assert response.get_json()["status"] == "expired"
+    assert sweep_expired(conn, batch_size=1) == 1
+    assert sweep_expired(conn) == 0
+    conn.close()
+
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 6
+    response = client.get(f"/inventory/reservations/{expired['id']}")
+    assert response.get_json()["status"] == "expired"
+    assert client.get(f"/inventory/reservations/{confirmed['id']}").get_json()["quantity"] == 4
+
+
+@profile
+def test_search_goods(client):
+    for name, category, price, description, count_in_stock in [
+        ("Running Shoes", "clothes", 80, "Light trainers for road running", 5),
+        ("Trail Running Shoes", "clothes", 120, "Grippy soles", 0),
+        ("Shoe Rack", "accessories", 30, "Holds ten pairs of running shoes", 3),
+        ("Rice Cooker", "electronics", 45, "Keeps rice warm", 8),
+    ]:
+        client.post(
+            "/inventory",
+            json={
+                "name": name,
+                "category": category,
+                "price_per_item": price,
+                "description": description,
+                "count_in_stock": count_in_stock,
+            },
+        )
+
+    response = client.get("/inventory/search", query_string={"q": "running sho"})
+    assert response.status_code == 200
+    names = [item["name"] for item in response.get_json()]
+    # Name matches outrank description matches.
+    assert names[-1] == "Shoe Rack"
+    assert sorted(names[:2]) == ["Running Shoes", "Trail Running Shoes"]
+
+    response = client.get(
+        "/inventory/search",
+        query_string={"q": "running", "category": "clothes", "in_stock": "true"},
+    )
+    assert [item["name"] for item in response.get_json()] == ["Running Shoes"]
+    response = client.get("/inventory/search", query_string={"q": "shoes", "max_price": "100"})
+    assert {item["name"] for item in response.get_json()} == {"Running Shoes", "Shoe Rack"}
+
+    # Names are indexed as they are updated.
+    item_id = next(item["id"] for item in response.get_json() if item["name"] == "Shoe Rack")
+    client.put(f"/inventory/{item_id}", json={"name": "Boot Stand"})
+    response = client.get("/inventory/search", query_string={"q": "boot"})
+    assert [item["id"] for item in response.get_json()] == [item_id]
+
+    pages = []
+    cursor = None
+    while True:
+        query_string = {"q": "running", "limit": 1}
+        if cursor:
+            query_string["after"] = cursor
+        response = client.get("/inventory/search", query_string=query_string)
+        pages.extend(item["name"] for item in response.get_json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(pages) == 3 and len(set(pages)) == 3
+
+    assert client.get("/inventory/search").status_code == 400
+    assert client.get("/inventory/search", query_string={"q": "x", "category": "toys"}).status_code == 400
+    assert client.get("/inventory/search", query_string={"q": "x", "min_price": "abc"}).status_code == 400
+    assert client.get("/inventory/search", query_string={"q": "!!"}).get_json() == []
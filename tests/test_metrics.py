@@ -0,0 +1,82 @@
+from memory_profiler import profile
+
+
+@profile
+def test_metrics_endpoint(client):
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Mia Metric",
+            "username": "miametric",
+            "password": "password123",
+        },
+    )
+    client.get("/customers/miametric")
+    client.get("/customers/nobody")
+    client.get("/customers?fields=username")
+    client.get("/customers?fields=fullname,username")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.mimetype == "text/plain"
+    text = response.get_data(as_text=True)
+
+    assert "# TYPE ecommerce_http_request_duration_seconds histogram" in text
+    assert (
+        'ecommerce_http_request_duration_seconds_count{route="/customers/<username>",'
+        'method="GET",status="404"}'
+    ) in text
+    assert (
+        'ecommerce_db_query_duration_seconds_count{endpoint="customers.register_customer",'
+        'statement="SELECT id FROM customers WHERE username = %s"}'
+    ) in text
+    assert 'ecommerce_db_query_rows_total{endpoint="customers.get_customer_by_username"' in text
+    assert (
+        'ecommerce_db_query_duration_seconds_count{endpoint="customers.get_all_customers",'
+        'statement="SELECT {} FROM customers WHERE id > %s ORDER BY id LIMIT %s"}'
+    ) in text
+    assert "Composed(" not in text
+    assert 'ecommerce_db_pool_connections{state="in_use"}' in text
+
+
+@profile
+def test_metrics_are_shared_between_workers(client, tmp_path, monkeypatch):
+    import json
+    import re
+
+    import common.metrics
+    from common.metrics import MetricsRegistry, SharedMetrics
+
+    shared = SharedMetrics(str(tmp_path), interval=3600)
+    monkeypatch.setattr(common.metrics, "shared_metrics", shared)
+    count_line = re.compile(
+        r'ecommerce_http_request_duration_seconds_count\{route="/customers/<username>",'
+        r'method="GET",status="404"\} (\d+)'
+    )
+
+    client.get("/customers/nobody")
+    own = int(count_line.search(client.get("/metrics").get_data(as_text=True)).group(1))
+
+    # Another worker, with process ID 1, has handled two such requests.
+    other = MetricsRegistry()
+    for _ in range(2):
+        other.observe(
+            "ecommerce_http_request_duration_seconds",
+            (("route", "/customers/<username>"), ("method", "GET"), ("status", "404")),
+            0.01,
+        )
+    snapshot = other.snapshot()
+    snapshot["pid"] = 1
+    snapshot["gauges"] = [["ecommerce_db_pool_connections", [["state", "in_use"]], 3]]
+    (tmp_path / "worker-1.json").write_text(json.dumps(snapshot))
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert int(count_line.search(text).group(1)) == own + 2
+    assert 'ecommerce_db_pool_connections{state="in_use",pid="1"} 3' in text
+
+    # Its counts outlive it; its gauges do not.
+    shared.retire(1)
+    assert not (tmp_path / "worker-1.json").exists()
+    text = client.get("/metrics").get_data(as_text=True)
+    assert int(count_line.search(text).group(1)) == own + 2
+    assert 'pid="1"' not in text
@@ -0,0 +1,54 @@
+import pytest
+from memory_profiler import profile
+from common.db import connect
+from common.migrations import (
+    SchemaVersionError,
+    apply_migrations,
+    check_schema_version,
+    get_current_version,
+    latest_version,
+)
+
+
+@profile
+def test_migrations_are_applied_once(app):
+    conn = connect()
+
+    assert get_current_version(conn) == latest_version()
+    assert apply_migrations(conn) == []
+    assert check_schema_version(conn) == latest_version()
+
+    with pytest.raises(SchemaVersionError):
+        check_schema_version(conn, required=latest_version() + 1)
+
+    conn.close()
+
+
+@profile
+def test_money_migrates_to_cents(app):
+    from tests.conftest import reset_database
+
+    conn = reset_database()
+    apply_migrations(conn, target=6)
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO customers (fullname, username, password, wallet_balance)
+        VALUES ('Legacy Wallet', 'legacywallet', 'password123', 12.345)
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO inventory (name, category, price_per_item, count_in_stock)
+        VALUES ('Legacy Item', 'food', 0.1, 1)
+        """
+    )
+    conn.commit()
+
+    apply_migrations(conn)
+    cur.execute("SELECT wallet_balance_cents FROM customers")
+    assert cur.fetchone() == (1235,)
+    cur.execute("SELECT price_per_item_cents FROM inventory")
+    assert cur.fetchone() == (10,)
+    cur.close()
+    conn.close()
@@ -0,0 +1,58 @@
+import pytest
+from memory_profiler import profile
+from common.db import connect
+from common.pool import ConnectionPool, PoolTimeout
+
+
+@profile
+def test_pool_reuses_connections():
+    pool = ConnectionPool(connect, min_size=1, max_size=2)
+    pool.warm_up()
+    assert pool.stats()["idle"] == 1
+
+    conn = pool.getconn()
+    assert pool.stats()["in_use"] == 1
+    pool.putconn(conn)
+
+    assert pool.getconn() is conn
+    pool.putconn(conn)
+
+    stats = pool.stats()
+    assert stats["size"] == 1
+    assert stats["checkouts"] == 2
+    pool.closeall()
+
+
+@profile
+def test_pool_rolls_back_and_recycles():
+    pool = ConnectionPool(connect, max_size=1, max_lifetime=0.0, pre_ping=True, ping_interval=0)
+
+    conn = pool.getconn()
+    cur = conn.cursor()
+    cur.execute("SELECT 1")
+    cur.close()
+    pool.putconn(conn)
+    assert conn.get_transaction_status() == 0
+
+    conn.close()
+    replacement = pool.getconn()
+    assert replacement is not conn
+    assert not replacement.closed
+    assert pool.stats()["recycled"] == 1
+    pool.putconn(replacement)
+    pool.closeall()
+
+
+@profile
+def test_pool_checkout_timeout():
+    pool = ConnectionPool(connect, max_size=1, timeout=0.1)
+
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+
+    stats = pool.stats()
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+    pool.putconn(conn)
+    pool.closeall()
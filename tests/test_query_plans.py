@@ -0,0 +1,151 @@
+import json
+
+from memory_profiler import profile
+from common.db import connect
+from common.stock_slots import HOT_ITEMS_SQL, IDLE_HOT_ITEMS_SQL
+from sales.routes import CUSTOMER_PURCHASES_SQL, PURCHASE_SQL
+from reviews.moderation import MODERATE_SQL
+from reviews.routes import CUSTOMER_REVIEWS_SQL, PENDING_REVIEWS_SQL, PRODUCT_REVIEWS_SQL
+from reviews.summary import LAST_REVIEW_DATE_SQL, REBUILD_SQL, SUMMARIES_SQL
+
+REVIEW_PAGE = {
+    "owner_id": 42,
+    "before_date": "infinity",
+    "before_id": 2**31 - 1,
+    "rating": None,
+    "limit": 51,
+}
+
+ROUTE_QUERIES = [
+    ("customer purchases", CUSTOMER_PURCHASES_SQL, (42,)),
+    ("product reviews", PRODUCT_REVIEWS_SQL, REVIEW_PAGE),
+    ("popular product reviews", PRODUCT_REVIEWS_SQL, dict(REVIEW_PAGE, owner_id=1)),
+    (
+        "popular product reviews, deep page",
+        PRODUCT_REVIEWS_SQL,
+        dict(REVIEW_PAGE, owner_id=1, before_date="2000-01-01", rating=5),
+    ),
+    ("customer reviews", CUSTOMER_REVIEWS_SQL, REVIEW_PAGE),
+    (
+        "purchase",
+        PURCHASE_SQL,
+        {"username": "customer42", "item_id": 42, "quantity": 1},
+    ),
+    ("customer by username", "SELECT * FROM customers WHERE username = %s", ("customer42",)),
+    (
+        "customers page",
+        "SELECT id, username FROM customers WHERE id > %s ORDER BY id LIMIT %s",
+        (100, 51),
+    ),
+    (
+        "good details",
+        "SELECT id, name, category, price_per_item_cents, description, count_in_stock FROM inventory WHERE id = %s",
+        (42,),
+    ),
+    ("review owner", "SELECT customer_id FROM reviews WHERE id = %s", (42,)),
+    ("rating summaries", SUMMARIES_SQL, ([3, 14, 15, 92, 65],)),
+    (
+        "pending reviews",
+        PENDING_REVIEWS_SQL,
+        {"after_date": "-infinity", "after_id": 0, "limit": 51},
+    ),
+    ("moderate reviews", MODERATE_SQL, {"review_ids": [3, 14, 15], "is_approved": True}),
+    (
+        "latest approved review",
+        LAST_REVIEW_DATE_SQL,
+        {"item_ids": [42]},
+    ),
+    ("hot items", HOT_ITEMS_SQL, None),
+    ("idle hot items", IDLE_HOT_ITEMS_SQL, {"idle_for": 300}),
+]
+
+
+def seed(conn):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO customers (fullname, username, password, wallet_balance_cents)
+        SELECT 'Customer ' || n, 'customer' || n, 'password', 100000
+        FROM generate_series(1, 5000) AS n
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO inventory (name, category, price_per_item_cents, count_in_stock)
+        SELECT 'Item ' || n, 'accessories', 1000, n % 50
+        FROM generate_series(1, 5000) AS n
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO sales (customer_id, item_id, quantity, sale_date)
+        SELECT 1 + n % 5000, 1 + (n * 7) % 5000, 1, now() - n * interval '1 minute'
+        FROM generate_series(1, 100000) AS n
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO reviews (customer_id, item_id, rating, comment, is_approved, review_date)
+        SELECT 1 + n % 5000, 1 + (n * 7) % 5000, 1 + n % 5, 'ok', n % 3 = 0,
+               now() - n * interval '1 minute'
+        FROM generate_series(1, 100000) AS n
+        """
+    )
+    cur.execute(
+        """
+        INSERT INTO reviews (customer_id, item_id, rating, comment, is_approved, review_date)
+        SELECT 1 + n % 5000, 1, 1 + n % 5, 'popular', TRUE, now() - n * interval '1 second'
+        FROM generate_series(1, 30000) AS n
+        """
+    )
+    cur.execute(REBUILD_SQL)
+    cur.execute("ANALYZE")
+    conn.commit()
+    cur.close()
+
+
+def seq_scans(plan):
+    scans = []
+    if plan["Node Type"] == "Seq Scan":
+        scans.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        scans += seq_scans(child)
+    return scans
+
+
+def node_types(plan):
+    types = [plan["Node Type"]]
+    for child in plan.get("Plans", []):
+        types += node_types(child)
+    return types
+
+
+# Paginated listings must read their page in index order, without sorting
+# everything that matches.
+UNSORTED_QUERIES = {
+    "popular product reviews",
+    "popular product reviews, deep page",
+    "pending reviews",
+}
+
+
+@profile
+def test_route_queries_use_indexes(app):
+    conn = connect()
+    seed(conn)
+    cur = conn.cursor()
+
+    failures = []
+    for name, query, params in ROUTE_QUERIES:
+        cur.execute("EXPLAIN (FORMAT JSON) " + query, params)
+        plan = cur.fetchone()[0][0]["Plan"]
+        if seq_scans(plan):
+            failures.append(f"{name} falls back to a seq scan:\n{json.dumps(plan, indent=2)}")
+        if name in UNSORTED_QUERIES and "Sort" in node_types(plan):
+            failures.append(f"{name} sorts its matches:\n{json.dumps(plan, indent=2)}")
+
+    cur.close()
+    conn.rollback()
+    conn.close()
+
+    assert not failures, "\n\n".join(failures)
@@ -0,0 +1,58 @@
+import multiprocessing
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import SlidingWindowCounterRateLimiter
+from memory_profiler import profile
+
+from app_init import create_app
+from common.ratelimit import SharedMemoryStorage
+
+
+def _hit_many(uri, count, results):
+    limiter = SlidingWindowCounterRateLimiter(storage_from_string(uri))
+    item = parse("100 per minute")
+    results.put(sum(limiter.hit(item, "shared-client") for _ in range(count)))
+
+
+@profile
+def test_sliding_window_shared_across_processes(tmp_path):
+    uri = f"shm://{tmp_path}/ratelimit"
+    storage_from_string(uri)
+
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=_hit_many, args=(uri, 60, results))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sum(results.get() for _ in workers) == 100
+
+
+@profile
+def test_idle_keys_are_evicted(tmp_path):
+    storage = SharedMemoryStorage(f"shm://{tmp_path}/ratelimit?slots=64")
+    limiter = SlidingWindowCounterRateLimiter(storage)
+    item = parse("5 per minute")
+
+    for _ in range(5):
+        assert limiter.hit(item, "busy-client")
+    assert not limiter.hit(item, "busy-client")
+
+    for i in range(10000):
+        limiter.hit(item, f"client-{i}")
+    assert storage.reset() == 64
+
+
+@profile
+def test_blueprint_limits(app, monkeypatch):
+    monkeypatch.setenv("FLASK_RATELIMIT_SALES", "2 per minute")
+    client = create_app().test_client()
+
+    statuses = [client.get("/sales/goods").status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert client.get("/customers").status_code == 200
@@ -361,3 +361,302 @@ def test_get_review_details(client):
     assert data["product_name"] == "Smartwatch"
     assert data["rating"] == 5
     assert data["comment"] == "Love this smartwatch!"
+
+
+@profile
+def test_review_with_session_token(app, client, monkeypatch):
+    import time
+    import reviews.routes
+    import common.auth
+    from common.notify import last_heartbeat
+
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Katherine Johnson",
+            "username": "kjohnson",
+            "password": "password123",
+        },
+    )
+    item_id = client.post(
+        "/inventory",
+        json={
+            "name": "Slide Rule",
+            "category": "accessories",
+            "price_per_item": 12,
+            "count_in_stock": 3,
+        },
+    ).get_json()["id"]
+    token = client.post(
+        "/customers/login", json={"username": "kjohnson", "password": "password123"}
+    ).get_json()["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.post(
+        "/reviews", json={"item_id": item_id, "rating": 4}, headers=headers
+    )
+    assert response.status_code == 201
+    review_id = response.get_json()["review_id"]
+
+    # Once the revocation list is loaded, a token is checked without a query.
+    def no_queries():
+        raise AssertionError("authenticate_user queried the database")
+
+    deadline = time.monotonic() + 5
+    while last_heartbeat() is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    with app.test_request_context(headers=headers):
+        assert reviews.routes.authenticate_user(reviews.routes.request) is not None
+        monkeypatch.setattr(reviews.routes, "get_db", no_queries)
+        monkeypatch.setattr(common.auth, "get_db", no_queries)
+        customer_id = reviews.routes.authenticate_user(reviews.routes.request)
+        monkeypatch.undo()
+    assert customer_id is not None
+
+    response = client.post(
+        "/reviews",
+        json={"item_id": item_id, "rating": 4},
+        headers={"Authorization": f"Bearer {token[:-2]}xx"},
+    )
+    assert response.status_code == 401
+
+    assert client.post("/customers/logout", headers=headers).status_code == 200
+    response = client.put(
+        f"/reviews/{review_id}", json={"rating": 5}, headers=headers
+    )
+    assert response.status_code == 401
+    assert app.extensions["token_revocations"].stats()["tokens"] == 1
+
+
+@profile
+def test_review_with_password_headers_hashes_once(client, monkeypatch):
+    import common.auth
+    import reviews.routes
+
+    client.post(
+        "/customers",
+        json={"fullname": "Dennis Ritchie", "username": "dritchie", "password": "password123"},
+    )
+    item_id = client.post(
+        "/inventory",
+        json={
+            "name": "Manual",
+            "category": "accessories",
+            "price_per_item": 8,
+            "count_in_stock": 3,
+        },
+    ).get_json()["id"]
+
+    hashed = []
+    verify_password = common.auth.verify_password
+
+    def counting_verify_password(password, password_hash):
+        hashed.append(password)
+        return verify_password(password, password_hash)
+
+    monkeypatch.setattr(common.auth, "verify_password", counting_verify_password)
+
+    headers = {"Username": "dritchie", "Password": "password123"}
+    response = client.post("/reviews", json={"item_id": item_id, "rating": 3}, headers=headers)
+    assert response.status_code == 201
+    review_id = response.get_json()["review_id"]
+    response = client.put(f"/reviews/{review_id}", json={"rating": 4}, headers=headers)
+    assert response.status_code == 200
+    assert hashed == ["password123"]
+
+    # Wrong passwords are checked every time.
+    headers = {"Username": "dritchie", "Password": "wrongpassword"}
+    for _ in range(2):
+        response = client.put(f"/reviews/{review_id}", json={"rating": 5}, headers=headers)
+        assert response.status_code == 401
+    assert hashed == ["password123", "wrongpassword", "wrongpassword"]
+
+    def failing_authenticate_user(request):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(reviews.routes, "authenticate_user", failing_authenticate_user)
+    response = client.delete(f"/reviews/{review_id}", headers=headers)
+    assert response.status_code == 500
+    assert response.get_json() == {"error": "database unavailable"}
+
+
+@profile
+def test_rating_summary(client):
+    from common.db import connect
+    from reviews.summary import rebuild_rating_summaries
+
+    headers = {}
+    for username in ("rater1", "rater2", "rater3"):
+        client.post(
+            "/customers",
+            json={"fullname": "Rater", "username": username, "password": "password123"},
+        )
+        headers[username] = {"Username": username, "Password": "password123"}
+    item_ids = [
+        client.post(
+            "/inventory",
+            json={
+                "name": name,
+                "category": "electronics",
+                "price_per_item": 10,
+                "count_in_stock": 5,
+            },
+        ).get_json()["id"]
+        for name in ("Keyboard", "Mouse")
+    ]
+    item_id = item_ids[0]
+
+    review_ids = {}
+    for username, rating in (("rater1", 5), ("rater2", 3), ("rater3", 1)):
+        response = client.post(
+            "/reviews",
+            json={"item_id": item_id, "rating": rating},
+            headers=headers[username],
+        )
+        review_ids[username] = response.get_json()["review_id"]
+
+    response = client.get(f"/reviews/product/{item_id}/summary")
+    assert response.status_code == 200
+    assert response.get_json()["review_count"] == 0
+    assert response.get_json()["average_rating"] is None
+
+    for review_id in review_ids.values():
+        client.patch(f"/reviews/{review_id}/moderate", json={"is_approved": True})
+    client.put(
+        f"/reviews/{review_ids['rater2']}", json={"rating": 4}, headers=headers["rater2"]
+    )
+    client.delete(f"/reviews/{review_ids['rater3']}", headers=headers["rater3"])
+    client.patch(f"/reviews/{review_ids['rater1']}/moderate", json={"is_approved": False})
+    client.patch(f"/reviews/{review_ids['rater1']}/moderate", json={"is_approved": True})
+
+    summary = client.get(f"/reviews/product/{item_id}/summary").get_json()
+    assert summary["review_count"] == 2
+    assert summary["average_rating"] == 4.5
+    assert summary["histogram"] == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+    details = client.get(f"/reviews/{review_ids['rater2']}").get_json()
+    assert summary["last_review_date"] == details["review_date"]
+
+    # The maintained summary matches one recomputed from the reviews.
+    conn = connect()
+    rebuild_rating_summaries(conn)
+    conn.close()
+    assert client.get(f"/reviews/product/{item_id}/summary").get_json() == summary
+
+    response = client.get(f"/reviews/summary?item_ids={item_ids[1]},{item_id},999999")
+    assert response.status_code == 200
+    assert [s["item_id"] for s in response.get_json()] == sorted(item_ids)
+    assert client.get("/reviews/product/999999/summary").status_code == 404
+    assert client.get("/reviews/summary?item_ids=1,x").status_code == 400
+
+
+@profile
+def test_review_pagination(client):
+    item_id = client.post(
+        "/inventory",
+        json={
+            "name": "Headphones",
+            "category": "electronics",
+            "price_per_item": 50,
+            "count_in_stock": 10,
+        },
+    ).get_json()["id"]
+    review_ids = []
+    for index, rating in enumerate((5, 4, 5, 3, 5)):
+        username = f"listener{index}"
+        client.post(
+            "/customers",
+            json={"fullname": "Listener", "username": username, "password": "password123"},
+        )
+        response = client.post(
+            "/reviews",
+            json={"item_id": item_id, "rating": rating},
+            headers={"Username": username, "Password": "password123"},
+        )
+        review_ids.append(response.get_json()["review_id"])
+        client.patch(f"/reviews/{review_ids[-1]}/moderate", json={"is_approved": True})
+
+    pages = []
+    url = f"/reviews/product/{item_id}?limit=2"
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200
+        pages.append([review["review_id"] for review in response.get_json()])
+        cursor = response.headers.get("X-Next-Cursor")
+        url = cursor and f"/reviews/product/{item_id}?limit=2&before={cursor}"
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert sum(pages, []) == review_ids[::-1]
+
+    response = client.get(f"/reviews/product/{item_id}?rating=5&limit=2")
+    assert [r["rating"] for r in response.get_json()] == [5, 5]
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/reviews/product/{item_id}?rating=5&before={cursor}")
+    assert [r["review_id"] for r in response.get_json()] == [review_ids[0]]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get("/reviews/customer/listener2?limit=1")
+    assert [r["review_id"] for r in response.get_json()] == [review_ids[2]]
+    assert client.get(f"/reviews/product/{item_id}?rating=6").status_code == 400
+    assert client.get(f"/reviews/product/{item_id}?before=junk").status_code == 400
+
+
+@profile
+def test_moderation_queue(client):
+    client.post(
+        "/customers",
+        json={"fullname": "Campaign", "username": "campaign", "password": "password123"},
+    )
+    headers = {"Username": "campaign", "Password": "password123"}
+    item_id = client.post(
+        "/inventory",
+        json={
+            "name": "Webcam",
+            "category": "electronics",
+            "price_per_item": 40,
+            "count_in_stock": 10,
+        },
+    ).get_json()["id"]
+    review_ids = [
+        client.post(
+            "/reviews", json={"item_id": item_id, "rating": rating}, headers=headers
+        ).get_json()["review_id"]
+        for rating in (5, 4, 1, 2, 5)
+    ]
+
+    response = client.get("/reviews/pending?limit=3")
+    assert [r["review_id"] for r in response.get_json()] == review_ids[:3]
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/reviews/pending?after={cursor}")
+    assert [r["review_id"] for r in response.get_json()] == review_ids[3:]
+
+    response = client.patch(
+        "/reviews/moderate",
+        json={
+            "review_ids": [review_ids[0], review_ids[1], review_ids[4], 999999],
+            "is_approved": True,
+        },
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["updated"] == 3
+    assert data["results"][-1] == {"review_id": 999999, "status": "not_found"}
+    assert {r["status"] for r in data["results"][:3]} == {"approved"}
+
+    response = client.patch(
+        "/reviews/moderate",
+        json={"review_ids": [review_ids[2], review_ids[4]], "is_approved": False},
+    )
+    assert response.get_json()["updated"] == 2
+
+    response = client.get("/reviews/pending")
+    assert [r["review_id"] for r in response.get_json()] == [review_ids[3]]
+
+    summary = client.get(f"/reviews/product/{item_id}/summary").get_json()
+    assert summary["review_count"] == 2
+    assert summary["histogram"] == {"1": 0, "2": 0, "3": 0, "4": 1, "5": 1}
+
+    response = client.patch("/reviews/moderate", json={"review_ids": [], "is_approved": True})
+    assert response.status_code == 400
+    response = client.patch(
+        "/reviews/moderate", json={"review_ids": [review_ids[3]], "is_approved": "yes"}
+    )
+    assert response.status_code == 400
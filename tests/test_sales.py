@@ -172,3 +172,499 @@ def test_get_customer_purchases(client):
     response = client.get("/sales/customers/nonexistentuser/purchases")
     assert response.status_code == 404
     assert response.get_json() == {"error": "Customer not found"}
+
+
+@profile
+def test_concurrent_purchases_do_not_oversell(app, client):
+    import threading
+
+    for index in range(8):
+        client.post(
+            "/customers",
+            json={
+                "fullname": "Rush Buyer",
+                "username": f"rushbuyer{index}",
+                "password": "password123",
+                "wallet_balance": 100,
+            },
+        )
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Limited Sneakers",
+            "category": "clothes",
+            "price_per_item": 10.00,
+            "count_in_stock": 5,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    statuses = []
+
+    def buy(index):
+        response = app.test_client().post(
+            "/sales/purchase",
+            json={"username": f"rushbuyer{index}", "item_id": item_id, "quantity": 1},
+        )
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=buy, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses.count(200) == 5
+    assert statuses.count(400) == 3
+
+    response = client.get(f"/sales/goods/{item_id}")
+    assert response.get_json()["count_in_stock"] == 0
+
+
+@profile
+def test_checkout(client):
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Grace Cart",
+            "username": "gracecart",
+            "password": "password123",
+            "wallet_balance": 100.00,
+        },
+    )
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Pen",
+            "category": "accessories",
+            "price_per_item": 2.00,
+            "count_in_stock": 10,
+        },
+    )
+    pen_id = response.get_json()["id"]
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Notebook",
+            "category": "accessories",
+            "price_per_item": 5.00,
+            "count_in_stock": 3,
+        },
+    )
+    notebook_id = response.get_json()["id"]
+
+    response = client.post(
+        "/sales/checkout",
+        json={
+            "username": "gracecart",
+            "items": [
+                {"item_id": notebook_id, "quantity": 2},
+                {"item_id": pen_id, "quantity": 3},
+                {"item_id": pen_id, "quantity": 1},
+            ],
+        },
+    )
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data["message"] == "Checkout successful"
+    assert len(data["sale_ids"]) == 2
+    assert data["total_price"] == "18.00"
+
+    assert client.get(f"/sales/goods/{pen_id}").get_json()["count_in_stock"] == 6
+    assert client.get(f"/sales/goods/{notebook_id}").get_json()["count_in_stock"] == 1
+    customer = client.get("/customers/gracecart").get_json()
+    assert float(customer["wallet_balance"]) == 82.00
+
+    response = client.post(
+        "/sales/checkout",
+        json={
+            "username": "gracecart",
+            "items": [
+                {"item_id": pen_id, "quantity": 1},
+                {"item_id": notebook_id, "quantity": 2},
+            ],
+        },
+    )
+    assert response.status_code == 400
+    assert response.get_json() == {
+        "error": "Not enough stock available",
+        "item_id": notebook_id,
+    }
+    assert client.get(f"/sales/goods/{pen_id}").get_json()["count_in_stock"] == 6
+
+    response = client.post(
+        "/sales/checkout",
+        json={"username": "gracecart", "items": [{"item_id": pen_id, "quantity": 0}]},
+    )
+    assert response.status_code == 400
+
+    response = client.post(
+        "/sales/checkout",
+        json={"username": "gracecart", "items": [{"item_id": 9999, "quantity": 1}]},
+    )
+    assert response.status_code == 404
+
+
+@profile
+def test_catalog_replica_follows_external_writes(app, client):
+    import time
+    from common.db import connect
+    from common.notify import INVENTORY_CHANNEL
+    from sales.catalog import get_catalog
+
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Desk Lamp",
+            "category": "electronics",
+            "price_per_item": 25.00,
+            "count_in_stock": 4,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    assert len(client.get("/sales/goods").get_json()) == 1
+    assert len(client.get("/sales/goods").get_json()) == 1
+    stats = get_catalog(app).stats()
+    assert stats["hits"] >= 1
+    assert stats["items"] == 1
+
+    conn = connect()
+    cur = conn.cursor()
+    cur.execute("UPDATE inventory SET count_in_stock = 0 WHERE id = %s", (item_id,))
+    cur.execute("SELECT pg_notify(%s, %s)", (INVENTORY_CHANNEL, str(item_id)))
+    conn.commit()
+    conn.close()
+
+    deadline = time.monotonic() + 5
+    while client.get("/sales/goods").get_json() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    assert client.get("/sales/goods").get_json() == []
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 0
+
+
+@profile
+def test_suggest_goods(app, client):
+    from sales.suggest import SuggestIndex, get_suggest_index
+
+    ids = {}
+    for name, category, count_in_stock in [
+        ("Red Sneakers", "clothes", 3),
+        ("Redwood Table", "accessories", 1),
+        ("Blue  sneakers", "clothes", 0),
+    ]:
+        response = client.post(
+            "/inventory",
+            json={
+                "name": name,
+                "category": category,
+                "price_per_item": 40.00,
+                "count_in_stock": count_in_stock,
+            },
+        )
+        ids[name] = response.get_json()["id"]
+
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "RED"})
+    assert response.status_code == 200
+    assert [item["name"] for item in response.get_json()] == ["Red Sneakers", "Redwood Table"]
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "red "})
+    assert [item["name"] for item in response.get_json()] == ["Red Sneakers"]
+
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "sneak"})
+    assert response.get_json() == [
+        {"id": ids["Red Sneakers"], "name": "Red Sneakers", "category": "clothes", "in_stock": True},
+        {
+            "id": ids["Blue  sneakers"],
+            "name": "Blue sneakers",
+            "category": "clothes",
+            "in_stock": False,
+        },
+    ]
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "sneak", "limit": 1})
+    assert len(response.get_json()) == 1
+
+    index = get_suggest_index(app)
+    misses = index.stats()["misses"]
+    for _ in range(3):
+        client.get("/sales/goods/suggest", query_string={"prefix": "blue sn"})
+    assert index.stats()["misses"] == misses
+    assert index.stats()["items"] == 3
+
+    client.put(f"/inventory/{ids['Redwood Table']}", json={"name": "Oak Table"})
+    client.put(f"/inventory/{ids['Blue  sneakers']}", json={"count_in_stock": 2})
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "red"})
+    assert [item["name"] for item in response.get_json()] == ["Red Sneakers"]
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "table"})
+    assert [item["name"] for item in response.get_json()] == ["Oak Table"]
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "blue"})
+    assert response.get_json()[0]["in_stock"] is True
+    assert index.stats()["keys"] == 6
+
+    # A renamed item stops counting towards the memory budget under its old name.
+    size = index.stats()["bytes"]
+    client.put(f"/inventory/{ids['Redwood Table']}", json={"name": "Elm Table"})
+    client.get("/sales/goods/suggest", query_string={"prefix": "elm"})
+    assert index.stats()["bytes"] == size
+    client.put(f"/inventory/{ids['Redwood Table']}", json={"name": "Oak Table"})
+
+    assert client.get("/sales/goods/suggest").status_code == 400
+    response = client.get("/sales/goods/suggest", query_string={"prefix": "red", "limit": 0})
+    assert response.status_code == 400
+
+    client.put(f"/inventory/{ids['Redwood Table']}", json={"count_in_stock": 0})
+    with app.app_context():
+        full = SuggestIndex()
+        full.suggest("oak")
+        small = SuggestIndex(memory_budget=full.stats()["bytes"] - 1)
+        assert [item["name"] for item in small.suggest("red")] == ["Red Sneakers"]
+        assert small.suggest("oak") == []
+        stats = small.stats()
+        assert stats["truncated"]
+        assert 0 < stats["bytes"] <= small.memory_budget
+        assert stats["items"] == 2
+
+
+@profile
+def test_suggest_goods_without_index(app, client, monkeypatch):
+    for name in ("T-Shirt", "Red  Sneakers", "50% Off Mug", "snake_case Book"):
+        client.post(
+            "/inventory",
+            json={"name": name, "category": "clothes", "price_per_item": 5, "count_in_stock": 1},
+        )
+
+    prefixes = ("shirt", "t-sh", "red sn", "red ", "50%", "off", "%", "case", "snake_c")
+    indexed = {}
+    for prefix in prefixes:
+        response = client.get("/sales/goods/suggest", query_string={"prefix": prefix})
+        indexed[prefix] = sorted(item["id"] for item in response.get_json())
+
+    # The database finds the same items as the index.
+    monkeypatch.delitem(app.extensions, "sales_suggest")
+    for prefix in prefixes:
+        response = client.get("/sales/goods/suggest", query_string={"prefix": prefix})
+        assert response.status_code == 200
+        assert sorted(item["id"] for item in response.get_json()) == indexed[prefix], prefix
+    assert [len(indexed[prefix]) for prefix in prefixes] == [1, 1, 1, 1, 1, 1, 0, 0, 1]
+
+
+@profile
+def test_get_customer_purchases_streamed(client, monkeypatch):
+    import common.streaming
+
+    monkeypatch.setattr(common.streaming, "STREAM_THRESHOLD", 2)
+    monkeypatch.setattr(common.streaming, "STREAM_BATCH_SIZE", 2)
+
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Sam Stream",
+            "username": "samstream",
+            "password": "password123",
+            "wallet_balance": 1000.00,
+        },
+    )
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Sticker",
+            "category": "accessories",
+            "price_per_item": 1.00,
+            "count_in_stock": 100,
+        },
+    )
+    item_id = response.get_json()["id"]
+    for _ in range(5):
+        client.post(
+            "/sales/purchase",
+            json={"username": "samstream", "item_id": item_id, "quantity": 1},
+        )
+
+    response = client.get("/sales/customers/samstream/purchases")
+    assert response.status_code == 200
+    assert response.is_streamed
+    data = response.get_json()
+    assert len(data) == 5
+    assert all(purchase["item"]["name"] == "Sticker" for purchase in data)
+
+
+@profile
+def test_head_of_streamed_purchases_releases_connection(client, monkeypatch):
+    import common.streaming
+    from common.db import get_pool_stats
+
+    monkeypatch.setattr(common.streaming, "STREAM_THRESHOLD", 2)
+
+    client.post(
+        "/customers",
+        json={
+            "fullname": "Hal Head",
+            "username": "halhead",
+            "password": "password123",
+            "wallet_balance": 1000.00,
+        },
+    )
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Badge",
+            "category": "accessories",
+            "price_per_item": 1.00,
+            "count_in_stock": 100,
+        },
+    )
+    item_id = response.get_json()["id"]
+    for _ in range(3):
+        client.post(
+            "/sales/purchase",
+            json={"username": "halhead", "item_id": item_id, "quantity": 1},
+        )
+
+    in_use = get_pool_stats()["in_use"]
+    for _ in range(3):
+        response = client.head("/sales/customers/halhead/purchases")
+        assert response.status_code == 200
+        response.close()
+    assert get_pool_stats()["in_use"] == in_use
+
+
+@profile
+def test_hot_item_purchases(app, client):
+    import threading
+
+    for index in range(12):
+        client.post(
+            "/customers",
+            json={
+                "fullname": "Flash Buyer",
+                "username": f"flashbuyer{index}",
+                "password": "password123",
+                "wallet_balance": 100,
+            },
+        )
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Flash Console",
+            "category": "electronics",
+            "price_per_item": 10.00,
+            "count_in_stock": 10,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    response = client.put(f"/inventory/{item_id}/slots", json={"slots": 4})
+    assert response.get_json() == {"id": item_id, "slots": 4, "count_in_stock": 10}
+    assert client.put(f"/inventory/{item_id}/slots", json={"slots": 1000}).status_code == 400
+    assert client.put("/inventory/999999/slots", json={"slots": 4}).status_code == 404
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 10
+    assert [item["id"] for item in client.get("/sales/goods").get_json()] == [item_id]
+
+    statuses = []
+
+    def buy(index):
+        response = app.test_client().post(
+            "/sales/purchase",
+            json={"username": f"flashbuyer{index}", "item_id": item_id, "quantity": 1},
+        )
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=buy, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert statuses == [200] * 8
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 2
+
+    # No slot holds 2 units any more, so the slots are folded for this purchase.
+    response = client.post(
+        "/sales/purchase",
+        json={"username": "flashbuyer8", "item_id": item_id, "quantity": 2},
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/sales/purchase",
+        json={"username": "flashbuyer9", "item_id": item_id, "quantity": 1},
+    )
+    assert response.get_json()["error"] == "Not enough stock available"
+
+    client.patch(
+        "/inventory/stock",
+        json={"batch_id": "restock", "adjustments": [{"item_id": item_id, "delta": 6}]},
+    )
+    assert client.patch(f"/inventory/{item_id}/deduct", json={"quantity": 1}).status_code == 200
+    response = client.post(
+        "/sales/checkout",
+        json={"username": "flashbuyer10", "items": [{"item_id": item_id, "quantity": 5}]},
+    )
+    assert response.status_code == 200
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 0
+    assert client.get("/sales/goods").get_json() == []
+
+    response = client.put(f"/inventory/{item_id}/slots", json={"slots": 0})
+    assert response.get_json()["count_in_stock"] == 0
+
+
+@profile
+def test_hot_items_are_promoted_and_demoted(app, client):
+    from common.db import connect
+    from common.stock_slots import get_hot_items
+    from sales.hot_items import HotItems
+
+    response = client.post(
+        "/inventory",
+        json={
+            "name": "Viral Mug",
+            "category": "accessories",
+            "price_per_item": 5.00,
+            "count_in_stock": 101,
+        },
+    )
+    item_id = response.get_json()["id"]
+
+    hot_items = HotItems(window=0, slots=4, wait_ms=10, promote_waits=3, cooldown=0)
+    for elapsed in (0.05, 0.05, 0.05, 0.001):
+        hot_items.record(item_id, elapsed)
+
+    conn = connect()
+    hot_items.review(conn)
+    cur = conn.cursor()
+    assert get_hot_items(cur) == {item_id}
+    cur.execute(
+        "SELECT count_in_stock FROM inventory_stock_slots WHERE item_id = %s ORDER BY slot",
+        (item_id,),
+    )
+    assert [row[0] for row in cur.fetchall()] == [26, 25, 25, 25]
+    conn.rollback()
+
+    # Another worker that saw no purchases leaves it hot while this one sees some.
+    other_worker = HotItems(window=0, cooldown=60)
+    other_worker.review(conn)
+    hot_items.record(item_id, 0.001)
+    hot_items.review(conn)
+    other_worker.review(conn)
+    assert get_hot_items(cur) == {item_id}
+    conn.rollback()
+
+    # An item an operator promoted is never demoted automatically.
+    manual_id = client.post(
+        "/inventory",
+        json={
+            "name": "Launch Mug",
+            "category": "accessories",
+            "price_per_item": 5.00,
+            "count_in_stock": 10,
+        },
+    ).get_json()["id"]
+    client.put(f"/inventory/{manual_id}/slots", json={"slots": 2})
+
+    hot_items.review(conn)
+    assert get_hot_items(cur) == {manual_id}
+    conn.rollback()
+    cur.close()
+    conn.close()
+
+    assert hot_items.stats()["promotions"] == hot_items.stats()["demotions"] == 1
+    assert other_worker.stats()["demotions"] == 0
+    assert client.get(f"/sales/goods/{item_id}").get_json()["count_in_stock"] == 101